@@ -4,9 +4,12 @@
  */
 
 import { Buffer } from "node:buffer";
-import { createHash, randomBytes, pbkdf2Sync, timingSafeEqual } from "node:crypto";
+import { createHash, pbkdf2, randomBytes, timingSafeEqual } from "node:crypto";
 
+import { getCachedUser, invalidateCachedUser } from "./services/user_cache.js";
+import { getUserByEmail, getUserById, putUser } from "./services/user_store.js";
 import { logInfo } from "./utils/logger.js";
+import { LruCache } from "./utils/lru.js";
 
 /**
  * 获取 JWT 签名密钥，若未配置则抛出致命错误，拒绝使用弱密钥
@@ -40,16 +43,82 @@ function base64urlDecodeToString(b64url) {
   return atob(b64);
 }
 
-async function hmacSha256(keyRaw, data) {
-  const enc = new TextEncoder();
-  const key = await crypto.subtle.importKey(
+const DEFAULT_JWT_VERIFY_CACHE_ENTRIES = 1000;
+const DEFAULT_CLAIMS_TRUST_SECONDS = 900;
+const DEFAULT_JWT_VERIFY_CACHE_TTL_SECONDS = 600;
+// 密钥轮换期间新旧密钥可能同时在用，保留少量已导入的 CryptoKey 即可
+const MAX_HMAC_KEYS = 4;
+
+// isolate 级缓存：按密钥指纹缓存导入后的 CryptoKey，避免每次验签都 importKey
+const hmacKeys = new Map();
+const secretFingerprints = new Map();
+let verifiedTokens = null;
+
+function jwtCacheEnabled(env) {
+  return String(env?.JWT_CACHE_ENABLED || "true").toLowerCase() !== "false";
+}
+
+/**
+ * 密钥指纹（SHA-256 前 16 位十六进制），缓存键中不直接出现密钥明文
+ */
+function secretFingerprint(secret) {
+  let fingerprint = secretFingerprints.get(secret);
+  if (!fingerprint) {
+    fingerprint = createHash("sha256").update(secret).digest("hex").slice(0, 16);
+    if (secretFingerprints.size >= MAX_HMAC_KEYS) secretFingerprints.clear();
+    secretFingerprints.set(secret, fingerprint);
+  }
+  return fingerprint;
+}
+
+function importHmacKey(keyRaw) {
+  return crypto.subtle.importKey(
     "raw",
-    enc.encode(keyRaw),
+    new TextEncoder().encode(keyRaw),
     { name: "HMAC", hash: "SHA-256" },
     false,
     ["sign", "verify"]
   );
-  const sig = await crypto.subtle.sign("HMAC", key, enc.encode(data));
+}
+
+function getHmacKey(keyRaw, useCache = true) {
+  if (!useCache) return importHmacKey(keyRaw);
+  const fingerprint = secretFingerprint(keyRaw);
+  let key = hmacKeys.get(fingerprint);
+  if (!key) {
+    // 缓存 Promise，并发的首次验签只导入一次；导入失败时移除以便重试
+    key = importHmacKey(keyRaw);
+    key.catch(() => hmacKeys.delete(fingerprint));
+    if (hmacKeys.size >= MAX_HMAC_KEYS) hmacKeys.delete(hmacKeys.keys().next().value);
+    hmacKeys.set(fingerprint, key);
+  }
+  return key;
+}
+
+function getVerifiedTokenCache(env) {
+  if (verifiedTokens === null) {
+    const value = parseInt(env?.JWT_VERIFY_CACHE_MAX_ENTRIES ?? "", 10);
+    const maxEntries =
+      !Number.isNaN(value) && value >= 0 ? value : DEFAULT_JWT_VERIFY_CACHE_ENTRIES;
+    verifiedTokens = maxEntries > 0 ? new LruCache({ maxEntries }) : false;
+  }
+  return verifiedTokens || null;
+}
+
+function resolveVerifyCacheTtlMs(env) {
+  const value = parseInt(env?.JWT_VERIFY_CACHE_TTL_SECONDS || "", 10);
+  return (!Number.isNaN(value) && value > 0 ? value : DEFAULT_JWT_VERIFY_CACHE_TTL_SECONDS) * 1000;
+}
+
+function resetJwtCaches() {
+  hmacKeys.clear();
+  secretFingerprints.clear();
+  verifiedTokens = null;
+}
+
+async function hmacSha256(keyRaw, data, useCache = true) {
+  const key = await getHmacKey(keyRaw, useCache);
+  const sig = await crypto.subtle.sign("HMAC", key, new TextEncoder().encode(data));
   return new Uint8Array(sig);
 }
 
@@ -65,20 +134,42 @@ async function generateJWT(payload, secret, expiresIn = 604800) {
   return `${encodedHeader}.${encodedClaims}.${encodedSignature}`;
 }
 
-async function verifyJWT(token, secret) {
+/**
+ * HS256 验签；最近验证通过的 token 在 LRU 中缓存其 claims（不超过 exp），同一会话的重复请求无需再做 HMAC
+ */
+async function verifyJWT(token, secret, env) {
   try {
     const parts = token.split(".");
     if (parts.length !== 3) return null;
     const [encodedHeader, encodedClaims, encodedSignature] = parts;
     const signingInput = `${encodedHeader}.${encodedClaims}`;
-    const sigBytes = await hmacSha256(secret, signingInput);
+    const useCache = jwtCacheEnabled(env);
+    const cache = useCache ? getVerifiedTokenCache(env) : null;
+    const cacheKey = cache ? `${secretFingerprint(secret)}:${encodedSignature}` : null;
+    const now = Math.floor(Date.now() / 1000);
+
+    const cached = cache?.get(cacheKey);
+    if (cached && cached.signingInput === signingInput) {
+      if (cached.claims.exp && cached.claims.exp < now) {
+        cache.delete(cacheKey);
+        return null;
+      }
+      return { ...cached.claims };
+    }
+
+    const sigBytes = await hmacSha256(secret, signingInput, useCache);
     const expected = base64urlEncode(sigBytes);
     if (expected !== encodedSignature) return null;
     const claimsStr = base64urlDecodeToString(encodedClaims);
     const claims = JSON.parse(claimsStr);
-    const now = Math.floor(Date.now() / 1000);
     if (claims.exp && claims.exp < now) return null;
-    return claims;
+    if (cache) {
+      const ttlMs = resolveVerifyCacheTtlMs(env);
+      const untilExpMs = claims.exp ? claims.exp * 1000 - Date.now() : ttlMs;
+      const entryTtlMs = Math.max(1, Math.min(ttlMs, untilExpMs));
+      cache.set(cacheKey, { signingInput, claims }, { ttlMs: entryTtlMs });
+    }
+    return { ...claims };
   } catch (e) {
     console.error("JWT验证错误:", e);
     return null;
@@ -105,7 +196,11 @@ function legacyVerifyJWT(token, secret) {
   }
 }
 
-const DEFAULT_PBKDF2_ITERATIONS = 120000;
+// Workers 的 WebCrypto PBKDF2 最多支持 100000 次迭代；新哈希不超过此值，始终走非阻塞的 WebCrypto
+const WEBCRYPTO_MAX_PBKDF2_ITERATIONS = 100000;
+const DEFAULT_PBKDF2_ITERATIONS = WEBCRYPTO_MAX_PBKDF2_ITERATIONS;
+// 旧版默认值：缺少 passwordIterations 的旧记录当时按它（或当时配置的 PBKDF2_ITERATIONS）哈希
+const LEGACY_PBKDF2_ITERATIONS = 120000;
 const DEFAULT_PBKDF2_KEYLEN = 64;
 const DEFAULT_PBKDF2_DIGEST = "sha256";
 
@@ -151,12 +246,17 @@ function resolveGoogleOAuthConfig(env) {
   };
 }
 
-function resolvePBKDF2Iterations(env) {
+function readConfiguredPBKDF2Iterations(env) {
   const value = parseInt(env?.PBKDF2_ITERATIONS || "", 10);
-  if (!Number.isNaN(value) && value >= 50000 && value <= 1000000) {
-    return value;
-  }
-  return DEFAULT_PBKDF2_ITERATIONS;
+  return !Number.isNaN(value) && value >= 50000 && value <= 1000000 ? value : null;
+}
+
+/**
+ * 新哈希使用的迭代次数：PBKDF2_ITERATIONS，超过 WebCrypto 上限时按上限
+ */
+function resolvePBKDF2Iterations(env) {
+  const value = readConfiguredPBKDF2Iterations(env);
+  return value ? Math.min(value, WEBCRYPTO_MAX_PBKDF2_ITERATIONS) : DEFAULT_PBKDF2_ITERATIONS;
 }
 
 function resolvePBKDF2KeyLength(env) {
@@ -173,14 +273,148 @@ function resolvePBKDF2Digest(env) {
   return allowed.has(value) ? value : DEFAULT_PBKDF2_DIGEST;
 }
 
+const MIN_PBKDF2_ITERATIONS = 50000;
+const MAX_PBKDF2_ITERATIONS = WEBCRYPTO_MAX_PBKDF2_ITERATIONS;
+const CALIBRATION_PROBE_ITERATIONS = 20000;
+const CALIBRATION_KV_KEY = "CONFIG:pbkdf2_calibration";
+const DEFAULT_CALIBRATION_TTL_SECONDS = 86400;
+const DEFAULT_REHASH_TOLERANCE = 0.2;
+
+// isolate 内的校准结果：{ targetMs, expiresAt, promise }
+let pbkdf2Calibration = null;
+
+function resolvePBKDF2TargetMs(env) {
+  const value = parseInt(env?.PBKDF2_TARGET_MS || "", 10);
+  return !Number.isNaN(value) && value >= 10 && value <= 2000 ? value : null;
+}
+
+function resolveRehashTolerance(env) {
+  const value = parseFloat(env?.PBKDF2_REHASH_TOLERANCE ?? "");
+  return !Number.isNaN(value) && value >= 0 && value <= 1 ? value : DEFAULT_REHASH_TOLERANCE;
+}
+
+/**
+ * 实测当前平台的派生速度，按目标耗时估算迭代次数（取整到 1 万，限制在 5 万～WebCrypto 上限 10 万）
+ * 计时不可用时返回 null：Workers 中时钟只在 I/O 时前进，纯计算期间测得的耗时可能为 0
+ */
+async function calibratePBKDF2Iterations(env, targetMs) {
+  const keyLength = resolvePBKDF2KeyLength(env);
+  const digest = resolvePBKDF2Digest(env);
+  const salt = generateSalt();
+  // 预热，排除首次导入密钥等一次性开销
+  await hashPasswordPBKDF2("calibration", salt, 1000, keyLength, digest);
+  const t0 = performance.now();
+  await hashPasswordPBKDF2("calibration", salt, CALIBRATION_PROBE_ITERATIONS, keyLength, digest);
+  const elapsed = performance.now() - t0;
+  if (!(elapsed >= 1)) {
+    return null;
+  }
+  const estimate = (targetMs / elapsed) * CALIBRATION_PROBE_ITERATIONS;
+  const rounded = Math.round(estimate / 10000) * 10000;
+  return Math.min(MAX_PBKDF2_ITERATIONS, Math.max(MIN_PBKDF2_ITERATIONS, rounded));
+}
+
+async function loadPBKDF2Calibration(env, targetMs) {
+  const fallback = resolvePBKDF2Iterations(env);
+  const kv = env?.USERS;
+  try {
+    // 多个 isolate 共用同一个校准值，避免各自测得的数值不同导致用户反复重新哈希；
+    // 无法测量的结论同样写入，其他 isolate 不再各自花一次探测的计算量
+    const stored = kv ? await kv.get(CALIBRATION_KV_KEY, "json") : null;
+    if (stored?.targetMs === targetMs && stored.unmeasurable) {
+      return fallback;
+    }
+    if (stored?.targetMs === targetMs && stored.iterations) {
+      return Math.min(stored.iterations, MAX_PBKDF2_ITERATIONS);
+    }
+    const iterations = await calibratePBKDF2Iterations(env, targetMs);
+    if (iterations) {
+      logInfo(env, `[Auth] PBKDF2 校准完成: 目标 ${targetMs}ms → ${iterations} 次迭代`);
+    } else {
+      console.warn("[Auth Warning] 当前平台无法测量 PBKDF2 耗时，使用 PBKDF2_ITERATIONS。");
+    }
+    if (kv) {
+      const ttlValue = parseInt(env?.PBKDF2_CALIBRATION_TTL_SECONDS || "", 10);
+      const expirationTtl =
+        !Number.isNaN(ttlValue) && ttlValue >= 60 ? ttlValue : DEFAULT_CALIBRATION_TTL_SECONDS;
+      const result = iterations ? { iterations } : { unmeasurable: true };
+      await kv.put(
+        CALIBRATION_KV_KEY,
+        JSON.stringify({ targetMs, ...result, measuredAt: new Date().toISOString() }),
+        { expirationTtl }
+      );
+    }
+    return iterations || fallback;
+  } catch (error) {
+    console.error("PBKDF2 校准失败:", error);
+    return fallback;
+  }
+}
+
+/**
+ * 当前应使用的迭代次数：配置了 PBKDF2_TARGET_MS 时按实测校准，否则为 PBKDF2_ITERATIONS
+ */
+async function resolveTargetIterations(env) {
+  const targetMs = resolvePBKDF2TargetMs(env);
+  if (!targetMs) {
+    return resolvePBKDF2Iterations(env);
+  }
+  const now = Date.now();
+  if (
+    !pbkdf2Calibration ||
+    pbkdf2Calibration.targetMs !== targetMs ||
+    pbkdf2Calibration.expiresAt <= now
+  ) {
+    pbkdf2Calibration = {
+      targetMs,
+      expiresAt: now + DEFAULT_CALIBRATION_TTL_SECONDS * 1000,
+      promise: loadPBKDF2Calibration(env, targetMs),
+    };
+  }
+  return pbkdf2Calibration.promise;
+}
+
+function resetPBKDF2Calibration() {
+  pbkdf2Calibration = null;
+}
+
 function hashPasswordLegacy(password, salt) {
   return createHash("sha256")
     .update(password + salt)
     .digest("hex");
 }
 
-function hashPasswordPBKDF2(password, salt, iterations, keyLength, digest) {
-  return pbkdf2Sync(password, salt, iterations, keyLength, digest).toString("hex");
+const WEBCRYPTO_DIGESTS = { sha256: "SHA-256", sha384: "SHA-384", sha512: "SHA-512" };
+
+function pbkdf2NodeAsync(password, salt, iterations, keyLength, digest) {
+  return new Promise((resolve, reject) => {
+    pbkdf2(password, salt, iterations, keyLength, digest, (error, derived) => {
+      if (error) reject(error);
+      else resolve(derived.toString("hex"));
+    });
+  });
+}
+
+/**
+ * PBKDF2 派生（异步，不阻塞 isolate 事件循环），结果与原 pbkdf2Sync(...).toString("hex") 逐字节一致：
+ * 密码与盐均按 UTF-8 字符串编码。
+ * Workers 的 WebCrypto 不支持超过 100000 次迭代：新哈希不会超过该值，
+ * 只有验证旧记录（迭代次数更高）时才走 node:crypto 的 pbkdf2，登录成功后随即按新参数重新哈希
+ */
+async function hashPasswordPBKDF2(password, salt, iterations, keyLength, digest) {
+  if (iterations > WEBCRYPTO_MAX_PBKDF2_ITERATIONS) {
+    return pbkdf2NodeAsync(password, salt, iterations, keyLength, digest);
+  }
+  const enc = new TextEncoder();
+  const key = await crypto.subtle.importKey("raw", enc.encode(password), "PBKDF2", false, [
+    "deriveBits",
+  ]);
+  const bits = await crypto.subtle.deriveBits(
+    { name: "PBKDF2", salt: enc.encode(salt), iterations, hash: WEBCRYPTO_DIGESTS[digest] },
+    key,
+    keyLength * 8
+  );
+  return Buffer.from(bits).toString("hex");
 }
 
 function timingSafeEqualHex(a, b) {
@@ -263,7 +497,7 @@ export async function handleUserRegistration(userData, env) {
     }
 
     // 检查用户是否已存在
-    const existingUser = await env.USERS.get(email);
+    const existingUser = await getUserByEmail(env, email);
     if (existingUser) {
       return {
         success: false,
@@ -272,10 +506,10 @@ export async function handleUserRegistration(userData, env) {
     }
 
     const salt = generateSalt();
-    const iterations = resolvePBKDF2Iterations(env);
+    const iterations = await resolveTargetIterations(env);
     const keyLength = resolvePBKDF2KeyLength(env);
     const digest = resolvePBKDF2Digest(env);
-    const hashedPassword = hashPasswordPBKDF2(password, salt, iterations, keyLength, digest);
+    const hashedPassword = await hashPasswordPBKDF2(password, salt, iterations, keyLength, digest);
 
     // 创建用户对象
     const user = {
@@ -295,11 +529,11 @@ export async function handleUserRegistration(userData, env) {
     };
 
     // 存储用户数据
-    await env.USERS.put(email, JSON.stringify(user));
+    await putUser(env, user);
 
     // 生成JWT token
     const token = await generateJWT(
-      { userId: user.id, email: user.email },
+      { userId: user.id, email: user.email, isActive: true },
       requireJwtSecret(env),
       604800
     );
@@ -346,17 +580,15 @@ export async function handleUserLogin(credentials, env) {
     }
 
     // 获取用户数据
-    const userData = await env.USERS.get(email);
-    if (!userData) {
+    const user = await getUserByEmail(env, email);
+    if (!user) {
       return {
         success: false,
         error: "邮箱或密码错误",
       };
     }
 
-    const user = JSON.parse(userData);
-
-    const passwordCheckResult = verifyPasswordAgainstUser(password, user, env);
+    const passwordCheckResult = await verifyPasswordAgainstUser(password, user, env);
     if (!passwordCheckResult.valid) {
       return {
         success: false,
@@ -365,8 +597,9 @@ export async function handleUserLogin(credentials, env) {
     }
 
     let userForPersistence = user;
-    if (passwordCheckResult.needsUpgrade) {
-      userForPersistence = upgradeUserPassword(user, password, env);
+    if (passwordCheckResult.needsUpgrade || passwordCheckResult.needsRehash) {
+      // 旧版哈希或成本参数已过时：用当前目标参数透明地重新哈希
+      userForPersistence = await upgradeUserPassword(user, password, env);
     } else if (passwordCheckResult.metadataNeedsUpdate) {
       userForPersistence = {
         ...userForPersistence,
@@ -387,11 +620,16 @@ export async function handleUserLogin(credentials, env) {
 
     // 更新最后登录时间
     userForPersistence.lastLoginAt = new Date().toISOString();
-    await env.USERS.put(email, JSON.stringify(userForPersistence));
+    await putUser(env, userForPersistence);
+    await invalidateCachedUser(env, email);
 
     // 生成JWT token
     const token = await generateJWT(
-      { userId: userForPersistence.id, email: userForPersistence.email },
+      {
+        userId: userForPersistence.id,
+        email: userForPersistence.email,
+        isActive: true,
+      },
       requireJwtSecret(env),
       604800
     );
@@ -420,13 +658,29 @@ export async function handleUserLogin(credentials, env) {
   }
 }
 
+/**
+ * token 签发时间在 AUTH_CLAIMS_TRUST_SECONDS 之内且 claims 中带有 isActive 时，可直接信任 claims
+ * 账户被禁用后，已签发的 token 最多还能在这段时间内通过快速路径；设为 0 关闭快速路径
+ */
+function claimsTrusted(claims, env) {
+  const value = parseInt(env?.AUTH_CLAIMS_TRUST_SECONDS ?? "", 10);
+  const trustSeconds = !Number.isNaN(value) && value >= 0 ? value : DEFAULT_CLAIMS_TRUST_SECONDS;
+  if (!trustSeconds || claims.isActive !== true || !claims.userId || !claims.email) {
+    return false;
+  }
+  const age = Math.floor(Date.now() / 1000) - (claims.iat || 0);
+  return age >= 0 && age <= trustSeconds;
+}
+
 /**
  * 验证token并获取用户信息
  * @param {string} token - JWT token
  * @param {Object} env - 环境变量
+ * @param {Object} [options]
+ * @param {boolean} [options.trustClaims] - 允许走 claims 快速路径（只返回 id 与 email）
  * @returns {Promise<Object>} 验证结果
  */
-export async function validateUserToken(token, env) {
+export async function validateUserToken(token, env, options = {}) {
   try {
     if (!token) {
       return {
@@ -437,7 +691,7 @@ export async function validateUserToken(token, env) {
     }
 
     // 标准HS256验证，失败再尝试旧制式；不再允许“仅解析载荷放行”
-    let claims = await verifyJWT(token, requireJwtSecret(env));
+    let claims = await verifyJWT(token, requireJwtSecret(env), env);
     let needIssueNewToken = false;
     const allowLegacy =
       String(env.JWT_ALLOW_LEGACY === undefined ? "true" : env.JWT_ALLOW_LEGACY).toLowerCase() !==
@@ -466,35 +720,39 @@ export async function validateUserToken(token, env) {
       }
     }
 
-    // 获取用户数据（统一按小写邮箱作为KV键），兼容旧键（原始大小写）
-    const emailRaw = claims.email || "";
-    const emailKey = emailRaw.toLowerCase();
-    let userData = await env.USERS.get(emailKey);
-    if (!userData) {
-      // 兼容旧版本：尝试原始大小写键
-      const legacyData = await env.USERS.get(emailRaw);
-      if (legacyData) {
-        // 迁移到小写键，保持向后兼容
-        await env.USERS.put(emailKey, legacyData);
-        userData = legacyData;
-      } else {
-        // KV 可能因最终一致性暂未可见：当签名有效但用户不存在时，基于claims构建最小用户并回填KV，避免首次Google登录后短时间401
-        const minimalUser = {
-          id: claims.userId,
-          username: emailKey.split("@")[0],
-          email: emailKey,
-          createdAt: new Date().toISOString(),
-          lastLoginAt: new Date().toISOString(),
-          isActive: true,
-          authProvider: "google",
-        };
+    // 快速路径：签发不久的 token 直接信任签名过的 claims，不读取用户记录
+    if (!needIssueNewToken && options.trustClaims && claimsTrusted(claims, env)) {
+      return {
+        success: true,
+        user: { id: claims.userId, email: claims.email },
+        fromClaims: true,
+      };
+    }
+
+    // 获取用户数据：按 claims 中的 userId 直接读取主记录，尚未迁移的旧用户再按邮箱查找
+    const emailKey = (claims.email || "").toLowerCase();
+    const user = await getCachedUser(env, emailKey, async () => {
+      const stored =
+        (await getUserById(env, claims.userId)) || (await getUserByEmail(env, emailKey));
+      if (stored) return stored;
+      // KV 可能因最终一致性暂未可见：当签名有效但用户不存在时，基于claims构建最小用户并回填KV，避免首次Google登录后短时间401
+      const minimalUser = {
+        id: claims.userId,
+        username: emailKey.split("@")[0],
+        email: emailKey,
+        createdAt: new Date().toISOString(),
+        lastLoginAt: new Date().toISOString(),
+        isActive: true,
+        authProvider: "google",
+      };
+      if (claims.userId) {
         try {
-          await env.USERS.put(emailKey, JSON.stringify(minimalUser));
+          await putUser(env, minimalUser);
         } catch (_) {}
-        userData = JSON.stringify(minimalUser);
       }
-    }
-    if (!userData) {
+      return minimalUser;
+    });
+    if (!user) {
       return {
         success: false,
         error: "用户不存在",
@@ -502,8 +760,6 @@ export async function validateUserToken(token, env) {
       };
     }
 
-    const user = JSON.parse(userData);
-
     // 检查用户状态
     if (!user.isActive) {
       return {
@@ -526,7 +782,7 @@ export async function validateUserToken(token, env) {
     if (needIssueNewToken) {
       try {
         rotatedToken = await generateJWT(
-          { userId: user.id, email: user.email },
+          { userId: user.id, email: user.email, isActive: true },
           requireJwtSecret(env),
           604800
         );
@@ -581,7 +837,8 @@ export async function authenticateUser(request, env) {
     return null;
   }
 
-  const result = await validateUserToken(token, env);
+  // 限流与反馈只需要用户 ID / 邮箱，允许走 claims 快速路径
+  const result = await validateUserToken(token, env, { trustClaims: true });
   return result.success ? result.user : null;
 }
 
@@ -655,8 +912,8 @@ export async function handleForgotPassword(requestData, env) {
     }
 
     // 检查用户是否存在
-    const userData = await env.USERS.get(email);
-    if (!userData) {
+    const user = await getUserByEmail(env, email);
+    if (!user) {
       // 为了安全，即使用户不存在也返回成功信息
       return {
         success: true,
@@ -664,9 +921,6 @@ export async function handleForgotPassword(requestData, env) {
       };
     }
 
-    // eslint-disable-next-line no-unused-vars
-    const user = JSON.parse(userData);
-
     // 生成重置token
     const resetToken = generateResetToken(email);
 
@@ -771,21 +1025,19 @@ export async function handleResetPassword(requestData, env) {
     }
 
     // 获取用户数据
-    const userData = await env.USERS.get(reset.email);
-    if (!userData) {
+    const user = await getUserByEmail(env, reset.email);
+    if (!user) {
       return {
         success: false,
         error: "用户不存在",
       };
     }
 
-    const user = JSON.parse(userData);
-
-    const iterations = resolvePBKDF2Iterations(env);
+    const iterations = await resolveTargetIterations(env);
     const keyLength = resolvePBKDF2KeyLength(env);
     const digest = resolvePBKDF2Digest(env);
     const salt = generateSalt();
-    const passwordHash = hashPasswordPBKDF2(newPassword, salt, iterations, keyLength, digest);
+    const passwordHash = await hashPasswordPBKDF2(newPassword, salt, iterations, keyLength, digest);
 
     // 更新用户密码
     user.passwordHash = passwordHash;
@@ -798,7 +1050,8 @@ export async function handleResetPassword(requestData, env) {
     user.updatedAt = new Date().toISOString();
 
     // 保存更新后的用户数据
-    await env.USERS.put(reset.email, JSON.stringify(user));
+    await putUser(env, user);
+    await invalidateCachedUser(env, reset.email);
 
     // 标记重置token为已使用
     reset.used = true;
@@ -899,13 +1152,11 @@ export async function handleGoogleLogin(requestData, env) {
     // 统一邮箱为小写并去除空格
     const emailLower = (googleUser.email || "").toLowerCase().trim();
 
-    // 检查用户是否已存在（以小写邮箱为KV键）
-    const userData = await env.USERS.get(emailLower);
-    let user;
+    // 检查用户是否已存在（按小写邮箱查找）
+    let user = await getUserByEmail(env, emailLower);
 
-    if (userData) {
+    if (user) {
       // 用户已存在，更新信息
-      user = JSON.parse(userData);
       user.lastLoginAt = new Date().toISOString();
       user.googleInfo = {
         name: googleUser.name,
@@ -936,12 +1187,13 @@ export async function handleGoogleLogin(requestData, env) {
       };
     }
 
-    // 保存用户数据（键为小写邮箱）
-    await env.USERS.put(emailLower, JSON.stringify(user));
+    // 保存用户数据
+    await putUser(env, user);
+    await invalidateCachedUser(env, emailLower);
 
     // 生成JWT token
     const token = await generateJWT(
-      { userId: user.id, email: user.email },
+      { userId: user.id, email: user.email, isActive: true },
       requireJwtSecret(env),
       604800
     );
@@ -1090,12 +1342,11 @@ export async function handleGoogleOAuth(requestData, env) {
     // 统一邮箱为小写并去除空格
     const emailLower = (googleUser.email || "").toLowerCase().trim();
 
-    // 查找或创建用户（以小写邮箱为KV键）
-    let user = await env.USERS.get(emailLower);
+    // 查找或创建用户（按小写邮箱查找）
+    let user = await getUserByEmail(env, emailLower);
 
     if (user) {
       // 用户已存在，更新登录时间和Google信息
-      user = JSON.parse(user);
       user.lastLoginAt = new Date().toISOString();
       user.googleInfo = {
         id: googleUser.id,
@@ -1108,7 +1359,8 @@ export async function handleGoogleOAuth(requestData, env) {
       }
       user.authProvider = "google";
 
-      await env.USERS.put(emailLower, JSON.stringify(user));
+      await putUser(env, user);
+      await invalidateCachedUser(env, emailLower);
     } else {
       // 创建新用户
       const userId = generateUUID();
@@ -1129,12 +1381,13 @@ export async function handleGoogleOAuth(requestData, env) {
         },
       };
 
-      await env.USERS.put(emailLower, JSON.stringify(user));
+      await putUser(env, user);
+      await invalidateCachedUser(env, emailLower);
     }
 
     // 生成JWT token
     const token = await generateJWT(
-      { userId: user.id, email: user.email },
+      { userId: user.id, email: user.email, isActive: true },
       requireJwtSecret(env),
       604800
     );
@@ -1194,24 +1447,41 @@ function generateUUID() {
   }
 }
 
-function verifyPasswordAgainstUser(password, user, env) {
+async function needsPBKDF2Rehash(env, iterations, keyLength, digest) {
+  if (
+    iterations > WEBCRYPTO_MAX_PBKDF2_ITERATIONS ||
+    keyLength !== resolvePBKDF2KeyLength(env) ||
+    digest !== resolvePBKDF2Digest(env)
+  ) {
+    return true;
+  }
+  const targetIterations = await resolveTargetIterations(env);
+  return Math.abs(iterations - targetIterations) > targetIterations * resolveRehashTolerance(env);
+}
+
+async function verifyPasswordAgainstUser(password, user, env) {
   const hasPBKDF2Meta =
     user?.passwordAlgorithm === "pbkdf2" || user?.passwordIterations || user?.passwordDigest;
 
   if (hasPBKDF2Meta) {
-    const iterations = user.passwordIterations || resolvePBKDF2Iterations(env);
+    const iterations =
+      user.passwordIterations || readConfiguredPBKDF2Iterations(env) || LEGACY_PBKDF2_ITERATIONS;
     const keyLength = user.passwordKeyLength || resolvePBKDF2KeyLength(env);
     const digest = user.passwordDigest || resolvePBKDF2Digest(env);
-    const derived = hashPasswordPBKDF2(password, user.salt, iterations, keyLength, digest);
+    const derived = await hashPasswordPBKDF2(password, user.salt, iterations, keyLength, digest);
     const valid = timingSafeEqualHex(derived, user.passwordHash);
     const metadataNeedsUpdate =
       user.passwordAlgorithm !== "pbkdf2" ||
       user.passwordIterations !== iterations ||
       user.passwordKeyLength !== keyLength ||
       user.passwordDigest !== digest;
+    // 存储的成本参数与当前目标不一致（迭代次数偏差超过容差或超出 WebCrypto 上限，
+    // 或摘要/长度配置已变更）时，登录成功后重新哈希；密码错误时不必解析目标（可能触发校准）
+    const needsRehash = valid && (await needsPBKDF2Rehash(env, iterations, keyLength, digest));
     return {
       valid,
       needsUpgrade: false,
+      needsRehash,
       metadataNeedsUpdate,
       iterations,
       keyLength,
@@ -1224,6 +1494,7 @@ function verifyPasswordAgainstUser(password, user, env) {
   return {
     valid,
     needsUpgrade: valid,
+    needsRehash: false,
     metadataNeedsUpdate: false,
     iterations: resolvePBKDF2Iterations(env),
     keyLength: resolvePBKDF2KeyLength(env),
@@ -1231,12 +1502,12 @@ function verifyPasswordAgainstUser(password, user, env) {
   };
 }
 
-function upgradeUserPassword(user, password, env) {
-  const iterations = resolvePBKDF2Iterations(env);
+async function upgradeUserPassword(user, password, env) {
+  const iterations = await resolveTargetIterations(env);
   const keyLength = resolvePBKDF2KeyLength(env);
   const digest = resolvePBKDF2Digest(env);
   const salt = generateSalt();
-  const hash = hashPasswordPBKDF2(password, salt, iterations, keyLength, digest);
+  const hash = await hashPasswordPBKDF2(password, salt, iterations, keyLength, digest);
 
   return {
     ...user,
@@ -1251,11 +1522,16 @@ function upgradeUserPassword(user, password, env) {
 }
 
 export const __authTestables = {
+  generateJWT,
+  verifyJWT,
+  resetJwtCaches,
   hashPasswordLegacy,
   hashPasswordPBKDF2,
   verifyPasswordAgainstUser,
   upgradeUserPassword,
   resolvePBKDF2Iterations,
+  resolveTargetIterations,
+  resetPBKDF2Calibration,
   resolvePBKDF2KeyLength,
   resolvePBKDF2Digest,
   resolveGoogleOAuthConfig,
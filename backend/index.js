@@ -9,9 +9,13 @@ import { registerAuthRoutes } from "./routes/auth.js";
 import { registerFeedbackRoutes } from "./routes/feedback.js";
 import { registerGenerationRoutes } from "./routes/generation.js";
 import { registerHealthRoutes } from "./routes/health.js";
+import { registerJobRoutes } from "./routes/jobs.js";
 import { registerTranslateRoutes } from "./routes/translate.js";
+import { handleJobQueueBatch } from "./services/jobs.js";
 import { logInfo } from "./utils/logger.js";
 
+export { GenerationCoordinator } from "./services/generation_coordinator.js";
+
 let routesRegistered = false;
 
 function registerAllRoutes() {
@@ -20,6 +24,7 @@ function registerAllRoutes() {
   registerFeedbackRoutes(registerRoute);
   registerTranslateRoutes(registerRoute);
   registerHealthRoutes(registerRoute);
+  registerJobRoutes(registerRoute);
 }
 
 function ensureRoutesRegistered() {
@@ -87,6 +92,14 @@ export default {
       }
       console.error(`[Worker Error] An unexpected error occurred in fetch: ${e.message}`);
       console.error(e.stack);
+      if (e.retryAfter && (e.status === 503 || e.status === 429)) {
+        return jsonResponse(
+          { error: "AI服务繁忙，请稍后再试。", details: e.message, retry_after: e.retryAfter },
+          env,
+          503,
+          { "Retry-After": String(e.retryAfter) }
+        );
+      }
       if (e.status === 429 || e.status === 502) {
         return jsonResponse(
           {
@@ -100,4 +113,9 @@ export default {
       return jsonResponse({ error: "服务器内部错误", details: e.message }, env, 500);
     }
   },
+
+  // Cloudflare Queues 消费者（GENERATION_QUEUE），执行 /api/jobs 提交的异步任务
+  async queue(batch, env, ctx) {
+    await handleJobQueueBatch(batch, env, ctx);
+  },
 };
@@ -1,13 +1,49 @@
 import { createJsonRoute, jsonResponse } from "../router.js";
 import {
-  generateImageFromPollinations,
-  generateAudioFromPollinations,
+  requestImageFromPollinations,
+  requestAudioFromPollinations,
 } from "../services/generation.js";
+import {
+  normalizeAudioCacheParams,
+  normalizeImageCacheParams,
+  readGenerationCacheById,
+  withGenerationCache,
+} from "../services/generation_cache.js";
+import {
+  createImageVariant,
+  imageTransformAvailable,
+  negotiateImageFormat,
+  readThumbnailSizes,
+} from "../services/image_variants.js";
+import { createSpeechStream } from "../services/tts_stream.js";
+import { clientAbortedResponse, isClientAborted } from "../utils/abort.js";
 import { arrayBufferToBase64 } from "../utils/base64.js";
+import { mapWithConcurrency } from "../utils/concurrency.js";
 import { logInfo, logWarn, logError } from "../utils/logger.js";
 import { recordMetric } from "../utils/metrics.js";
 import { checkRateLimitAndQuota } from "../utils/rate_limit.js";
-import { addCorsHeaders, addSecurityHeaders } from "../utils/response.js";
+import { binaryResponse, rangeResponse, upstreamErrorResponse } from "../utils/response.js";
+
+const DEFAULT_IMAGE_CONTENT_TYPE = "image/jpeg";
+const DEFAULT_BATCH_MAX_VARIANTS = 8;
+const DEFAULT_BATCH_CONCURRENCY = 3;
+const BATCH_VARIANT_FIELDS = ["seed", "width", "height", "model", "negative", "nologo"];
+const SSE_HEARTBEAT_MS = 15000;
+
+/**
+ * 是否以二进制流返回图片：?format=binary 或 Accept 明确要求 image/*（且未要求 JSON）
+ * 其余情况保持原有 JSON/base64 结构
+ */
+function wantsBinaryImage(request) {
+  try {
+    const format = new URL(request.url).searchParams.get("format");
+    if (format) {
+      return format.toLowerCase() === "binary";
+    }
+  } catch (_) {}
+  const accept = String(request.headers.get("Accept") || "").toLowerCase();
+  return accept.includes("image/") && !accept.includes("application/json");
+}
 
 export function registerGenerationRoutes(registerRoute) {
   registerRoute(
@@ -15,7 +51,7 @@ export function registerGenerationRoutes(registerRoute) {
       method: "POST",
       path: "/api/generate",
       bodyMessage: "生成请求体必须为 JSON",
-      async handler({ request, env, body }) {
+      async handler({ request, env, ctx, body }) {
         // --- 1. 风控与额度限制 ---
         const quotaCheck = await checkRateLimitAndQuota(request, env);
         if (!quotaCheck.allowed) {
@@ -48,10 +84,13 @@ export function registerGenerationRoutes(registerRoute) {
         }
 
         if (genType === "image") {
-          return handleImageGeneration(body, env);
+          return handleImageGeneration(body, env, request, ctx);
         }
 
-        return handleAudioGeneration(body, env, request);
+        if (body.stream === true) {
+          return handleAudioStream(body, env, request, ctx);
+        }
+        return handleAudioGeneration(body, env, request, ctx);
       },
     })
   );
@@ -61,7 +100,7 @@ export function registerGenerationRoutes(registerRoute) {
       method: "POST",
       path: "/api/pollinations/image",
       bodyMessage: "图片代理请求体必须为 JSON",
-      async handler({ request, env, body }) {
+      async handler({ request, env, ctx, body }) {
         // --- 1. 风控与额度限制 ---
         const quotaCheck = await checkRateLimitAndQuota(request, env);
         if (!quotaCheck.allowed) {
@@ -77,13 +116,278 @@ export function registerGenerationRoutes(registerRoute) {
           );
         }
 
-        return handlePollinationsImage(body, env);
+        return handlePollinationsImage(body, env, request, ctx);
+      },
+    })
+  );
+
+  // 按内容哈希回读已缓存的音频，支持 Range 以便播放器拖动进度时只取所需片段
+  registerRoute({
+    method: "GET",
+    path: /^\/api\/audio\/(?<id>[a-f0-9]{64})$/,
+    async handler({ request, env, ctx, params }) {
+      const cached = await readGenerationCacheById(env, ctx, "audio", params.id);
+      if (!cached) {
+        return jsonResponse({ error: "音频不存在或已过期" }, env, 404);
+      }
+      return rangeResponse(
+        cached.bytes,
+        env,
+        {
+          contentType: cached.contentType || "audio/mpeg",
+          headers: { "Cache-Control": "public, max-age=86400, immutable", "X-Cache": "HIT" },
+        },
+        request
+      );
+    },
+  });
+
+  // 按内容哈希回读已缓存的图片；?size= 取缩略图，输出格式按 Accept 协商（WebP/AVIF）
+  registerRoute({
+    method: "GET",
+    path: /^\/api\/image\/(?<id>[a-f0-9]{64})$/,
+    async handler({ request, env, ctx, params }) {
+      const size = new URL(request.url).searchParams.get("size");
+      const sizes = readThumbnailSizes(env);
+      if (size && !sizes[size]) {
+        return jsonResponse(
+          { error: `不支持的尺寸，可选: ${Object.keys(sizes).join(", ")}` },
+          env,
+          400
+        );
+      }
+      const cached = await readGenerationCacheById(env, ctx, "image", params.id);
+      if (!cached) {
+        return jsonResponse({ error: "图片不存在或已过期" }, env, 404);
+      }
+      return imageVariantResponse(cached.bytes, cached.contentType, env, ctx, request, {
+        width: size ? sizes[size] : null,
+        headers: { "Cache-Control": "public, max-age=86400, immutable", "X-Cache": "HIT" },
+      });
+    },
+  });
+
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/api/generate/batch",
+      bodyMessage: "批量生成请求体必须为 JSON",
+      async handler({ request, env, ctx, body }) {
+        return handleImageBatch(body, env, request, ctx);
+      },
+    })
+  );
+
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/api/generate/events",
+      bodyMessage: "生成请求体必须为 JSON",
+      async handler({ request, env, ctx, body }) {
+        if (!body.text || !["image", "audio"].includes(body.type)) {
+          return jsonResponse({ error: "缺少必要的参数: text 和 type（image 或 audio）" }, env, 400);
+        }
+        const quotaCheck = await checkRateLimitAndQuota(request, env);
+        if (!quotaCheck.allowed) {
+          return jsonResponse(
+            {
+              error: quotaCheck.error,
+              retry_after: quotaCheck.retryAfter,
+              remaining: quotaCheck.remaining,
+              total: quotaCheck.total,
+            },
+            env,
+            quotaCheck.status
+          );
+        }
+        return handleGenerationEvents(body, env, request, ctx);
       },
     })
   );
 }
 
-async function handleImageGeneration(body, env) {
+function readBatchLimit(env, key, fallback) {
+  const value = parseInt(env?.[key] || "", 10);
+  return Number.isNaN(value) || value < 1 ? fallback : value;
+}
+
+/**
+ * 生成（或从缓存读取）单张图片，返回上游 Response 与缓存结果
+ * 绑定了图片变换（env.IMAGES）时，随机种子的图片也以随机 id 存一份，供生成变体与缩略图；
+ * 未绑定时缩略图只是原图，不为此额外写一次持久层
+ * options: { signal, onEvent }，透传给上游调用
+ */
+function fetchCachedImage(env, ctx, params, options = {}) {
+  const { prompt, model, width, height, seed, negative, nologo } = params;
+  return withGenerationCache(
+    env,
+    ctx,
+    "image",
+    normalizeImageCacheParams(params),
+    () =>
+      requestImageFromPollinations(
+        prompt,
+        env,
+        width,
+        height,
+        seed,
+        nologo,
+        negative,
+        model,
+        options
+      ),
+    { storeById: imageTransformAvailable(env) }
+  );
+}
+
+/**
+ * 生成（或从缓存读取）一段语音，返回上游 Response、缓存结果与内容 id
+ */
+function fetchCachedAudio(env, ctx, params, options = {}) {
+  const { text, voice, model, speed } = params;
+  return withGenerationCache(
+    env,
+    ctx,
+    "audio",
+    normalizeAudioCacheParams({ text, voice, model, speed }),
+    () => requestAudioFromPollinations(text, env, voice, model, speed, options)
+  );
+}
+
+function readAudioParams(body, env) {
+  return {
+    text: body.text,
+    voice: body.voice || env.DEFAULT_AUDIO_VOICE || "nova",
+    model: body.model || env.DEFAULT_AUDIO_MODEL || "openai-audio",
+    speed: body.speed || 1.0,
+  };
+}
+
+/**
+ * 批量生成：一次请求包含多个变体（种子/尺寸/模型），额度按变体数一次性扣除，
+ * 以有界并发生成，并按完成顺序以 NDJSON 逐行返回，最后一行为 { done: true } 汇总
+ */
+async function handleImageBatch(body, env, request, ctx) {
+  const prompt = body.text;
+  const variants = body.variants;
+  const maxVariants = readBatchLimit(env, "BATCH_MAX_VARIANTS", DEFAULT_BATCH_MAX_VARIANTS);
+
+  if (!prompt || !Array.isArray(variants) || variants.length === 0) {
+    return jsonResponse({ error: "缺少必要的参数: text 和 variants" }, env, 400);
+  }
+  if (variants.length > maxVariants) {
+    return jsonResponse({ error: `单次批量最多 ${maxVariants} 个变体` }, env, 400);
+  }
+
+  const quotaCheck = await checkRateLimitAndQuota(request, env, { cost: variants.length });
+  if (!quotaCheck.allowed) {
+    return jsonResponse(
+      {
+        error: quotaCheck.error,
+        retry_after: quotaCheck.retryAfter,
+        remaining: quotaCheck.remaining,
+        total: quotaCheck.total,
+      },
+      env,
+      quotaCheck.status
+    );
+  }
+
+  const defaults = {
+    prompt,
+    model: body.model || "flux",
+    width: body.width,
+    height: body.height,
+    seed: body.seed,
+    negative: body.negative,
+    nologo: body.nologo,
+  };
+  const concurrency = readBatchLimit(env, "BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY);
+  const t0 = Date.now();
+  let succeeded = 0;
+
+  const { readable, writable } = new TransformStream();
+  const writer = writable.getWriter();
+  const encoder = new TextEncoder();
+  const writeLine = (payload) => writer.write(encoder.encode(`${JSON.stringify(payload)}\n`));
+  // 客户端断开（请求取消或输出流被关闭）时取消尚未完成的变体
+  const abortController = new AbortController();
+  const abortBatch = () => abortController.abort();
+  request.signal?.addEventListener("abort", abortBatch, { once: true });
+  writer.closed.catch(abortBatch);
+
+  logInfo(
+    env,
+    `[Worker Log] Processing image batch: ${variants.length} variants, concurrency ${concurrency}`
+  );
+
+  const work = mapWithConcurrency(variants, concurrency, async (variant, index) => {
+    const params = { ...defaults };
+    for (const field of BATCH_VARIANT_FIELDS) {
+      if (variant && variant[field] !== undefined) params[field] = variant[field];
+    }
+    try {
+      const { response: upstream, cache } = await fetchCachedImage(env, ctx, params, {
+        signal: abortController.signal,
+      });
+      const data = arrayBufferToBase64(await upstream.arrayBuffer());
+      succeeded += 1;
+      await writeLine({
+        index,
+        type: "image",
+        data,
+        format: "base64",
+        content_type: upstream.headers.get("Content-Type") || DEFAULT_IMAGE_CONTENT_TYPE,
+        seed: params.seed,
+        model: params.model,
+        cache,
+      });
+    } catch (error) {
+      if (abortController.signal.aborted) throw error;
+      logError(env, "[Generation] 批量图片生成失败", { index, error: error.message });
+      await writeLine({
+        index,
+        error: `图片生成失败: ${error.message}`,
+        retry_after: error.retryAfter,
+      });
+    }
+  })
+    .then(async () => {
+      const dt = Date.now() - t0;
+      recordMetric(env, "generate_image_batch", {
+        size: variants.length,
+        succeeded,
+        concurrency,
+        dt_ms: dt,
+      });
+      await writeLine({ done: true, total: variants.length, succeeded, dt_ms: dt });
+      await writer.close();
+    })
+    .catch((error) => {
+      // 客户端中途断开时写入会失败，此时直接放弃剩余输出
+      logWarn(env, "[Generation] 批量结果输出中断", { error: error.message });
+      abortBatch();
+      recordMetric(env, "request_aborted", {
+        route: "generate_image_batch",
+        dt_ms: Date.now() - t0,
+        succeeded,
+      });
+      return writer.abort(error).catch(() => {});
+    });
+  ctx?.waitUntil?.(work);
+
+  return binaryResponse(
+    readable,
+    env,
+    {
+      contentType: "application/x-ndjson; charset=utf-8",
+      headers: { "Cache-Control": "no-store" },
+    },
+    request
+  );
+}
+
+async function handleImageGeneration(body, env, request, ctx) {
   const t0 = Date.now();
   const actualPrompt = body.text;
   const actualWidth = body.width;
@@ -92,6 +396,7 @@ async function handleImageGeneration(body, env) {
   const seed = body.seed;
   const negative = body.negative;
   const model = body.model || "flux";
+  const binary = wantsBinaryImage(request);
 
   logInfo(
     env,
@@ -99,18 +404,36 @@ async function handleImageGeneration(body, env) {
   );
 
   try {
-    const imageArrayBuffer = await generateImageFromPollinations(
-      actualPrompt,
+    const { response: upstream, cache, id } = await fetchCachedImage(
       env,
-      actualWidth,
-      actualHeight,
-      seed,
-      actualNologo,
-      negative,
-      model
+      ctx,
+      {
+        prompt: actualPrompt,
+        model,
+        width: actualWidth,
+        height: actualHeight,
+        seed,
+        negative,
+        nologo: actualNologo,
+      },
+      { signal: request.signal }
     );
 
-    const base64Image = arrayBufferToBase64(imageArrayBuffer);
+    if (binary) {
+      recordMetric(env, "generate_image", {
+        success: true,
+        dt_ms: Date.now() - t0,
+        model,
+        w: actualWidth,
+        h: actualHeight,
+        seed: typeof seed === "number" ? seed : undefined,
+        mode: "binary",
+        cache,
+      });
+      return await binaryImageResponse(upstream, env, ctx, request, cache);
+    }
+
+    const base64Image = arrayBufferToBase64(await upstream.arrayBuffer());
     const dt = Date.now() - t0;
     recordMetric(env, "generate_image", {
       success: true,
@@ -119,13 +442,23 @@ async function handleImageGeneration(body, env) {
       w: actualWidth,
       h: actualHeight,
       seed: typeof seed === "number" ? seed : undefined,
+      cache,
     });
 
     return jsonResponse(
-      { type: "image", data: base64Image, format: "base64", content_type: "image/jpeg" },
+      {
+        type: "image",
+        data: base64Image,
+        format: "base64",
+        content_type: "image/jpeg",
+        ...imageLinks(id, env),
+      },
       env
     );
   } catch (error) {
+    if (isClientAborted(request)) {
+      return clientAbortedResponse(env, "generate_image", t0);
+    }
     const dt = Date.now() - t0;
     recordMetric(env, "generate_image", {
       success: false,
@@ -142,11 +475,11 @@ async function handleImageGeneration(body, env) {
       seed,
       error: error.message,
     });
-    return jsonResponse({ error: `图片生成失败: ${error.message}` }, env, 500);
+    return upstreamErrorResponse(error, env, `图片生成失败: ${error.message}`);
   }
 }
 
-async function handleAudioGeneration(body, env, request) {
+async function handleAudioGeneration(body, env, request, ctx) {
   const t0 = Date.now();
   const textPrompt = body.text;
   const voice = body.voice || env.DEFAULT_AUDIO_VOICE || "nova";
@@ -159,24 +492,32 @@ async function handleAudioGeneration(body, env, request) {
   );
 
   try {
-    const audioArrayBuffer = await generateAudioFromPollinations(
-      textPrompt,
+    const { response: upstream, cache, id } = await fetchCachedAudio(
       env,
-      voice,
-      model,
-      speed
+      ctx,
+      {
+        text: textPrompt,
+        voice,
+        model,
+        speed,
+      },
+      { signal: request.signal }
     );
-
-    const audioRespHeaders = new Headers();
-    audioRespHeaders.append("Content-Type", "audio/mpeg");
-    addCorsHeaders(audioRespHeaders, env, request);
-    addSecurityHeaders(audioRespHeaders, env);
+    const audioArrayBuffer = await upstream.arrayBuffer();
 
     const dt = Date.now() - t0;
-    recordMetric(env, "generate_audio", { success: true, dt_ms: dt, model, voice, speed });
+    recordMetric(env, "generate_audio", { success: true, dt_ms: dt, model, voice, speed, cache });
 
-    return new Response(audioArrayBuffer, { status: 200, headers: audioRespHeaders });
+    const headers = { "X-Cache": cache.toUpperCase() };
+    if (id) {
+      // 可缓存的结果给出稳定地址，播放器/分享链接可直接 GET 并按 Range 拖动
+      headers["Content-Location"] = `/api/audio/${id}`;
+    }
+    return rangeResponse(audioArrayBuffer, env, { contentType: "audio/mpeg", headers }, request);
   } catch (error) {
+    if (isClientAborted(request)) {
+      return clientAbortedResponse(env, "generate_audio", t0);
+    }
     const dt = Date.now() - t0;
     recordMetric(env, "generate_audio", {
       success: false,
@@ -192,11 +533,174 @@ async function handleAudioGeneration(body, env, request) {
       speed,
       error: error.message,
     });
-    return jsonResponse({ error: `音频生成失败: ${error.message}` }, env, 500);
+    return upstreamErrorResponse(error, env, `音频生成失败: ${error.message}`);
   }
 }
 
-async function handlePollinationsImage(body, env) {
+/**
+ * 流式音频：按句切分后逐段合成，首段完成即开始输出 audio/mpeg
+ * 分段失败时响应已开始，只能中断流；客户端应以实际收到的音频为准
+ */
+function handleAudioStream(body, env, request, ctx) {
+  const voice = body.voice || env.DEFAULT_AUDIO_VOICE || "nova";
+  const model = body.model || env.DEFAULT_AUDIO_MODEL || "openai-audio";
+  const speed = body.speed || 1.0;
+
+  const { stream, segments, done } = createSpeechStream(body.text, env, {
+    voice,
+    model,
+    speed,
+    signal: request.signal,
+    ctx,
+  });
+  if (segments === 0) {
+    return jsonResponse({ error: "文本中没有可朗读的内容" }, env, 400);
+  }
+  logInfo(env, `[Worker Log] Processing streaming audio: ${segments} segments, voice: ${voice}`);
+  ctx?.waitUntil?.(done);
+
+  return binaryResponse(
+    stream,
+    env,
+    {
+      contentType: "audio/mpeg",
+      headers: { "Cache-Control": "no-store", "X-Audio-Segments": String(segments) },
+    },
+    request
+  );
+}
+
+/**
+ * 以 Server-Sent Events 推送生成进度：queued → attempt / backoff / first_byte → completed | error
+ * 结果（base64）随 completed 事件返回；客户端断开（流被 cancel）时取消上游请求与退避等待
+ */
+function handleGenerationEvents(body, env, request, ctx) {
+  const type = body.type;
+  const encoder = new TextEncoder();
+  const abortController = new AbortController();
+  const t0 = Date.now();
+  let streamController;
+  let closed = false;
+
+  const send = (event, data) => {
+    if (closed) return;
+    try {
+      streamController.enqueue(encoder.encode(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`));
+    } catch (_) {}
+  };
+  const close = () => {
+    if (closed) return;
+    closed = true;
+    try {
+      streamController.close();
+    } catch (_) {}
+  };
+
+  const stream = new ReadableStream({
+    start(controller) {
+      streamController = controller;
+    },
+    cancel() {
+      closed = true;
+      abortController.abort();
+      recordMetric(env, "generate_events", { type, outcome: "cancelled", dt_ms: Date.now() - t0 });
+    },
+  });
+
+  // 代理/浏览器可能在长时间无数据时断开连接，定期发送注释行保活
+  const heartbeat = setInterval(() => {
+    if (closed) return;
+    try {
+      streamController.enqueue(encoder.encode(": ping\n\n"));
+    } catch (_) {}
+  }, SSE_HEARTBEAT_MS);
+
+  const onEvent = (event) => {
+    const elapsed = Date.now() - t0;
+    if (event.type === "attempt") {
+      send("attempt", {
+        attempt: event.attempt,
+        max_attempts: event.max_attempts,
+        elapsed_ms: elapsed,
+      });
+    } else if (event.type === "backoff") {
+      send("backoff", {
+        attempt: event.attempt,
+        wait_ms: event.wait_ms,
+        cause: event.cause,
+        elapsed_ms: elapsed,
+      });
+    } else if (event.type === "response") {
+      send(event.status < 400 ? "first_byte" : "upstream_status", {
+        attempt: event.attempt,
+        status: event.status,
+        elapsed_ms: elapsed,
+      });
+    }
+  };
+  const options = { signal: abortController.signal, onEvent };
+
+  const work = (async () => {
+    send("queued", { type, elapsed_ms: 0 });
+    try {
+      const { response: upstream, cache } =
+        type === "image"
+          ? await fetchCachedImage(
+              env,
+              ctx,
+              {
+                prompt: body.text,
+                model: body.model || "flux",
+                width: body.width,
+                height: body.height,
+                seed: body.seed,
+                negative: body.negative,
+                nologo: body.nologo,
+              },
+              options
+            )
+          : await fetchCachedAudio(env, ctx, readAudioParams(body, env), options);
+      if (cache === "hit") {
+        send("cache", { result: "hit", elapsed_ms: Date.now() - t0 });
+      }
+      const bytes = await upstream.arrayBuffer();
+      const contentType =
+        upstream.headers.get("Content-Type") ||
+        (type === "image" ? DEFAULT_IMAGE_CONTENT_TYPE : "audio/mpeg");
+      send("completed", {
+        type,
+        data: arrayBufferToBase64(bytes),
+        format: "base64",
+        content_type: contentType,
+        cache,
+        elapsed_ms: Date.now() - t0,
+      });
+      recordMetric(env, "generate_events", { type, outcome: "completed", dt_ms: Date.now() - t0 });
+    } catch (error) {
+      if (!abortController.signal.aborted) {
+        logError(env, "[Generation] 进度流生成失败", { type, error: error.message });
+        send("error", { error: error.message, retry_after: error.retryAfter });
+        recordMetric(env, "generate_events", { type, outcome: "error", dt_ms: Date.now() - t0 });
+      }
+    } finally {
+      clearInterval(heartbeat);
+      close();
+    }
+  })();
+  ctx?.waitUntil?.(work);
+
+  return binaryResponse(
+    stream,
+    env,
+    {
+      contentType: "text/event-stream; charset=utf-8",
+      headers: { "Cache-Control": "no-cache", "X-Accel-Buffering": "no" },
+    },
+    request
+  );
+}
+
+async function handlePollinationsImage(body, env, request, ctx) {
   const { prompt, model = "flux", width = 1024, height = 1024, seed = -1, nologo = true } = body;
 
   if (!prompt) {
@@ -204,6 +708,7 @@ async function handlePollinationsImage(body, env) {
   }
 
   const t0 = Date.now();
+  const binary = wantsBinaryImage(request);
 
   try {
     logInfo(
@@ -211,18 +716,35 @@ async function handlePollinationsImage(body, env) {
       `[Worker Log] Processing Pollinations image generation - Prompt: ${prompt.substring(0, 50)}..., Model: ${model}, Size: ${width}x${height}`
     );
 
-    const imageArrayBuffer = await generateImageFromPollinations(
-      prompt,
+    const { response: upstream, cache, id } = await fetchCachedImage(
       env,
-      width,
-      height,
-      seed,
-      nologo,
-      "",
-      model
+      ctx,
+      {
+        prompt,
+        model,
+        width,
+        height,
+        seed,
+        nologo,
+        negative: "",
+      },
+      { signal: request.signal }
     );
 
-    const base64Image = arrayBufferToBase64(imageArrayBuffer);
+    if (binary) {
+      recordMetric(env, "proxy_pollinations_image", {
+        success: true,
+        dt_ms: Date.now() - t0,
+        model,
+        w: width,
+        h: height,
+        mode: "binary",
+        cache,
+      });
+      return await binaryImageResponse(upstream, env, ctx, request, cache);
+    }
+
+    const base64Image = arrayBufferToBase64(await upstream.arrayBuffer());
     const dt = Date.now() - t0;
     recordMetric(env, "proxy_pollinations_image", {
       success: true,
@@ -230,6 +752,7 @@ async function handlePollinationsImage(body, env) {
       model,
       w: width,
       h: height,
+      cache,
     });
 
     return jsonResponse(
@@ -238,10 +761,14 @@ async function handlePollinationsImage(body, env) {
         data: base64Image,
         format: "base64",
         content_type: "image/jpeg",
+        ...imageLinks(id, env),
       },
       env
     );
   } catch (e) {
+    if (isClientAborted(request)) {
+      return clientAbortedResponse(env, "proxy_pollinations_image", t0);
+    }
     const dt = Date.now() - t0;
     recordMetric(env, "proxy_pollinations_image", {
       success: false,
@@ -257,6 +784,71 @@ async function handlePollinationsImage(body, env) {
       height,
       error: e.message,
     });
-    return jsonResponse({ error: `Pollinations图像生成失败: ${e.message}` }, env, 500);
+    return upstreamErrorResponse(e, env, `Pollinations图像生成失败: ${e.message}`);
+  }
+}
+
+/**
+ * 已缓存的图片附带稳定地址；绑定了图片变换时再附带各缩略图地址，列表/网格视图可直接按需加载小图
+ */
+function imageLinks(id, env) {
+  if (!id) return {};
+  if (!imageTransformAvailable(env)) {
+    return { id, url: `/api/image/${id}` };
+  }
+  const thumbnails = {};
+  for (const name of Object.keys(readThumbnailSizes(env))) {
+    thumbnails[name] = `/api/image/${id}?size=${name}`;
+  }
+  return { id, url: `/api/image/${id}`, thumbnails };
+}
+
+/**
+ * 按宽度/协商格式输出图片变体；未发生转换时保持原图类型
+ */
+async function imageVariantResponse(bytes, contentType, env, ctx, request, options = {}) {
+  const variant = await createImageVariant(env, ctx, bytes, {
+    width: options.width,
+    format: negotiateImageFormat(request, env),
+    contentType: contentType || DEFAULT_IMAGE_CONTENT_TYPE,
+  });
+  return binaryResponse(
+    variant.bytes,
+    env,
+    {
+      contentType: variant.contentType,
+      contentLength: variant.bytes.byteLength,
+      headers: { ...options.headers, Vary: "Accept", "X-Image-Variant": variant.variant },
+    },
+    request
+  );
+}
+
+/**
+ * 二进制图片响应：客户端接受 WebP/AVIF 且可转换时整图转码，否则直接转发上游流
+ */
+async function binaryImageResponse(upstream, env, ctx, request, cache) {
+  if (!imageTransformAvailable(env) || !negotiateImageFormat(request, env)) {
+    return streamUpstreamImage(upstream, env, request, cache);
   }
+  const bytes = await upstream.arrayBuffer();
+  return imageVariantResponse(bytes, upstream.headers.get("Content-Type"), env, ctx, request, {
+    headers: cache ? { "X-Cache": cache.toUpperCase() } : {},
+  });
+}
+
+/**
+ * 直接把上游图片流转发给客户端，透传 Content-Type / Content-Length
+ */
+function streamUpstreamImage(upstream, env, request, cache) {
+  return binaryResponse(
+    upstream.body,
+    env,
+    {
+      contentType: upstream.headers.get("Content-Type") || DEFAULT_IMAGE_CONTENT_TYPE,
+      contentLength: upstream.headers.get("Content-Length"),
+      headers: cache ? { "X-Cache": cache.toUpperCase() } : {},
+    },
+    request
+  );
 }
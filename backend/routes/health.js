@@ -1,10 +1,18 @@
-import { jsonResponse } from "../router.js";
+import { createJsonRoute, jsonResponse } from "../router.js";
 import { runHealthChecks } from "../services/health.js";
+import { warmPromptCache } from "../services/prompt_cache.js";
+import { migrateLegacyUsers } from "../services/user_store.js";
 
-function authorizeHealthRequest(request, env) {
+const DEFAULT_PROMPT_WARM_MAX = 100;
+
+/**
+ * 校验 HEALTH_CHECK_TOKEN（Bearer 头或 ?token=）
+ * 未配置令牌时只读的健康检查放行；requireToken 的变更类内部接口则一律拒绝（fail closed）
+ */
+function authorizeHealthRequest(request, env, { requireToken = false } = {}) {
   const expectedToken = String(env?.HEALTH_CHECK_TOKEN || "").trim();
   if (!expectedToken) {
-    return { authorized: true };
+    return { authorized: !requireToken };
   }
 
   const authHeader = request.headers.get("Authorization") || "";
@@ -35,4 +43,50 @@ export function registerHealthRoutes(registerRoute) {
       return jsonResponse(summary, env, statusCode, {}, request);
     },
   });
+
+  // 提示词缓存预热（scripts/warm-prompt-cache.mjs 使用内置模板调用），必须配置 HEALTH_CHECK_TOKEN
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/internal/prompts/warm",
+      bodyMessage: "预热请求体必须为 JSON",
+      async handler({ request, env, ctx, body }) {
+        if (!authorizeHealthRequest(request, env, { requireToken: true }).authorized) {
+          return jsonResponse({ status: "unauthorized" }, env, 401, {}, request);
+        }
+        const maxPrompts = parseInt(env.PROMPT_WARM_MAX || "", 10) || DEFAULT_PROMPT_WARM_MAX;
+        const prompts = Array.isArray(body.prompts)
+          ? [...new Set(body.prompts.filter((p) => typeof p === "string" && p.trim()))]
+          : [];
+        if (prompts.length === 0 || prompts.length > maxPrompts) {
+          return jsonResponse(
+            { error: `prompts 必须是 1-${maxPrompts} 条非空字符串` },
+            env,
+            400,
+            {},
+            request
+          );
+        }
+        const summary = await warmPromptCache(prompts, env, ctx);
+        return jsonResponse(summary, env, 200, {}, request);
+      },
+    })
+  );
+
+  // 旧版邮箱键一次性迁移到 user:<id> + email:<email> 布局，请求体为 {} 或 {"force": true}
+  // 已完成时直接返回上次的迁移结果，force 强制重跑；必须配置 HEALTH_CHECK_TOKEN 才能调用
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/internal/users/migrate",
+      bodyMessage: "迁移请求体必须为 JSON",
+      async handler({ request, env, body }) {
+        if (!authorizeHealthRequest(request, env, { requireToken: true }).authorized) {
+          return jsonResponse({ status: "unauthorized" }, env, 401, {}, request);
+        }
+        const summary = await migrateLegacyUsers(env, { force: body.force === true });
+        return jsonResponse(summary, env, summary.failed ? 500 : 200, {}, request);
+      },
+    })
+  );
 }
@@ -0,0 +1,99 @@
+import { createJsonRoute, jsonResponse } from "../router.js";
+import {
+  createJob,
+  getJobResult,
+  normalizeWebhookUrl,
+  publicJobView,
+  readJobStatus,
+} from "../services/jobs.js";
+import { logError, logWarn } from "../utils/logger.js";
+import { checkRateLimitAndQuota } from "../utils/rate_limit.js";
+import { rangeResponse } from "../utils/response.js";
+
+const JOB_ID_PATTERN = "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}";
+
+export function registerJobRoutes(registerRoute) {
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/api/jobs",
+      bodyMessage: "任务请求体必须为 JSON",
+      async handler({ request, env, ctx, body }) {
+        const { text, type } = body;
+        if (!text || !type) {
+          return jsonResponse({ error: "缺少必要的参数: text 和 type" }, env, 400);
+        }
+        if (!["image", "audio"].includes(type)) {
+          logWarn(env, "[Jobs] 不支持的任务类型", { type });
+          return jsonResponse({ error: "不支持的生成类型，请使用 image 或 audio" }, env, 400);
+        }
+        const webhook = normalizeWebhookUrl(body.webhook_url);
+        if (body.webhook_url && !webhook) {
+          return jsonResponse({ error: "webhook_url 必须是合法的 https 地址" }, env, 400);
+        }
+
+        // 额度在提交时扣除，与同步接口保持一致
+        const quotaCheck = await checkRateLimitAndQuota(request, env);
+        if (!quotaCheck.allowed) {
+          return jsonResponse(
+            {
+              error: quotaCheck.error,
+              retry_after: quotaCheck.retryAfter,
+              remaining: quotaCheck.remaining,
+              total: quotaCheck.total,
+            },
+            env,
+            quotaCheck.status
+          );
+        }
+
+        const { webhook_url: _webhook, type: _type, ...params } = body;
+        try {
+          const job = await createJob(env, ctx, { type, params, webhook });
+          return jsonResponse(
+            { ...publicJobView(job), status_url: `/api/jobs/${job.id}` },
+            env,
+            202,
+            { Location: `/api/jobs/${job.id}` },
+            request
+          );
+        } catch (error) {
+          logError(env, "[Jobs] 创建任务失败", { error: error.message });
+          return jsonResponse({ error: `创建任务失败: ${error.message}` }, env, 500);
+        }
+      },
+    })
+  );
+
+  registerRoute({
+    method: "GET",
+    path: new RegExp(`^/api/jobs/(?<id>${JOB_ID_PATTERN})$`),
+    async handler({ request, env, params }) {
+      const job = await readJobStatus(env, params.id);
+      if (!job) {
+        return jsonResponse({ error: "任务不存在或已过期" }, env, 404, {}, request);
+      }
+      const finished = job.status === "SUCCESS" || job.status === "FAILURE";
+      // 未完成时提示客户端轮询间隔
+      const headers = finished ? {} : { "Retry-After": "2" };
+      return jsonResponse(publicJobView(job), env, 200, headers, request);
+    },
+  });
+
+  registerRoute({
+    method: "GET",
+    path: new RegExp(`^/api/jobs/(?<id>${JOB_ID_PATTERN})/result$`),
+    async handler({ request, env, params }) {
+      const result = await getJobResult(env, params.id);
+      if (!result) {
+        return jsonResponse({ error: "任务结果不存在或尚未完成" }, env, 404, {}, request);
+      }
+      return rangeResponse(
+        result.bytes,
+        env,
+        { contentType: result.contentType, headers: { "Cache-Control": "private, max-age=3600" } },
+        request
+      );
+    },
+  });
+}
@@ -1,7 +1,145 @@
 import { createJsonRoute, jsonResponse } from "../router.js";
-import { optimizePromptWithDeepseek, translateNegativePrompt } from "../services/translate.js";
+import { optimizePromptCached, optimizePromptsCached } from "../services/prompt_cache.js";
+import { countBatchPacks } from "../services/translate.js";
+import {
+  translateNegativePromptsWithMemory,
+  translateNegativePromptWithMemory,
+} from "../services/translation_memory.js";
+import { clientAbortedResponse, isClientAborted } from "../utils/abort.js";
 import { logInfo, logWarn, logError } from "../utils/logger.js";
 import { recordMetric } from "../utils/metrics.js";
+import { checkRateLimitAndQuota } from "../utils/rate_limit.js";
+import { binaryResponse, upstreamErrorResponse } from "../utils/response.js";
+
+const DEFAULT_BATCH_MAX_TEXTS = 50;
+
+/**
+ * 校验批量请求的 texts：非空字符串数组，条数不超过 TEXT_BATCH_MAX_ITEMS
+ * @returns {{texts?: string[], error?: string}}
+ */
+function readBatchTexts(body, env) {
+  const value = parseInt(env?.TEXT_BATCH_MAX_ITEMS || "", 10);
+  const maxTexts = Number.isNaN(value) || value < 1 ? DEFAULT_BATCH_MAX_TEXTS : value;
+  const texts = body.texts;
+  if (!Array.isArray(texts) || texts.length === 0) {
+    return { error: "缺少必要的参数: texts" };
+  }
+  if (texts.length > maxTexts) {
+    return { error: `单次批量最多 ${maxTexts} 条` };
+  }
+  if (!texts.every((text) => typeof text === "string" && text.trim())) {
+    return { error: "texts 中的每一项都必须是非空字符串" };
+  }
+  return { texts };
+}
+
+/**
+ * 批量接口按打包后的上游调用次数扣除限流与额度
+ * @returns {Promise<Response|null>} 超限时返回错误响应
+ */
+async function checkBatchQuota(request, env, texts, kind) {
+  const quotaCheck = await checkRateLimitAndQuota(request, env, {
+    cost: countBatchPacks(texts, env, kind),
+  });
+  if (quotaCheck.allowed) return null;
+  return jsonResponse(
+    {
+      error: quotaCheck.error,
+      retry_after: quotaCheck.retryAfter,
+      remaining: quotaCheck.remaining,
+      total: quotaCheck.total,
+    },
+    env,
+    quotaCheck.status
+  );
+}
+
+function wantsOptimizeStream(body, request) {
+  if (body.stream === true) return true;
+  return (request.headers.get("Accept") || "").includes("text/event-stream");
+}
+
+/**
+ * 流式提示词优化（SSE）
+ * 事件：delta {text} 为增量清洗后的英文片段；done 为完整结果（以其 optimized_text 为准）；error
+ * 客户端断开时取消上游调用
+ */
+function handleOptimizeStream(prompt, env, ctx, request) {
+  const encoder = new TextEncoder();
+  const abortController = new AbortController();
+  const abortStream = () => abortController.abort();
+  request.signal?.addEventListener("abort", abortStream, { once: true });
+  const t0 = Date.now();
+  let streamController;
+  let closed = false;
+  let firstTokenMs;
+
+  const send = (event, data) => {
+    if (closed) return;
+    try {
+      streamController.enqueue(encoder.encode(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`));
+    } catch (_) {}
+  };
+  const stream = new ReadableStream({
+    start(controller) {
+      streamController = controller;
+    },
+    cancel() {
+      closed = true;
+      abortStream();
+    },
+  });
+
+  const work = (async () => {
+    try {
+      const { result, cache } = await optimizePromptCached(prompt, env, ctx, {
+        signal: abortController.signal,
+        onDelta(text) {
+          if (firstTokenMs === undefined) firstTokenMs = Date.now() - t0;
+          send("delta", { text });
+        },
+      });
+      const success = !result.error;
+      recordMetric(env, "prompt_optimize", {
+        success,
+        stream: true,
+        cache,
+        first_token_ms: firstTokenMs,
+        dt_ms: Date.now() - t0,
+      });
+      if (!success) {
+        logWarn(env, "[Prompts] 优化失败", { reason: result.error });
+      }
+      send(success ? "done" : "error", { ...result, cache });
+    } catch (error) {
+      if (abortController.signal.aborted) {
+        recordMetric(env, "request_aborted", { route: "prompt_optimize", dt_ms: Date.now() - t0 });
+      } else {
+        logError(env, `[Worker Error] 提示词优化失败: ${error.message}`);
+        send("error", { error: error.message });
+      }
+    } finally {
+      request.signal?.removeEventListener("abort", abortStream);
+      if (!closed) {
+        closed = true;
+        try {
+          streamController.close();
+        } catch (_) {}
+      }
+    }
+  })();
+  ctx?.waitUntil?.(work);
+
+  return binaryResponse(
+    stream,
+    env,
+    {
+      contentType: "text/event-stream; charset=utf-8",
+      headers: { "Cache-Control": "no-cache", "X-Accel-Buffering": "no" },
+    },
+    request
+  );
+}
 
 export function registerTranslateRoutes(registerRoute) {
   registerRoute(
@@ -9,7 +147,7 @@ export function registerTranslateRoutes(registerRoute) {
       method: "POST",
       path: "/api/translate",
       bodyMessage: "翻译请求体必须为 JSON",
-      async handler({ env, body }) {
+      async handler({ request, env, ctx, body }) {
         const text = body.text;
         if (!text) {
           logWarn(env, "[Translate] 缺少 text 参数");
@@ -19,17 +157,24 @@ export function registerTranslateRoutes(registerRoute) {
         const t0 = Date.now();
         try {
           logInfo(env, `[Worker Log] Processing translation request`);
-          const translated = await translateNegativePrompt(text, env);
+          const translated = await translateNegativePromptWithMemory(text, env, ctx, {
+            signal: request.signal,
+          });
           const dt = Date.now() - t0;
           recordMetric(env, "translate_negative", {
             success: translated.translated,
             dt_ms: dt,
+            memory_hits: translated.memory_hits,
+            llm_phrases: translated.llm_phrases,
           });
           if (!translated.translated) {
             logWarn(env, "[Translate] 翻译失败", { textSnippet: text.slice(0, 30) });
           }
           return jsonResponse(translated, env, translated.translated ? 200 : 400);
         } catch (error) {
+          if (isClientAborted(request)) {
+            return clientAbortedResponse(env, "translate_negative", t0);
+          }
           const dt = Date.now() - t0;
           recordMetric(env, "translate_negative", {
             success: false,
@@ -37,7 +182,7 @@ export function registerTranslateRoutes(registerRoute) {
             error: error.message,
           });
           logError(env, `[Worker Error] 翻译服务调用失败: ${error.message}`);
-          return jsonResponse({ error: error.message }, env, 500);
+          return upstreamErrorResponse(error, env, error.message);
         }
       },
     })
@@ -48,27 +193,38 @@ export function registerTranslateRoutes(registerRoute) {
       method: "POST",
       path: "/api/prompts/optimize",
       bodyMessage: "提示词优化请求体必须为 JSON",
-      async handler({ env, body }) {
+      async handler({ request, env, ctx, body }) {
         const prompt = body.text;
         if (!prompt) {
           logWarn(env, "[Prompts] 缺少 text 参数");
           return jsonResponse({ error: "缺少必要的参数: text" }, env, 400);
         }
+        if (wantsOptimizeStream(body, request)) {
+          return handleOptimizeStream(prompt, env, ctx, request);
+        }
 
         const t0 = Date.now();
         try {
-          const optimized = await optimizePromptWithDeepseek(prompt, env);
+          const { result: optimized, cache } = await optimizePromptCached(prompt, env, ctx, {
+            signal: request.signal,
+          });
           const success = !optimized.error;
           const dt = Date.now() - t0;
           recordMetric(env, "prompt_optimize", {
             success,
             dt_ms: dt,
+            cache,
           });
           if (!success) {
             logWarn(env, "[Prompts] 优化失败", { reason: optimized.error });
           }
-          return jsonResponse(optimized, env, success ? 200 : 500);
+          return jsonResponse(optimized, env, success ? 200 : 500, {
+            "X-Cache": cache.toUpperCase(),
+          });
         } catch (error) {
+          if (isClientAborted(request)) {
+            return clientAbortedResponse(env, "prompt_optimize", t0);
+          }
           const dt = Date.now() - t0;
           recordMetric(env, "prompt_optimize", {
             success: false,
@@ -81,4 +237,80 @@ export function registerTranslateRoutes(registerRoute) {
       },
     })
   );
+
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/api/translate/batch",
+      bodyMessage: "翻译请求体必须为 JSON",
+      async handler({ request, env, ctx, body }) {
+        const { texts, error } = readBatchTexts(body, env);
+        if (error) {
+          logWarn(env, "[Translate] 批量参数无效", { error });
+          return jsonResponse({ error }, env, 400);
+        }
+        const quotaError = await checkBatchQuota(request, env, texts, "translate");
+        if (quotaError) return quotaError;
+
+        const t0 = Date.now();
+        try {
+          // 先查翻译记忆，只有未命中的短语才进入批量翻译
+          const { results, stats } = await translateNegativePromptsWithMemory(texts, env, ctx, {
+            signal: request.signal,
+          });
+          recordMetric(env, "translate_negative_batch", {
+            size: texts.length,
+            succeeded: results.filter((result) => result.translated).length,
+            ...stats,
+            dt_ms: Date.now() - t0,
+          });
+          return jsonResponse({ results, ...stats }, env);
+        } catch (error) {
+          if (isClientAborted(request)) {
+            return clientAbortedResponse(env, "translate_negative_batch", t0);
+          }
+          logError(env, `[Worker Error] 批量翻译失败: ${error.message}`);
+          return upstreamErrorResponse(error, env, error.message);
+        }
+      },
+    })
+  );
+
+  registerRoute(
+    createJsonRoute({
+      method: "POST",
+      path: "/api/prompts/optimize/batch",
+      bodyMessage: "提示词优化请求体必须为 JSON",
+      async handler({ request, env, ctx, body }) {
+        const { texts, error } = readBatchTexts(body, env);
+        if (error) {
+          logWarn(env, "[Prompts] 批量参数无效", { error });
+          return jsonResponse({ error }, env, 400);
+        }
+        const quotaError = await checkBatchQuota(request, env, texts, "optimize");
+        if (quotaError) return quotaError;
+
+        const t0 = Date.now();
+        try {
+          const { results, cache, stats } = await optimizePromptsCached(texts, env, ctx, {
+            signal: request.signal,
+          });
+          recordMetric(env, "prompt_optimize_batch", {
+            size: texts.length,
+            succeeded: results.filter((result) => !result.error).length,
+            cache_hits: cache.hits,
+            ...stats,
+            dt_ms: Date.now() - t0,
+          });
+          return jsonResponse({ results, cache, ...stats }, env);
+        } catch (error) {
+          if (isClientAborted(request)) {
+            return clientAbortedResponse(env, "prompt_optimize_batch", t0);
+          }
+          logError(env, `[Worker Error] 批量提示词优化失败: ${error.message}`);
+          return jsonResponse({ error: error.message }, env, 500);
+        }
+      },
+    })
+  );
 }
@@ -1,5 +1,11 @@
-import { fetchWithRetry } from "../utils/fetch.js";
+import { resolveRetryBudgetMs } from "../utils/fetch.js";
+import { fetchWithHedging } from "../utils/hedge.js";
 import { logInfo } from "../utils/logger.js";
+import { recordMetric } from "../utils/metrics.js";
+import { singleFlightResponse } from "../utils/single_flight.js";
+
+import { coordinatorEnabled, fetchViaCoordinator } from "./generation_coordinator.js";
+import { routeUpstream } from "./provider_router.js";
 
 /**
  * 获取 Pollinations API Token（必需）
@@ -10,14 +16,66 @@ function getApiToken(env) {
 }
 
 /**
- * 使用 Pollinations API 生成图片
+ * 合并相同的并发上游请求：优先走跨 isolate 协调器（如已绑定），否则在 isolate 内 single-flight
+ * key 由调用方根据规范化后的完整请求生成，相同 key 的调用方各自拿到独立的 Response
+ * target = { model, path }：端点由 provider_router 按模型选择，失败时自动切换到其他端点
+ * policy.signal / policy.onEvent 属于单个调用方：取消只让本调用方退出，所有调用方都取消后才取消上游
+ */
+async function coalescedFetch(env, kind, key, target, init, apiName, policy = {}) {
+  const { signal, onEvent, ...sharedPolicy } = policy;
+  // 预算属于整次路由：换端点时只用剩余部分
+  const budgetMs = sharedPolicy.budgetMs ?? resolveRetryBudgetMs(env, apiName);
+  if (coordinatorEnabled(env)) {
+    const response = await routeUpstream(
+      env,
+      target.model,
+      (base, routing) =>
+        fetchViaCoordinator(
+          env,
+          key,
+          `${base}${target.path}`,
+          init,
+          apiName,
+          { ...sharedPolicy, ...routing },
+          { signal }
+        ),
+      { signal, budgetMs }
+    );
+    recordMetric(env, "single_flight", { kind, role: "coordinator" });
+    return response;
+  }
+  const { response, leader } = await singleFlightResponse(
+    key,
+    (flight) =>
+      routeUpstream(
+        env,
+        target.model,
+        (base, routing) =>
+          fetchWithHedging(`${base}${target.path}`, init, apiName, env, {
+            ...sharedPolicy,
+            ...routing,
+            signal: flight.signal,
+            onEvent: flight.emit,
+          }),
+        { signal: flight.signal, budgetMs }
+      ),
+    { signal, onEvent }
+  );
+  recordMetric(env, "single_flight", { kind, role: leader ? "leader" : "follower" });
+  return response;
+}
+
+/**
+ * 请求 Pollinations 图片接口并返回上游 Response（未读取 body）
  * 2026-03 更新：统一使用 gen.pollinations.ai，所有请求需要 Bearer Token
  * 端点：GET /image/{prompt}
  * 可用模型：flux, zimage, kontext, nanobanana, nanobanana-2, nanobanana-pro,
  *           seedream5, seedream, seedream-pro, gptimage, gptimage-large,
  *           qwen-image, grok-imagine, klein, p-image, nova-canvas 等
+ * 调用方可直接把 response.body 流式转发给客户端，避免整图缓冲
+ * options.signal 取消本次调用，options.onEvent 接收上游重试进度事件
  */
-export async function generateImageFromPollinations(
+export async function requestImageFromPollinations(
   prompt,
   env,
   width,
@@ -25,9 +83,9 @@ export async function generateImageFromPollinations(
   seed,
   nologo,
   negative,
-  model = "flux"
+  model = "flux",
+  options = {}
 ) {
-  const genApiBase = env.POLLINATIONS_GEN_API_BASE || "https://gen.pollinations.ai";
   const apiToken = getApiToken(env);
 
   if (!apiToken) {
@@ -46,11 +104,15 @@ export async function generateImageFromPollinations(
   if (negative) params.append("negative_prompt", negative);
   if (model) params.append("model", model);
 
-  const fullUrl = `${genApiBase}/image/${encodeURIComponent(prompt)}?${params.toString()}`;
+  const path = `/image/${encodeURIComponent(prompt)}?${params.toString()}`;
   logInfo(env, `[Worker Log] 生成图片 (模型: ${model})`);
 
-  const response = await fetchWithRetry(
-    fullUrl,
+  // 路径已包含全部规范化参数，可直接作为合并键（与最终选中的端点无关）
+  return coalescedFetch(
+    env,
+    "image",
+    `image:${path}`,
+    { model, path },
     {
       method: "GET",
       headers: {
@@ -58,26 +120,54 @@ export async function generateImageFromPollinations(
       },
     },
     "Pollinations Image API",
-    env
+    // 图片生成长尾明显，慢请求超过延迟分位后发起对冲（需 HEDGE_ENABLED=true）
+    { hedge: true, signal: options.signal, onEvent: options.onEvent }
   );
+}
 
+/**
+ * 使用 Pollinations API 生成图片，返回完整的 ArrayBuffer
+ */
+export async function generateImageFromPollinations(
+  prompt,
+  env,
+  width,
+  height,
+  seed,
+  nologo,
+  negative,
+  model = "flux",
+  options = {}
+) {
+  const response = await requestImageFromPollinations(
+    prompt,
+    env,
+    width,
+    height,
+    seed,
+    nologo,
+    negative,
+    model,
+    options
+  );
   return response.arrayBuffer();
 }
 
 /**
- * 使用 Pollinations API 生成音频（文本转语音）
+ * 请求 Pollinations 语音接口（文本转语音）并返回上游 Response（未读取 body）
  * 2026-03 更新：使用 OpenAI 兼容的 POST /v1/audio/speech 端点
  * 直接将输入文本朗读为语音，而非聊天回答
  * 可用声音：alloy, echo, fable, onyx, nova, shimmer, ash, ballad, coral, sage, verse 等
+ * options 同 requestImageFromPollinations
  */
-export async function generateAudioFromPollinations(
+export async function requestAudioFromPollinations(
   prompt,
   env,
   voice = "nova",
   model = "openai-audio",
-  speed
+  speed,
+  options = {}
 ) {
-  const genApiBase = env.POLLINATIONS_GEN_API_BASE || "https://gen.pollinations.ai";
   const apiToken = getApiToken(env);
 
   if (!apiToken) {
@@ -98,22 +188,39 @@ export async function generateAudioFromPollinations(
     requestBody.speed = speed;
   }
 
-  const fullUrl = `${genApiBase}/v1/audio/speech`;
   logInfo(env, `[Worker Log] 生成音频 TTS (voice: ${voice}, speed: ${speed || 1.0})`);
 
-  const response = await fetchWithRetry(
-    fullUrl,
+  const serializedBody = JSON.stringify(requestBody);
+  return coalescedFetch(
+    env,
+    "audio",
+    `audio:${serializedBody}`,
+    { model, path: "/v1/audio/speech" },
     {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
         Authorization: `Bearer ${apiToken}`,
       },
-      body: JSON.stringify(requestBody),
+      body: serializedBody,
     },
     "Pollinations TTS API",
-    env
+    // TTS 是纯函数式调用，5xx/网络错误后重试是安全的
+    { idempotent: true, signal: options.signal, onEvent: options.onEvent }
   );
+}
 
+/**
+ * 使用 Pollinations API 生成音频，返回完整的 ArrayBuffer
+ */
+export async function generateAudioFromPollinations(
+  prompt,
+  env,
+  voice = "nova",
+  model = "openai-audio",
+  speed,
+  options = {}
+) {
+  const response = await requestAudioFromPollinations(prompt, env, voice, model, speed, options);
   return response.arrayBuffer();
 }
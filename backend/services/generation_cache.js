@@ -0,0 +1,392 @@
+/**
+ * 生成结果缓存（内容寻址）
+ * 固定 seed 的生成请求对我们而言是确定性的：以全部参数的规范化哈希为键，
+ * 先查边缘 Cache API，再查 R2（GENERATION_BUCKET）或 KV（IMAGES_CACHE）持久层。
+ * seed 缺省或为 -1 的请求每次结果不同，不按参数查找缓存；调用方需要时（storeById）
+ * 以随机 id 存一份，只能按返回的 id 回读（变体、缩略图），不会被其他请求命中。
+ * 边缘缓存之前还有一层 isolate 内 LRU（GENERATION_CACHE_MEMORY_MB 字节预算 + TTL），
+ * 用于示例句、分享链接等被反复请求的热点结果。
+ */
+import { logWarn } from "../utils/logger.js";
+import { LruCache } from "../utils/lru.js";
+import { recordMetric } from "../utils/metrics.js";
+
+const CACHE_VERSION = "v1";
+const KEY_PREFIX = "gen_cache";
+const EDGE_CACHE_ORIGIN = "https://generation-cache.internal";
+const DEFAULT_TTL_SECONDS = 86400;
+const DEFAULT_MAX_MB = 4;
+const DEFAULT_MEMORY_MB = 16;
+
+let memoryCache = null;
+
+function resolveTtlSeconds(env) {
+  const value = parseInt(env?.GENERATION_CACHE_TTL_SECONDS || "", 10);
+  // KV 的 expirationTtl 最小为 60 秒
+  if (!Number.isNaN(value) && value >= 60) {
+    return value;
+  }
+  return DEFAULT_TTL_SECONDS;
+}
+
+function resolveMaxBytes(env) {
+  const value = parseFloat(env?.GENERATION_CACHE_MAX_MB || "");
+  const mb = !Number.isNaN(value) && value > 0 ? value : DEFAULT_MAX_MB;
+  return Math.floor(mb * 1024 * 1024);
+}
+
+function getMemoryCache(env) {
+  if (memoryCache === null) {
+    const value = parseFloat(env?.GENERATION_CACHE_MEMORY_MB ?? "");
+    const mb = !Number.isNaN(value) && value >= 0 ? value : DEFAULT_MEMORY_MB;
+    memoryCache =
+      mb > 0
+        ? new LruCache({
+            maxBytes: Math.floor(mb * 1024 * 1024),
+            ttlMs: resolveTtlSeconds(env) * 1000,
+            sizeOf: (entry) => entry.bytes.byteLength,
+          })
+        : false;
+  }
+  return memoryCache || null;
+}
+
+function cacheEnabled(env) {
+  return String(env?.GENERATION_CACHE_ENABLED || "true").toLowerCase() !== "false";
+}
+
+function runInBackground(ctx, promise) {
+  const guarded = promise.catch(() => {});
+  if (ctx && typeof ctx.waitUntil === "function") {
+    ctx.waitUntil(guarded);
+  }
+  return guarded;
+}
+
+function normalizeSeed(seed) {
+  const value = typeof seed === "number" ? seed : parseInt(seed ?? "", 10);
+  // 与 requestImageFromPollinations 保持一致：0 / -1 / 非数字都不会传给上游，即随机结果
+  if (!Number.isFinite(value) || value === -1 || value === 0) {
+    return null;
+  }
+  return value;
+}
+
+function normalizeDimension(value) {
+  const n = parseInt(value ?? "", 10);
+  return Number.isNaN(n) ? null : n;
+}
+
+function normalizeSpeed(speed) {
+  const value = Number(speed);
+  return Number.isFinite(value) && value > 0 ? Math.round(value * 100) / 100 : 1;
+}
+
+/**
+ * 规范化语音合成参数：文本做 NFC 与空白折叠，voice/model 小写，speed 保留两位小数
+ * TTS 对相同输入的输出视为确定性的，因此总是可缓存；空文本返回 null
+ */
+export function normalizeAudioCacheParams(params = {}) {
+  const text = String(params.text || "")
+    .normalize("NFC")
+    .replace(/\s+/g, " ")
+    .trim();
+  if (!text) {
+    return null;
+  }
+  return {
+    text,
+    voice: String(params.voice || "nova").trim().toLowerCase(),
+    model: String(params.model || "openai-audio").trim().toLowerCase(),
+    speed: normalizeSpeed(params.speed),
+  };
+}
+
+/**
+ * 规范化图片生成参数；随机（不可缓存）的请求返回 null
+ */
+export function normalizeImageCacheParams(params = {}) {
+  const seed = normalizeSeed(params.seed);
+  if (seed === null) {
+    return null;
+  }
+  return {
+    prompt: String(params.prompt || "").trim(),
+    model: String(params.model || "flux").trim().toLowerCase(),
+    width: normalizeDimension(params.width),
+    height: normalizeDimension(params.height),
+    seed,
+    negative: String(params.negative || "").trim(),
+    nologo: Boolean(params.nologo),
+  };
+}
+
+async function sha256Hex(text) {
+  const digest = await crypto.subtle.digest("SHA-256", new TextEncoder().encode(text));
+  return [...new Uint8Array(digest)].map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+/**
+ * 计算缓存键：kind + 规范化参数（键顺序固定）的 SHA-256
+ */
+export async function buildGenerationCacheKey(kind, normalized) {
+  const hash = await sha256Hex(`${CACHE_VERSION}:${kind}:${JSON.stringify(normalized)}`);
+  return `${KEY_PREFIX}:${kind}:${hash}`;
+}
+
+function edgeCacheRequest(key) {
+  return new Request(`${EDGE_CACHE_ORIGIN}/${encodeURIComponent(key)}`);
+}
+
+function getEdgeCache() {
+  try {
+    return typeof caches !== "undefined" && caches.default ? caches.default : null;
+  } catch (_) {
+    return null;
+  }
+}
+
+/**
+ * 持久层适配：优先 R2（GENERATION_BUCKET），否则使用 IMAGES_CACHE KV
+ */
+function resolveBackingStore(env) {
+  const bucket = env?.GENERATION_BUCKET;
+  if (bucket && typeof bucket.get === "function") {
+    return {
+      name: "r2",
+      async get(key) {
+        const object = await bucket.get(key);
+        if (!object) return null;
+        const expiresAt = Number(object.customMetadata?.expiresAt || 0);
+        if (expiresAt && expiresAt < Date.now()) {
+          return null;
+        }
+        return {
+          bytes: await object.arrayBuffer(),
+          contentType: object.httpMetadata?.contentType || "application/octet-stream",
+        };
+      },
+      async put(key, bytes, contentType, ttlSeconds) {
+        await bucket.put(key, bytes, {
+          httpMetadata: { contentType },
+          customMetadata: { expiresAt: String(Date.now() + ttlSeconds * 1000) },
+        });
+      },
+    };
+  }
+
+  const kv = env?.IMAGES_CACHE;
+  if (kv && typeof kv.getWithMetadata === "function") {
+    return {
+      name: "kv",
+      async get(key) {
+        const { value, metadata } = await kv.getWithMetadata(key, "arrayBuffer");
+        if (!value) return null;
+        return {
+          bytes: value,
+          contentType: metadata?.contentType || "application/octet-stream",
+        };
+      },
+      async put(key, bytes, contentType, ttlSeconds) {
+        await kv.put(key, bytes, { expirationTtl: ttlSeconds, metadata: { contentType } });
+      },
+    };
+  }
+
+  return null;
+}
+
+async function readCache(env, ctx, key) {
+  const memory = getMemoryCache(env);
+  const inMemory = memory?.get(key);
+  if (inMemory) {
+    // 内存中的 ArrayBuffer 会被多个响应复用，每次返回副本
+    return { bytes: inMemory.bytes.slice(0), contentType: inMemory.contentType, layer: "memory" };
+  }
+
+  const edge = getEdgeCache();
+  if (edge) {
+    try {
+      const hit = await edge.match(edgeCacheRequest(key));
+      if (hit) {
+        const bytes = await hit.arrayBuffer();
+        const contentType = hit.headers.get("Content-Type") || "application/octet-stream";
+        memory?.set(key, { bytes: bytes.slice(0), contentType });
+        return { bytes, contentType, layer: "edge" };
+      }
+    } catch (error) {
+      logWarn(env, "[GenerationCache] 边缘缓存读取失败", { error: error.message });
+    }
+  }
+
+  const store = resolveBackingStore(env);
+  if (!store) return null;
+  try {
+    const hit = await store.get(key);
+    if (!hit) return null;
+    memory?.set(key, { bytes: hit.bytes.slice(0), contentType: hit.contentType });
+    if (edge) {
+      runInBackground(ctx, putEdge(edge, key, hit.bytes, hit.contentType, resolveTtlSeconds(env)));
+    }
+    return { ...hit, layer: store.name };
+  } catch (error) {
+    logWarn(env, "[GenerationCache] 持久层读取失败", {
+      store: store.name,
+      error: error.message,
+    });
+    return null;
+  }
+}
+
+function putEdge(edge, key, bytes, contentType, ttlSeconds) {
+  return edge.put(
+    edgeCacheRequest(key),
+    new Response(bytes, {
+      headers: {
+        "Content-Type": contentType,
+        "Cache-Control": `public, max-age=${ttlSeconds}`,
+      },
+    })
+  );
+}
+
+async function writeCache(env, kind, key, bytes, contentType) {
+  const maxBytes = resolveMaxBytes(env);
+  if (bytes.byteLength > maxBytes) {
+    recordMetric(env, "generation_cache", {
+      kind,
+      result: "skip_oversize",
+      bytes: bytes.byteLength,
+    });
+    return;
+  }
+  const ttlSeconds = resolveTtlSeconds(env);
+  getMemoryCache(env)?.set(key, { bytes: bytes.slice(0), contentType });
+  const tasks = [];
+  const edge = getEdgeCache();
+  if (edge) tasks.push(putEdge(edge, key, bytes, contentType, ttlSeconds));
+  const store = resolveBackingStore(env);
+  if (store) tasks.push(store.put(key, bytes, contentType, ttlSeconds));
+  const results = await Promise.allSettled(tasks);
+  for (const result of results) {
+    if (result.status === "rejected") {
+      logWarn(env, "[GenerationCache] 写入失败", { kind, error: result.reason?.message });
+    }
+  }
+  recordMetric(env, "generation_cache", { kind, result: "store", bytes: bytes.byteLength });
+}
+
+function readContentLength(response) {
+  const length = parseInt(response.headers.get("Content-Length") || "", 10);
+  return Number.isNaN(length) ? null : length;
+}
+
+function randomCacheId() {
+  const bytes = crypto.getRandomValues(new Uint8Array(32));
+  return [...bytes].map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+/**
+ * 一路返回给调用方，一路在后台读完写入缓存；超出大小上限的响应原样返回
+ * @returns {{response: Response, sized: boolean}|null} 写入缓存时为新的 Response，否则为 null；
+ *   sized 表示长度已知且在上限内（长度未知的响应读完后仍可能因超限而不写入）
+ */
+function teeIntoCache(env, ctx, kind, key, upstream) {
+  const length = readContentLength(upstream);
+  if (!upstream.body || (length !== null && length > resolveMaxBytes(env))) {
+    return null;
+  }
+  const [clientBranch, cacheBranch] = upstream.body.tee();
+  const contentType = upstream.headers.get("Content-Type") || "application/octet-stream";
+  runInBackground(
+    ctx,
+    new Response(cacheBranch)
+      .arrayBuffer()
+      .then((bytes) => writeCache(env, kind, key, bytes, contentType))
+  );
+  return {
+    response: new Response(clientBranch, { status: upstream.status, headers: upstream.headers }),
+    sized: length !== null,
+  };
+}
+
+/**
+ * 以缓存包裹一次生成调用
+ * @param {Object} env
+ * @param {Object} ctx - ExecutionContext，用于 waitUntil 后台写缓存
+ * @param {string} kind - 结果类型，如 "image"
+ * @param {Object|null} normalized - 规范化参数；null 表示不可缓存（绕过）
+ * @param {Function} produce - 缓存未命中时调用，返回上游 Response
+ * @param {Object} [options]
+ * @param {boolean} [options.storeById] - 不可缓存的结果也以随机 id 存一份，供按 id 回读
+ * @returns {Promise<{response: Response, cache: "hit"|"miss"|"bypass", id?: string}>}
+ *   id 为内容哈希（或随机 id），可配合 readGenerationCacheById 按 id 回读；
+ *   只在结果已缓存或确定会写入（长度已知且未超限）时返回
+ */
+export async function withGenerationCache(env, ctx, kind, normalized, produce, options = {}) {
+  if (!normalized || !cacheEnabled(env)) {
+    recordMetric(env, "generation_cache", { kind, result: "bypass" });
+    const upstream = await produce();
+    if (!options.storeById || !cacheEnabled(env) || !upstream.ok) {
+      return { response: upstream, cache: "bypass" };
+    }
+    // 长度未知时无法确定能否写入，随机 id 又只能按 id 回读，干脆不存
+    const length = readContentLength(upstream);
+    if (length === null) {
+      return { response: upstream, cache: "bypass" };
+    }
+    const id = randomCacheId();
+    const stored = teeIntoCache(env, ctx, kind, `${KEY_PREFIX}:${kind}:${id}`, upstream);
+    return stored
+      ? { response: stored.response, cache: "bypass", id }
+      : { response: upstream, cache: "bypass" };
+  }
+
+  const key = await buildGenerationCacheKey(kind, normalized);
+  const id = key.slice(`${KEY_PREFIX}:${kind}:`.length);
+  const cached = await readCache(env, ctx, key);
+  if (cached) {
+    recordMetric(env, "generation_cache", { kind, result: "hit", layer: cached.layer });
+    return {
+      response: new Response(cached.bytes, {
+        headers: {
+          "Content-Type": cached.contentType,
+          "Content-Length": String(cached.bytes.byteLength),
+        },
+      }),
+      cache: "hit",
+      id,
+    };
+  }
+
+  recordMetric(env, "generation_cache", { kind, result: "miss" });
+  const upstream = await produce();
+  const stored = teeIntoCache(env, ctx, kind, key, upstream);
+  if (!stored) {
+    return { response: upstream, cache: "miss" };
+  }
+  // 只有确定会写入的结果才返回 id
+  return stored.sized
+    ? { response: stored.response, cache: "miss", id }
+    : { response: stored.response, cache: "miss" };
+}
+
+/**
+ * 按内容哈希读取缓存结果（不会触发生成）；未命中返回 null
+ * @param {string} kind
+ * @param {string} id - withGenerationCache 返回的 id（64 位十六进制）
+ * @returns {Promise<{bytes: ArrayBuffer, contentType: string, layer: string}|null>}
+ */
+export async function readGenerationCacheById(env, ctx, kind, id) {
+  if (!cacheEnabled(env) || !/^[a-f0-9]{64}$/.test(String(id || ""))) {
+    return null;
+  }
+  const cached = await readCache(env, ctx, `${KEY_PREFIX}:${kind}:${id}`);
+  recordMetric(env, "generation_cache", {
+    kind,
+    result: cached ? "hit" : "miss",
+    layer: cached?.layer,
+    by: "id",
+  });
+  return cached;
+}
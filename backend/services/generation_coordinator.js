@@ -0,0 +1,68 @@
+/**
+ * 跨 isolate 的生成请求合并协调器（Durable Object）
+ * 每个规范化请求键对应一个 DO 实例（idFromName），实例内部复用 single-flight 合并，
+ * 因此不同 isolate 中的相同请求也只会触发一次上游调用。
+ * 仅当 wrangler.toml 绑定了 GENERATION_COORDINATOR 时启用，否则退化为 isolate 内合并。
+ */
+import { fetchWithHedging } from "../utils/hedge.js";
+import { singleFlightResponse } from "../utils/single_flight.js";
+
+const COORDINATOR_URL = "https://generation-coordinator.internal/fetch";
+
+export class GenerationCoordinator {
+  constructor(state, env) {
+    this.state = state;
+    this.env = env;
+  }
+
+  async fetch(request) {
+    const { key, url, init, apiName, policy } = await request.json();
+    try {
+      const { response } = await singleFlightResponse(key, () =>
+        fetchWithHedging(url, init, apiName, this.env, policy)
+      );
+      return response;
+    } catch (error) {
+      const payload = {
+        error: error.message,
+        status: error.status,
+        retryAfter: error.retryAfter,
+      };
+      return new Response(JSON.stringify(payload), {
+        status: 502,
+        headers: { "Content-Type": "application/json" },
+      });
+    }
+  }
+}
+
+export function coordinatorEnabled(env) {
+  const namespace = env?.GENERATION_COORDINATOR;
+  return Boolean(namespace && typeof namespace.idFromName === "function");
+}
+
+/**
+ * 通过协调器发起上游请求；返回 null 表示未绑定协调器
+ * options.signal 仅取消本 isolate 到协调器的调用，协调器内的共享上游请求不受影响
+ */
+export async function fetchViaCoordinator(env, key, url, init, apiName, policy = {}, options = {}) {
+  if (!coordinatorEnabled(env)) {
+    return null;
+  }
+  const namespace = env.GENERATION_COORDINATOR;
+  const stub = namespace.get(namespace.idFromName(key));
+  const response = await stub.fetch(COORDINATOR_URL, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ key, url, init, apiName, policy }),
+    signal: options.signal,
+  });
+  if (!response.ok) {
+    const payload = await response.json().catch(() => ({}));
+    const err = new Error(payload.error || `${apiName} 协调器调用失败 (HTTP ${response.status})`);
+    err.status = payload.status || response.status;
+    err.retryAfter = payload.retryAfter;
+    throw err;
+  }
+  return response;
+}
@@ -1,5 +1,15 @@
+import { getCircuitStats } from "../utils/circuit_breaker.js";
 import { logInfo } from "../utils/logger.js";
 
+import { getPromptCacheStats } from "./prompt_cache.js";
+import { getProviderStats } from "./provider_router.js";
+
+const UPSTREAM_APIS = [
+  "Pollinations Image API",
+  "Pollinations TTS API",
+  "DeepSeek Chat Completions",
+];
+
 const REQUIRED_ENV_VARS = [
   "JWT_SECRET",
   "POLLINATIONS_IMAGE_API_BASE",
@@ -60,11 +70,56 @@ function runConfigCheck(env) {
   };
 }
 
+/**
+ * 上游端点路由状态：某个模型的全部端点都处于熔断时视为降级
+ */
+function runProviderCheck(env) {
+  const { models, endpoints } = getProviderStats(env);
+  const stateOf = new Map(endpoints.map((endpoint) => [endpoint.base, endpoint.state]));
+  const unavailable = Object.entries(models)
+    .filter(([, bases]) => bases.every((base) => stateOf.get(base) === "open"))
+    .map(([model]) => model);
+
+  return {
+    name: "upstream.providers",
+    status: unavailable.length ? "degraded" : "ok",
+    details: { unavailable, endpoints },
+  };
+}
+
+async function runCircuitCheck(env) {
+  const circuits = await getCircuitStats(env, UPSTREAM_APIS);
+  // 按端点熔断时由路由换端点兜底：只有某个 API 的端点全部熔断才算降级
+  const byApi = new Map();
+  for (const [key, stats] of Object.entries(circuits)) {
+    const api = stats.api || key;
+    byApi.set(api, [...(byApi.get(api) || []), stats]);
+  }
+  const open = [...byApi]
+    .filter(([, list]) => {
+      const scoped = list.filter((stats) => stats.endpoint);
+      const unscoped = list.filter((stats) => !stats.endpoint);
+      return (
+        unscoped.some((stats) => stats.state !== "closed") ||
+        (scoped.length > 0 && scoped.every((stats) => stats.state !== "closed"))
+      );
+    })
+    .map(([api]) => api);
+  return {
+    name: "upstream.circuits",
+    status: open.length ? "degraded" : "ok",
+    details: { open, circuits },
+  };
+}
+
 export async function runHealthChecks(env) {
   const checks = [];
 
   checks.push(runConfigCheck(env));
   checks.push(await runKvCheck(env));
+  checks.push(runProviderCheck(env));
+  checks.push(await runCircuitCheck(env));
+  checks.push({ name: "cache.prompt_optimize", status: "ok", details: getPromptCacheStats() });
 
   const aggregateStatus = normalizeStatus(checks.map((check) => check.status));
   const summary = {
@@ -0,0 +1,140 @@
+/**
+ * 图片后处理：格式转换（WebP/AVIF）与缩略图
+ * 编解码交给 Cloudflare Images 绑定（env.IMAGES）在 Worker 内完成；未绑定时原样返回上游字节。
+ * 变体以「源图内容哈希 + 宽度 + 格式」为键写入生成结果缓存，同一张图的同一变体只转换一次。
+ */
+import { logWarn } from "../utils/logger.js";
+import { recordMetric } from "../utils/metrics.js";
+
+import { withGenerationCache } from "./generation_cache.js";
+
+const OUTPUT_FORMATS = {
+  avif: "image/avif",
+  webp: "image/webp",
+};
+const DEFAULT_OUTPUT_FORMATS = "avif,webp";
+const DEFAULT_THUMBNAIL_SIZES = "thumb:256,preview:512";
+const DEFAULT_QUALITY = 80;
+
+function readList(value, fallback) {
+  return String(value || fallback)
+    .split(",")
+    .map((item) => item.trim().toLowerCase())
+    .filter(Boolean);
+}
+
+export function imageTransformAvailable(env) {
+  return Boolean(env?.IMAGES && typeof env.IMAGES.input === "function");
+}
+
+/**
+ * 解析 IMAGE_THUMBNAIL_SIZES（如 "thumb:256,preview:512"）为 { 名称: 宽度 }
+ */
+export function readThumbnailSizes(env) {
+  const sizes = {};
+  for (const item of readList(env?.IMAGE_THUMBNAIL_SIZES, DEFAULT_THUMBNAIL_SIZES)) {
+    const [name, width] = item.split(":");
+    const value = parseInt(width || "", 10);
+    if (name && !Number.isNaN(value) && value > 0) {
+      sizes[name] = value;
+    }
+  }
+  return sizes;
+}
+
+/**
+ * 按 Accept 协商输出格式：在 IMAGE_OUTPUT_FORMATS 允许的格式中取客户端 q 值最高者（同分按配置顺序）
+ * 客户端未声明支持任何可选格式时返回 null，表示保持原图格式
+ */
+export function negotiateImageFormat(request, env) {
+  const accepted = new Map();
+  for (const part of String(request?.headers?.get("Accept") || "").split(",")) {
+    const [type, ...paramList] = part.trim().toLowerCase().split(";");
+    const qParam = paramList.map((p) => p.trim()).find((p) => p.startsWith("q="));
+    const q = qParam ? parseFloat(qParam.slice(2)) : 1;
+    if (type && !Number.isNaN(q)) accepted.set(type, q);
+  }
+
+  let best = null;
+  let bestQ = 0;
+  for (const name of readList(env?.IMAGE_OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMATS)) {
+    const mime = OUTPUT_FORMATS[name];
+    // 通配符 */* 或 image/* 不代表客户端能解码 AVIF/WebP，只认显式声明
+    const q = mime ? (accepted.get(mime) ?? 0) : 0;
+    if (q > bestQ) {
+      best = mime;
+      bestQ = q;
+    }
+  }
+  return best;
+}
+
+async function sha256Hex(bytes) {
+  const digest = await crypto.subtle.digest("SHA-256", bytes);
+  return [...new Uint8Array(digest)].map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+function resolveQuality(env) {
+  const value = parseInt(env?.IMAGE_VARIANT_QUALITY || "", 10);
+  return !Number.isNaN(value) && value > 0 && value <= 100 ? value : DEFAULT_QUALITY;
+}
+
+async function transformImage(env, bytes, { width, format }) {
+  let pipeline = env.IMAGES.input(new Response(bytes).body);
+  if (width) {
+    pipeline = pipeline.transform({ width, fit: "scale-down" });
+  }
+  const result = await pipeline.output({ format, quality: resolveQuality(env) });
+  return result.response();
+}
+
+/**
+ * 生成图片变体
+ * @param {Object} env
+ * @param {Object} ctx
+ * @param {ArrayBuffer} bytes - 原图
+ * @param {Object} spec - { width?: number, format?: string|null, contentType: 原图类型 }
+ * @returns {Promise<{bytes: ArrayBuffer, contentType: string, variant: "original"|"hit"|"miss"|"bypass"}>}
+ */
+export async function createImageVariant(env, ctx, bytes, spec) {
+  const { width = null, format = null, contentType } = spec;
+  if ((!width && !format) || !imageTransformAvailable(env)) {
+    return { bytes, contentType, variant: "original" };
+  }
+
+  const t0 = Date.now();
+  const outputFormat = format || contentType;
+  try {
+    const source = await sha256Hex(bytes);
+    const { response, cache } = await withGenerationCache(
+      env,
+      ctx,
+      "image_variant",
+      { source, width, format: outputFormat },
+      () => transformImage(env, bytes, { width, format: outputFormat })
+    );
+    const output = await response.arrayBuffer();
+    recordMetric(env, "image_variant", {
+      format: outputFormat,
+      width: width || undefined,
+      in_bytes: bytes.byteLength,
+      out_bytes: output.byteLength,
+      cache,
+      dt_ms: Date.now() - t0,
+    });
+    return {
+      bytes: output,
+      contentType: response.headers.get("Content-Type") || outputFormat,
+      variant: cache,
+    };
+  } catch (error) {
+    // 转换失败不影响出图，退回原图
+    logWarn(env, "[ImageVariant] 图片转换失败，返回原图", {
+      format: outputFormat,
+      width,
+      error: error.message,
+    });
+    recordMetric(env, "image_variant", { format: outputFormat, width, error: error.message });
+    return { bytes, contentType, variant: "original" };
+  }
+}
@@ -0,0 +1,364 @@
+/**
+ * 异步生成任务
+ * POST /api/jobs 立即返回任务 id，实际生成由队列消费者执行：
+ * 绑定了 GENERATION_QUEUE（Cloudflare Queues）时投递消息，由 index.js 的 queue 处理器消费；
+ * 未绑定时退化为 ctx.waitUntil 在当前请求结束后后台执行。
+ * 任务状态存于 JOBS KV（未绑定则使用 IMAGES_CACHE），结果字节存于 R2（GENERATION_BUCKET）或同一 KV。
+ * 队列模式下上游限流、5xx 与熔断等可恢复的失败交由队列重试（最多 JOB_QUEUE_MAX_RETRIES 次）；
+ * waitUntil 可能在执行中途被平台取消，读取状态时超过 JOB_TIMEOUT_SECONDS 仍未结束的任务按超时失败处理。
+ */
+import { logError, logInfo, logWarn } from "../utils/logger.js";
+import { recordMetric } from "../utils/metrics.js";
+
+import { requestAudioFromPollinations, requestImageFromPollinations } from "./generation.js";
+import {
+  normalizeAudioCacheParams,
+  normalizeImageCacheParams,
+  withGenerationCache,
+} from "./generation_cache.js";
+
+const JOB_PREFIX = "JOB:";
+const JOB_RESULT_PREFIX = "JOB_RESULT:";
+const DEFAULT_JOB_TTL_SECONDS = 86400;
+const WEBHOOK_TIMEOUT_MS = 5000;
+// 与 wrangler.toml 中队列消费者的 max_retries 保持一致
+const DEFAULT_QUEUE_MAX_RETRIES = 3;
+// 队列消费者最长可运行 15 分钟；waitUntil 在响应结束后约 30 秒即可能被取消
+const DEFAULT_QUEUE_TIMEOUT_SECONDS = 900;
+const DEFAULT_BACKGROUND_TIMEOUT_SECONDS = 120;
+
+export const JOB_STATUS = {
+  PENDING: "PENDING",
+  RUNNING: "RUNNING",
+  SUCCESS: "SUCCESS",
+  FAILURE: "FAILURE",
+};
+
+function resolveJobTtlSeconds(env) {
+  const value = parseInt(env?.JOB_TTL_SECONDS || "", 10);
+  return !Number.isNaN(value) && value >= 60 ? value : DEFAULT_JOB_TTL_SECONDS;
+}
+
+function getJobStore(env) {
+  return env?.JOBS || env?.IMAGES_CACHE || null;
+}
+
+function hasQueue(env) {
+  return Boolean(env?.GENERATION_QUEUE && typeof env.GENERATION_QUEUE.send === "function");
+}
+
+function resolveJobTimeoutMs(env) {
+  const value = parseInt(env?.JOB_TIMEOUT_SECONDS || "", 10);
+  if (!Number.isNaN(value) && value > 0) return value * 1000;
+  if (hasQueue(env)) return DEFAULT_QUEUE_TIMEOUT_SECONDS * 1000;
+  return DEFAULT_BACKGROUND_TIMEOUT_SECONDS * 1000;
+}
+
+function resolveQueueMaxRetries(env) {
+  const value = parseInt(env?.JOB_QUEUE_MAX_RETRIES ?? "", 10);
+  return !Number.isNaN(value) && value >= 0 ? value : DEFAULT_QUEUE_MAX_RETRIES;
+}
+
+/**
+ * 可交给队列重试的失败：上游限流、服务端错误与熔断
+ */
+function isRetryableJobError(error) {
+  if (error?.code === "circuit_open") return true;
+  const status = error?.status;
+  return status === 429 || status >= 500;
+}
+
+async function saveJob(env, job) {
+  const store = getJobStore(env);
+  job.updated_at = Date.now();
+  await store.put(`${JOB_PREFIX}${job.id}`, JSON.stringify(job), {
+    expirationTtl: resolveJobTtlSeconds(env),
+  });
+  return job;
+}
+
+export async function getJob(env, id) {
+  const store = getJobStore(env);
+  if (!store || !id) return null;
+  return store.get(`${JOB_PREFIX}${id}`, "json");
+}
+
+/**
+ * 校验 webhook 地址：仅接受 https
+ */
+export function normalizeWebhookUrl(value) {
+  if (!value) return null;
+  try {
+    const url = new URL(String(value));
+    return url.protocol === "https:" ? url.toString() : null;
+  } catch (_) {
+    return null;
+  }
+}
+
+/**
+ * 创建任务并投递执行
+ * @param {Object} env
+ * @param {Object} ctx
+ * @param {Object} spec - { type: "image"|"audio", params: Object, webhook?: string }
+ * @returns {Promise<Object>} 任务记录
+ */
+export async function createJob(env, ctx, spec) {
+  if (!getJobStore(env)) {
+    throw new Error("任务存储未配置（需要 JOBS 或 IMAGES_CACHE KV 绑定）");
+  }
+  const job = {
+    id: crypto.randomUUID(),
+    type: spec.type,
+    params: spec.params,
+    webhook: spec.webhook || null,
+    status: JOB_STATUS.PENDING,
+    created_at: Date.now(),
+  };
+  await saveJob(env, job);
+
+  const queue = hasQueue(env);
+  if (queue) {
+    await env.GENERATION_QUEUE.send({ jobId: job.id });
+  } else {
+    const run = runJob(env, ctx, job.id).catch((error) =>
+      logError(env, "[Jobs] 后台任务执行失败", { id: job.id, error: error.message })
+    );
+    ctx?.waitUntil?.(run);
+  }
+  recordMetric(env, "job", { event: "created", type: job.type, queued: queue });
+  return job;
+}
+
+async function produceJobResult(env, ctx, job) {
+  const p = job.params || {};
+  if (job.type === "audio") {
+    const voice = p.voice || env.DEFAULT_AUDIO_VOICE || "nova";
+    const model = p.model || env.DEFAULT_AUDIO_MODEL || "openai-audio";
+    const speed = p.speed || 1.0;
+    return withGenerationCache(
+      env,
+      ctx,
+      "audio",
+      normalizeAudioCacheParams({ text: p.text, voice, model, speed }),
+      () => requestAudioFromPollinations(p.text, env, voice, model, speed)
+    );
+  }
+  const model = p.model || "flux";
+  return withGenerationCache(
+    env,
+    ctx,
+    "image",
+    normalizeImageCacheParams({ ...p, prompt: p.text, model }),
+    () =>
+      requestImageFromPollinations(
+        p.text,
+        env,
+        p.width,
+        p.height,
+        p.seed,
+        p.nologo,
+        p.negative,
+        model
+      )
+  );
+}
+
+async function storeJobResult(env, id, bytes, contentType) {
+  const ttlSeconds = resolveJobTtlSeconds(env);
+  const bucket = env.GENERATION_BUCKET;
+  if (bucket && typeof bucket.put === "function") {
+    await bucket.put(`${JOB_RESULT_PREFIX}${id}`, bytes, {
+      httpMetadata: { contentType },
+      customMetadata: { expiresAt: String(Date.now() + ttlSeconds * 1000) },
+    });
+    return;
+  }
+  await getJobStore(env).put(`${JOB_RESULT_PREFIX}${id}`, bytes, {
+    expirationTtl: ttlSeconds,
+    metadata: { contentType },
+  });
+}
+
+/**
+ * 读取任务结果字节
+ * @returns {Promise<{bytes: ArrayBuffer, contentType: string}|null>}
+ */
+export async function getJobResult(env, id) {
+  const key = `${JOB_RESULT_PREFIX}${id}`;
+  const bucket = env.GENERATION_BUCKET;
+  if (bucket && typeof bucket.get === "function") {
+    const object = await bucket.get(key);
+    if (!object) return null;
+    return {
+      bytes: await object.arrayBuffer(),
+      contentType: object.httpMetadata?.contentType || "application/octet-stream",
+    };
+  }
+  const store = getJobStore(env);
+  if (!store || typeof store.getWithMetadata !== "function") return null;
+  const { value, metadata } = await store.getWithMetadata(key, "arrayBuffer");
+  if (!value) return null;
+  return { bytes: value, contentType: metadata?.contentType || "application/octet-stream" };
+}
+
+async function hmacHex(secret, payload) {
+  const key = await crypto.subtle.importKey(
+    "raw",
+    new TextEncoder().encode(secret),
+    { name: "HMAC", hash: "SHA-256" },
+    false,
+    ["sign"]
+  );
+  const signature = await crypto.subtle.sign("HMAC", key, new TextEncoder().encode(payload));
+  return [...new Uint8Array(signature)].map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+/**
+ * 任务结束后通知 webhook；配置 JOB_WEBHOOK_SECRET 时附带 HMAC-SHA256 签名
+ * 通知失败只记录日志，不影响任务状态
+ */
+async function notifyWebhook(env, job) {
+  if (!job.webhook) return;
+  const payload = JSON.stringify(publicJobView(job));
+  const headers = { "Content-Type": "application/json" };
+  if (env.JOB_WEBHOOK_SECRET) {
+    headers["X-Webhook-Signature"] = `sha256=${await hmacHex(env.JOB_WEBHOOK_SECRET, payload)}`;
+  }
+  try {
+    const response = await fetch(job.webhook, {
+      method: "POST",
+      headers,
+      body: payload,
+      signal: AbortSignal.timeout(WEBHOOK_TIMEOUT_MS),
+    });
+    recordMetric(env, "job", { event: "webhook", status: response.status });
+    if (!response.ok) {
+      logWarn(env, "[Jobs] webhook 返回非 2xx", { id: job.id, status: response.status });
+    }
+  } catch (error) {
+    logWarn(env, "[Jobs] webhook 通知失败", { id: job.id, error: error.message });
+  }
+}
+
+/**
+ * 读取任务状态：执行超时的任务（waitUntil 被取消、消费者崩溃等）标记为失败，客户端不再无限轮询
+ * 队列模式下 PENDING 可能只是在排队或等待重试，不按超时处理
+ */
+export async function readJobStatus(env, id) {
+  const job = await getJob(env, id);
+  if (!job) return null;
+  const now = Date.now();
+  const timeoutMs = resolveJobTimeoutMs(env);
+  const stale =
+    (job.status === JOB_STATUS.RUNNING && now - (job.started_at || job.created_at) > timeoutMs) ||
+    (job.status === JOB_STATUS.PENDING && !hasQueue(env) && now - job.created_at > timeoutMs);
+  if (!stale) return job;
+
+  job.status = JOB_STATUS.FAILURE;
+  job.error = "任务执行超时";
+  job.timed_out = true;
+  job.finished_at = now;
+  await saveJob(env, job);
+  logWarn(env, "[Jobs] 任务执行超时", { id, type: job.type });
+  recordMetric(env, "job", { event: "timed_out", type: job.type });
+  return job;
+}
+
+/**
+ * 执行任务（队列消费者与 waitUntil 回退共用）
+ * 已结束的任务直接跳过，保证队列重复投递时幂等
+ * options.retryable 为 true 时（队列模式且未用完重试次数），可恢复的失败会抛出并把任务放回 PENDING，
+ * 由队列重新投递；否则任务直接标记为失败
+ */
+export async function runJob(env, ctx, id, options = {}) {
+  const job = await getJob(env, id);
+  if (!job) {
+    logWarn(env, "[Jobs] 任务不存在或已过期", { id });
+    return null;
+  }
+  if (job.status === JOB_STATUS.SUCCESS || job.status === JOB_STATUS.FAILURE) {
+    return job;
+  }
+
+  const t0 = Date.now();
+  job.status = JOB_STATUS.RUNNING;
+  job.started_at = t0;
+  await saveJob(env, job);
+
+  try {
+    const { response, cache } = await produceJobResult(env, ctx, job);
+    const bytes = await response.arrayBuffer();
+    const contentType =
+      response.headers.get("Content-Type") || (job.type === "audio" ? "audio/mpeg" : "image/jpeg");
+    await storeJobResult(env, id, bytes, contentType);
+    job.status = JOB_STATUS.SUCCESS;
+    job.result = { content_type: contentType, bytes: bytes.byteLength, cache };
+    logInfo(env, `[Worker Log] 任务 ${id} 完成 (${job.type}, ${bytes.byteLength} bytes)`);
+  } catch (error) {
+    if (options.retryable && isRetryableJobError(error)) {
+      job.status = JOB_STATUS.PENDING;
+      job.error = error.message;
+      job.retries = (job.retries || 0) + 1;
+      await saveJob(env, job);
+      logWarn(env, "[Jobs] 任务失败，交由队列重试", { id, type: job.type, error: error.message });
+      recordMetric(env, "job", { event: "retry", type: job.type, status: error.status });
+      throw error;
+    }
+    job.status = JOB_STATUS.FAILURE;
+    job.error = error.message;
+    logError(env, "[Jobs] 任务执行失败", { id, type: job.type, error: error.message });
+  }
+  job.finished_at = Date.now();
+  await saveJob(env, job);
+  recordMetric(env, "job", {
+    event: "finished",
+    type: job.type,
+    status: job.status,
+    queue_ms: t0 - job.created_at,
+    dt_ms: job.finished_at - t0,
+  });
+  await notifyWebhook(env, job);
+  return job;
+}
+
+/**
+ * Cloudflare Queues 消费者：逐条执行，可恢复的失败交由队列重试（有 Retry-After 时按其延迟）
+ * message.attempts 从 1 开始，最后一次投递不再重试，失败直接落到任务状态
+ */
+export async function handleJobQueueBatch(batch, env, ctx) {
+  const maxRetries = resolveQueueMaxRetries(env);
+  for (const message of batch.messages) {
+    try {
+      await runJob(env, ctx, message.body?.jobId, {
+        retryable: (message.attempts || 1) <= maxRetries,
+      });
+      message.ack();
+    } catch (error) {
+      logError(env, "[Jobs] 队列消息处理失败", { error: error.message });
+      message.retry(error.retryAfter ? { delaySeconds: error.retryAfter } : undefined);
+    }
+  }
+}
+
+/**
+ * 对外返回的任务视图：不包含 webhook 地址等内部字段
+ */
+export function publicJobView(job) {
+  const view = {
+    id: job.id,
+    type: job.type,
+    status: job.status,
+    created_at: job.created_at,
+    updated_at: job.updated_at,
+  };
+  if (job.finished_at) view.finished_at = job.finished_at;
+  if (job.status === JOB_STATUS.SUCCESS) {
+    view.result = { ...job.result, url: `/api/jobs/${job.id}/result` };
+  }
+  if (job.status === JOB_STATUS.FAILURE) {
+    view.error = job.error;
+    if (job.timed_out) view.timed_out = true;
+  }
+  return view;
+}
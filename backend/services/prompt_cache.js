@@ -0,0 +1,249 @@
+/**
+ * 提示词优化结果缓存
+ * 键为（规范化文本、模型、温度档位、优化模板版本）的 SHA-256；
+ * 修改优化模板时提升 OPTIMIZE_PROMPT_VERSION 即可让旧结果失效。
+ * isolate 内 LRU（PROMPT_CACHE_MAX_ENTRIES 条 + TTL）在前，KV（PROMPT_CACHE，未绑定则用 IMAGES_CACHE）在后。
+ * 只缓存成功的优化结果；命中率按 isolate 累计，可在 /internal/health 查看。
+ * 传入 options.onDelta 时以流式调用上游，命中缓存则把完整结果作为一个片段下发。
+ */
+import { mapWithConcurrency } from "../utils/concurrency.js";
+import { logWarn } from "../utils/logger.js";
+import { LruCache } from "../utils/lru.js";
+import { recordMetric } from "../utils/metrics.js";
+
+import {
+  OPTIMIZE_PROMPT_VERSION,
+  OPTIMIZE_TEMPERATURE,
+  optimizePromptBatch,
+  optimizePromptWithDeepseek,
+  streamOptimizePromptWithDeepseek,
+} from "./translate.js";
+
+const KEY_PREFIX = "prompt_opt";
+const DEFAULT_TTL_SECONDS = 7 * 86400;
+const DEFAULT_MAX_ENTRIES = 500;
+const WARM_CONCURRENCY = 3;
+
+let memoryCache = null;
+const counters = { hits: 0, misses: 0, bypass: 0 };
+
+function resolveTtlSeconds(env) {
+  const value = parseInt(env?.PROMPT_CACHE_TTL_SECONDS || "", 10);
+  return !Number.isNaN(value) && value >= 60 ? value : DEFAULT_TTL_SECONDS;
+}
+
+function cacheEnabled(env) {
+  return String(env?.PROMPT_CACHE_ENABLED || "true").toLowerCase() !== "false";
+}
+
+function getMemoryCache(env) {
+  if (memoryCache === null) {
+    const value = parseInt(env?.PROMPT_CACHE_MAX_ENTRIES ?? "", 10);
+    const maxEntries = !Number.isNaN(value) && value >= 0 ? value : DEFAULT_MAX_ENTRIES;
+    memoryCache =
+      maxEntries > 0
+        ? new LruCache({ maxEntries, ttlMs: resolveTtlSeconds(env) * 1000 })
+        : false;
+  }
+  return memoryCache || null;
+}
+
+function getStore(env) {
+  const store = env?.PROMPT_CACHE || env?.IMAGES_CACHE;
+  return store && typeof store.get === "function" ? store : null;
+}
+
+/**
+ * 文本规范化：Unicode NFC、折叠空白、去首尾空白、英文小写
+ */
+export function normalizePromptText(text) {
+  return String(text || "")
+    .normalize("NFC")
+    .replace(/\s+/g, " ")
+    .trim()
+    .toLowerCase();
+}
+
+async function sha256Hex(text) {
+  const digest = await crypto.subtle.digest("SHA-256", new TextEncoder().encode(text));
+  return [...new Uint8Array(digest)].map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+/**
+ * 缓存键：温度按 0.1 分档，避免浮点细微差异导致缓存分裂
+ */
+export async function buildPromptCacheKey(env, text) {
+  const model = env?.DEEPSEEK_MODEL || "deepseek-ai/DeepSeek-V2.5";
+  const temperature = (Math.round(OPTIMIZE_TEMPERATURE * 10) / 10).toFixed(1);
+  const hash = await sha256Hex(
+    [OPTIMIZE_PROMPT_VERSION, model, temperature, normalizePromptText(text)].join("\n")
+  );
+  return `${KEY_PREFIX}:${hash}`;
+}
+
+function optimize(text, env, options) {
+  return typeof options.onDelta === "function"
+    ? streamOptimizePromptWithDeepseek(text, env, options)
+    : optimizePromptWithDeepseek(text, env, options);
+}
+
+function replay(value, text, options) {
+  if (typeof options.onDelta === "function") options.onDelta(value.optimized_text);
+  return { ...value, original_prompt: text };
+}
+
+function record(env, result, layer) {
+  counters[result === "hit" ? "hits" : result === "miss" ? "misses" : "bypass"] += 1;
+  recordMetric(env, "prompt_cache", { result, layer, hit_ratio: getPromptCacheStats().hit_ratio });
+}
+
+async function readStored(env, key) {
+  const store = getStore(env);
+  if (!store) return null;
+  try {
+    return await store.get(key, "json");
+  } catch (error) {
+    logWarn(env, "[PromptCache] 读取缓存失败", { error: error.message });
+    return null;
+  }
+}
+
+/**
+ * 只缓存成功的结果；KV 写入交给 waitUntil，不阻塞响应
+ */
+async function storeResult(env, ctx, key, result) {
+  if (result.error) return;
+  const { optimized_text, raw_optimized } = result;
+  const value = { optimized_text, raw_optimized };
+  getMemoryCache(env)?.set(key, value);
+  const store = getStore(env);
+  if (!store) return;
+  const write = store
+    .put(key, JSON.stringify(value), { expirationTtl: resolveTtlSeconds(env) })
+    .catch((error) => logWarn(env, "[PromptCache] 写入缓存失败", { error: error.message }));
+  if (ctx && typeof ctx.waitUntil === "function") ctx.waitUntil(write);
+  else await write;
+}
+
+/**
+ * 带缓存的提示词优化
+ * @returns {Promise<{result: Object, cache: "hit"|"miss"|"bypass"}>}
+ */
+export async function optimizePromptCached(text, env, ctx, options = {}) {
+  if (!cacheEnabled(env) || !normalizePromptText(text)) {
+    record(env, "bypass");
+    return { result: await optimize(text, env, options), cache: "bypass" };
+  }
+
+  const key = await buildPromptCacheKey(env, text);
+  const memory = getMemoryCache(env);
+  const inMemory = memory?.get(key);
+  if (inMemory) {
+    record(env, "hit", "memory");
+    return { result: replay(inMemory, text, options), cache: "hit" };
+  }
+
+  const stored = await readStored(env, key);
+  if (stored) {
+    memory?.set(key, stored);
+    record(env, "hit", "kv");
+    return { result: replay(stored, text, options), cache: "hit" };
+  }
+
+  record(env, "miss");
+  const result = await optimize(text, env, options);
+  await storeResult(env, ctx, key, result);
+  return { result, cache: "miss" };
+}
+
+/**
+ * 预热：已缓存的跳过，未缓存的以有限并发调用优化
+ * @returns {Promise<{total: number, warmed: number, cached: number, failed: number}>}
+ */
+export async function warmPromptCache(texts, env, ctx) {
+  const summary = { total: texts.length, warmed: 0, cached: 0, failed: 0 };
+  const outcomes = await mapWithConcurrency(texts, WARM_CONCURRENCY, (text) =>
+    optimizePromptCached(text, env, ctx)
+  );
+  for (const outcome of outcomes) {
+    if (outcome.error) {
+      summary.failed += 1;
+      logWarn(env, "[PromptCache] 预热失败", { error: outcome.error.message });
+    } else if (outcome.value.cache === "hit") {
+      summary.cached += 1;
+    } else if (outcome.value.result.error) {
+      summary.failed += 1;
+    } else {
+      summary.warmed += 1;
+    }
+  }
+  recordMetric(env, "prompt_cache_warm", summary);
+  return summary;
+}
+
+/**
+ * 批量优化：逐条查缓存，未命中的（按规范化文本去重后）合并交给 optimizePromptBatch
+ * @returns {Promise<{results: Object[], cache: {hits: number, misses: number}, stats?: Object}>}
+ */
+export async function optimizePromptsCached(texts, env, ctx, options = {}) {
+  if (!cacheEnabled(env)) {
+    const { results, stats } = await optimizePromptBatch(texts, env, options);
+    return { results, cache: { hits: 0, misses: 0 }, stats };
+  }
+
+  const memory = getMemoryCache(env);
+  const keys = await Promise.all(texts.map((text) => buildPromptCacheKey(env, text)));
+  const results = new Array(texts.length).fill(null);
+  const cached = await Promise.all(
+    keys.map(async (key) => memory?.get(key) || (await readStored(env, key)))
+  );
+  const missing = new Map();
+  cached.forEach((value, index) => {
+    if (value) {
+      memory?.set(keys[index], value);
+      results[index] = { ...value, original_prompt: texts[index] };
+    } else if (!missing.has(keys[index])) {
+      missing.set(keys[index], index);
+    }
+  });
+  const hits = results.filter(Boolean).length;
+  counters.hits += hits;
+  counters.misses += missing.size;
+  recordMetric(env, "prompt_cache", {
+    result: "batch",
+    hits,
+    misses: missing.size,
+    hit_ratio: getPromptCacheStats().hit_ratio,
+  });
+
+  let stats;
+  if (missing.size) {
+    const indices = [...missing.values()];
+    const batch = await optimizePromptBatch(
+      indices.map((index) => texts[index]),
+      env,
+      options
+    );
+    stats = batch.stats;
+    const produced = new Map();
+    await Promise.all(
+      indices.map((index, i) => {
+        produced.set(keys[index], batch.results[i]);
+        return storeResult(env, ctx, keys[index], batch.results[i]);
+      })
+    );
+    texts.forEach((text, index) => {
+      if (!results[index]) results[index] = { ...produced.get(keys[index]), original_prompt: text };
+    });
+  }
+  return { results, cache: { hits, misses: missing.size }, stats };
+}
+
+export function getPromptCacheStats() {
+  const lookups = counters.hits + counters.misses;
+  return {
+    ...counters,
+    hit_ratio: lookups ? Number((counters.hits / lookups).toFixed(3)) : null,
+    memory_entries: memoryCache ? memoryCache.size : 0,
+  };
+}
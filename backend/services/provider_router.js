@@ -0,0 +1,255 @@
+/**
+ * 上游多端点路由
+ * 每个模型可配置多个等价端点（POLLINATIONS_PROVIDERS），按 EWMA 延迟/错误率做 power-of-two-choices 选择；
+ * 端点连续失败后熔断一段时间，冷却结束后只放行一个探测请求（half-open），成功即恢复。
+ * 某个端点失败（网络错误 / 429 / 5xx / 限流排队失败）时换下一个端点重试，对客户端透明。
+ * 统计为 isolate 内状态，只用于选路，不需要跨 isolate 一致。
+ */
+import { logWarn } from "../utils/logger.js";
+import { recordMetric } from "../utils/metrics.js";
+
+const DEFAULT_BASE = "https://gen.pollinations.ai";
+const DEFAULT_EWMA_ALPHA = 0.3;
+const DEFAULT_BREAKER_FAILURES = 5;
+const DEFAULT_BREAKER_COOLDOWN_MS = 30000;
+const DEFAULT_ATTEMPTS_PER_ENDPOINT = 2;
+// 尚无样本的端点按此延迟估计，保证新端点也能被选中试探
+const INITIAL_LATENCY_MS = 1000;
+
+const endpointStats = new Map();
+let registryCache = { key: null, registry: null };
+
+function readNumber(env, key, fallback, min = 0) {
+  const value = parseFloat(env?.[key] ?? "");
+  return !Number.isNaN(value) && value >= min ? value : fallback;
+}
+
+function normalizeBase(base) {
+  return String(base || "")
+    .trim()
+    .replace(/\/+$/, "");
+}
+
+/**
+ * 解析端点注册表：POLLINATIONS_PROVIDERS 为 JSON，键为模型名（或 "default"），值为端点数组
+ * 例如 {"default": ["https://gen.pollinations.ai"], "flux": ["https://a.example", "https://b.example"]}
+ * 未配置或解析失败时只有 POLLINATIONS_GEN_API_BASE 一个端点
+ */
+export function readProviderRegistry(env) {
+  const raw = env?.POLLINATIONS_PROVIDERS;
+  const fallback = [normalizeBase(env?.POLLINATIONS_GEN_API_BASE || DEFAULT_BASE)];
+  const cacheKey = `${fallback[0]}|${typeof raw === "string" ? raw : JSON.stringify(raw ?? "")}`;
+  if (registryCache.key === cacheKey) {
+    return registryCache.registry;
+  }
+  const registry = { default: fallback };
+  if (raw) {
+    try {
+      const parsed = typeof raw === "string" ? JSON.parse(raw) : raw;
+      for (const [model, list] of Object.entries(parsed || {})) {
+        const bases = (Array.isArray(list) ? list : [list]).map(normalizeBase).filter(Boolean);
+        if (bases.length) registry[model] = [...new Set(bases)];
+      }
+    } catch (error) {
+      logWarn(env, "[ProviderRouter] POLLINATIONS_PROVIDERS 解析失败，使用默认端点", {
+        error: error.message,
+      });
+    }
+  }
+  registryCache = { key: cacheKey, registry };
+  return registry;
+}
+
+export function resolveEndpoints(env, model) {
+  const registry = readProviderRegistry(env);
+  return registry[model] || registry.default;
+}
+
+function getStats(base) {
+  let stats = endpointStats.get(base);
+  if (!stats) {
+    stats = {
+      base,
+      latencyMs: null,
+      errorRate: 0,
+      inFlight: 0,
+      requests: 0,
+      failures: 0,
+      consecutiveFailures: 0,
+      state: "closed",
+      openedAt: 0,
+      probing: false,
+    };
+    endpointStats.set(base, stats);
+  }
+  return stats;
+}
+
+function available(env, stats, now) {
+  if (stats.state === "closed") return true;
+  const cooldown = readNumber(env, "ROUTER_BREAKER_COOLDOWN_MS", DEFAULT_BREAKER_COOLDOWN_MS);
+  // 冷却结束后只允许一个探测请求在途
+  return now - stats.openedAt >= cooldown && !stats.probing;
+}
+
+function score(stats) {
+  const latency = stats.latencyMs ?? INITIAL_LATENCY_MS;
+  return (latency * (stats.inFlight + 1)) / Math.max(0.05, 1 - stats.errorRate);
+}
+
+/**
+ * power-of-two-choices：从可用端点中随机取两个，选得分（延迟 × 在途数 / 成功率）更低者
+ * 全部熔断时退回熔断最早的端点，宁可试探也不直接失败
+ */
+export function pickEndpoint(env, candidates, exclude = new Set()) {
+  const now = Date.now();
+  const pool = candidates.filter((base) => !exclude.has(base));
+  if (pool.length === 0) return null;
+  const usable = pool.map(getStats).filter((stats) => available(env, stats, now));
+  if (usable.length === 0) {
+    return pool.map(getStats).sort((a, b) => a.openedAt - b.openedAt)[0].base;
+  }
+  if (usable.length === 1) return usable[0].base;
+  const first = usable[Math.floor(Math.random() * usable.length)];
+  const rest = usable.filter((stats) => stats !== first);
+  const second = rest[Math.floor(Math.random() * rest.length)];
+  return score(first) <= score(second) ? first.base : second.base;
+}
+
+function recordOutcome(env, stats, ok, latencyMs) {
+  const alpha = readNumber(env, "ROUTER_EWMA_ALPHA", DEFAULT_EWMA_ALPHA);
+  stats.requests += 1;
+  stats.errorRate = alpha * (ok ? 0 : 1) + (1 - alpha) * stats.errorRate;
+  if (ok) {
+    stats.latencyMs =
+      stats.latencyMs === null ? latencyMs : alpha * latencyMs + (1 - alpha) * stats.latencyMs;
+    stats.consecutiveFailures = 0;
+    if (stats.state !== "closed") {
+      recordMetric(env, "provider_router", { event: "breaker_closed", base: stats.base });
+    }
+    stats.state = "closed";
+    return;
+  }
+  stats.failures += 1;
+  stats.consecutiveFailures += 1;
+  const threshold = readNumber(env, "ROUTER_BREAKER_FAILURES", DEFAULT_BREAKER_FAILURES, 1);
+  if (stats.state !== "closed" || stats.consecutiveFailures >= threshold) {
+    // half-open 探测失败时重新计时
+    stats.state = "open";
+    stats.openedAt = Date.now();
+    recordMetric(env, "provider_router", { event: "breaker_open", base: stats.base });
+    logWarn(env, "[ProviderRouter] 端点熔断", {
+      base: stats.base,
+      failures: stats.consecutiveFailures,
+    });
+  }
+}
+
+/**
+ * 是否应换端点重试：网络错误、熔断、限流排队失败、429 与 5xx；其余 4xx 是请求本身的问题
+ * 多端点时熔断按端点生效（circuitScope），某个端点熔断不影响其他端点
+ */
+function shouldFailover(error) {
+  if (error?.code === "circuit_open" || error?.code === "upstream_saturated") return true;
+  const status = error?.status;
+  return !status || status === 429 || status >= 500;
+}
+
+/**
+ * 按路由策略调用上游
+ * @param {Object} env
+ * @param {string} model - 用于查注册表的模型名
+ * @param {Function} attempt - (base, { maxAttempts, budgetMs, circuitScope }) => Promise<Response>
+ *   多端点时限制单端点的尝试次数，把剩余机会留给其他端点，并按端点熔断；
+ *   budgetMs 为整次路由剩余的耗时预算，换端点不会重新开始计时
+ * @param {Object} [options] - { signal, budgetMs }
+ */
+export async function routeUpstream(env, model, attempt, options = {}) {
+  const candidates = resolveEndpoints(env, model);
+  const multi = candidates.length > 1;
+  const maxAttempts = multi
+    ? readNumber(env, "ROUTER_ATTEMPTS_PER_ENDPOINT", DEFAULT_ATTEMPTS_PER_ENDPOINT, 1)
+    : undefined;
+  const deadline = options.budgetMs === undefined ? null : Date.now() + options.budgetMs;
+  const tried = new Set();
+  let lastError;
+
+  let base = pickEndpoint(env, candidates);
+  while (base) {
+    const budgetMs = deadline === null ? undefined : Math.max(0, deadline - Date.now());
+    if (budgetMs === 0 && lastError) {
+      logWarn(env, "[ProviderRouter] 路由预算已耗尽，不再切换端点", {
+        model,
+        tries: tried.size,
+      });
+      break;
+    }
+    tried.add(base);
+    const stats = getStats(base);
+    const probing = stats.state !== "closed";
+    if (probing) stats.probing = true;
+    stats.inFlight += 1;
+    const t0 = Date.now();
+    try {
+      const response = await attempt(base, {
+        maxAttempts,
+        budgetMs,
+        circuitScope: multi ? base : undefined,
+      });
+      recordOutcome(env, stats, true, Date.now() - t0);
+      if (tried.size > 1) {
+        recordMetric(env, "provider_router", {
+          event: "failover_success",
+          base,
+          tries: tried.size,
+        });
+      }
+      return response;
+    } catch (error) {
+      if (options.signal?.aborted || !shouldFailover(error)) {
+        throw error;
+      }
+      recordOutcome(env, stats, false, Date.now() - t0);
+      lastError = error;
+      if (tried.size < candidates.length) {
+        logWarn(env, "[ProviderRouter] 端点失败，切换到下一个端点", {
+          base,
+          status: error.status,
+          error: error.message,
+        });
+      }
+    } finally {
+      stats.inFlight -= 1;
+      if (probing) stats.probing = false;
+    }
+    base = pickEndpoint(env, candidates, tried);
+  }
+  throw lastError;
+}
+
+/**
+ * 各端点当前统计，供 /internal/health 展示
+ */
+export function getProviderStats(env) {
+  const registry = readProviderRegistry(env);
+  const now = Date.now();
+  const bases = new Set(Object.values(registry).flat());
+  const endpoints = [...bases].map((base) => {
+    const stats = getStats(base);
+    return {
+      base,
+      state: stats.state === "open" && available(env, stats, now) ? "half_open" : stats.state,
+      ewma_latency_ms: stats.latencyMs === null ? null : Math.round(stats.latencyMs),
+      ewma_error_rate: Number(stats.errorRate.toFixed(3)),
+      in_flight: stats.inFlight,
+      requests: stats.requests,
+      failures: stats.failures,
+    };
+  });
+  return { models: registry, endpoints };
+}
+
+export function resetProviderStats() {
+  endpointStats.clear();
+  registryCache = { key: null, registry: null };
+}
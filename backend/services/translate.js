@@ -1,21 +1,23 @@
+import { mapWithConcurrency } from "../utils/concurrency.js";
 import { fetchWithRetry } from "../utils/fetch.js";
 import { logInfo } from "../utils/logger.js";
 
-export async function optimizePromptWithDeepseek(textPrompt, env) {
-  let deepseekApiUrl = env.DEEPSEEK_API_URL || "https://api.siliconflow.cn/v1/chat/completions";
-  if (!deepseekApiUrl.endsWith("/v1/chat/completions")) {
-    deepseekApiUrl = deepseekApiUrl.endsWith("/")
-      ? deepseekApiUrl + "v1/chat/completions"
-      : deepseekApiUrl + "/v1/chat/completions";
-  }
+// 修改下方优化模板（engineeredPrompt）时同步提升版本号，使提示词缓存中的旧结果失效
+export const OPTIMIZE_PROMPT_VERSION = "v1";
+export const OPTIMIZE_TEMPERATURE = 0.5;
 
-  const deepseekApiKey = env.DEEPSEEK_API_KEY;
-  if (!deepseekApiKey) {
-    console.error("[Worker Error] DEEPSEEK_API_KEY not found in environment variables.");
-    throw new Error("服务器配置错误：DeepSeek API密钥未配置");
+/**
+ * DeepSeek（SiliconFlow）Chat Completions 地址，兼容只配置了基地址的情况
+ */
+function resolveDeepseekApiUrl(env) {
+  const url = env.DEEPSEEK_API_URL || "https://api.siliconflow.cn/v1/chat/completions";
+  if (url.endsWith("/v1/chat/completions")) {
+    return url;
   }
+  return url.endsWith("/") ? url + "v1/chat/completions" : url + "/v1/chat/completions";
+}
 
-  const engineeredPrompt = `你是一个顶级的提示词工程师，专注于为最先进的文生图模型创作具有艺术性和画面感的提示词。请严格基于用户提供的原始描述中的核心主体、数量、场景和明确指定的风格（例如"写实风格"、"卡通风格"、"油画风格"等），进行优化和丰富。
+const OPTIMIZE_INSTRUCTIONS = `你是一个顶级的提示词工程师，专注于为最先进的文生图模型创作具有艺术性和画面感的提示词。请严格基于用户提供的原始描述中的核心主体、数量、场景和明确指定的风格（例如"写实风格"、"卡通风格"、"油画风格"等），进行优化和丰富。
 你的任务是：
 1.  **精准翻译与丰富细节**：将用户的中文描述准确翻译成艺术感强且表意清晰的英文。在用户描述基础上，智能补充能显著提升画面效果的细节，包括但不限于：
     *   **人物**：姿态、表情、眼神（确保清晰可见）、服装的材质与款式、配饰等。
@@ -25,32 +27,136 @@ export async function optimizePromptWithDeepseek(textPrompt, env) {
 2.  **保留并强化核心要素与主体完整清晰**：确保最终的英文提示词准确反映用户的核心意图。特别是主体数量、性别、年龄段、种族（如果提及）以及用户已明确指定的场景和风格（如 '赛博朋克城市街道', '梵高油画风格'）必须保留并得到强化。**力求画面中的所有主体（人物、动物等）都得到完整、清晰、无不当遮挡的呈现，尤其是面部特征必须清晰可见。避免重要部分被不自然地截断、隐藏或被次要元素严重遮挡。**如果用户仅指定了宽泛风格如"写实"，请向"摄影级真实感 (photorealistic)"方向优化，注重细节和质感。
 3.  **提升画面质量的通用词汇**：在优化后的提示词中，酌情加入能普遍提升AI绘图效果的通用高品质描述，例如：'masterpiece', 'best quality', 'high resolution', 'highly detailed', 'intricate details', 'sharp focus', 'cinematic lighting', 'professional photography'。
 4.  **避免过度解读和无关添加**：不要添加与用户原始描述核心内容无关或冲突的概念。保持提示词的连贯性和主题集中。
-5.  **输出格式**：只输出优化和丰富后的高质量英文提示词，不要包含任何其他解释或说明文字。
+5.  **输出格式**：只输出优化和丰富后的高质量英文提示词，不要包含任何其他解释或说明文字。`;
+
+// 优化结果只保留英文部分（模型偶尔会夹带中文解释）
+const ENGLISH_PATTERN = /[a-zA-Z0-9\s.,!?'":;()[\]{}<>#@$%^&*+=_\\|/~-]+/g;
+const ENGLISH_CHAR = /^[a-zA-Z0-9\s.,!?'":;()[\]{}<>#@$%^&*+=_\\|/~-]$/;
+
+function buildOptimizeRequest(textPrompt, env, stream = false) {
+  const deepseekApiKey = env.DEEPSEEK_API_KEY;
+  if (!deepseekApiKey) {
+    console.error("[Worker Error] DEEPSEEK_API_KEY not found in environment variables.");
+    throw new Error("服务器配置错误：DeepSeek API密钥未配置");
+  }
+
+  const engineeredPrompt = `${OPTIMIZE_INSTRUCTIONS}
 
 原始描述：${textPrompt}`;
 
-  const headers = {
-    Authorization: `Bearer ${deepseekApiKey}`,
-    "Content-Type": "application/json",
-  };
   const payload = {
     model: env.DEEPSEEK_MODEL || "deepseek-ai/DeepSeek-V2.5",
     messages: [{ role: "user", content: engineeredPrompt }],
-    temperature: 0.5,
+    temperature: OPTIMIZE_TEMPERATURE,
+  };
+  if (stream) payload.stream = true;
+  return {
+    method: "POST",
+    headers: {
+      Authorization: `Bearer ${deepseekApiKey}`,
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify(payload),
   };
+}
+
+function optimizeFailure(textPrompt, error, details) {
+  const failure = {
+    error,
+    optimized_text: textPrompt,
+    raw_optimized: textPrompt,
+    original_prompt: textPrompt,
+  };
+  if (details !== undefined) failure.details = details;
+  return failure;
+}
+
+/**
+ * 模型原始输出 → 优化结果：抽取英文部分，清洗后为空时退回原始输出
+ */
+function finishOptimizedText(optimizedTextRaw, textPrompt, env) {
+  const englishParts = optimizedTextRaw.match(ENGLISH_PATTERN) || [];
+  let optimizedText = englishParts.join(" ").trim();
+
+  if (!optimizedText && optimizedTextRaw) {
+    console.warn(
+      `[Worker Warning] DeepSeek优化后的提示词清洗后为空（原始：'${optimizedTextRaw}'）。将返回原始优化文本。`
+    );
+    optimizedText = optimizedTextRaw;
+  } else if (!optimizedTextRaw) {
+    console.error("[Worker Error] DeepSeek API返回了完全空的内容。将使用原始提示。");
+    return optimizeFailure(textPrompt, "优化API返回空内容");
+  }
+
+  if (optimizedTextRaw.length > optimizedText.length + 10 && /[\u4e00-\u9fff]/.test(textPrompt)) {
+    console.warn(
+      `[Worker Warning] 清洗后的提示词长度显著减少。原始: '${optimizedTextRaw}', 清洗后: '${optimizedText}'.`
+    );
+  }
+
+  logInfo(env, `[Worker Log] 优化后的提示词 (原始): ${optimizedTextRaw}`);
+  logInfo(env, `[Worker Log] 优化后的提示词 (清洗后): ${optimizedText}`);
+  return {
+    optimized_text: optimizedText,
+    raw_optimized: optimizedTextRaw,
+    original_prompt: textPrompt,
+  };
+}
+
+/**
+ * 增量版的英文抽取：逐段输入模型输出，返回可以立即下发的清洗后文本
+ * 所有返回片段依次拼接后与 ENGLISH_PATTERN 的 join(" ").trim() 结果一致；
+ * 末尾空白先暂存，遇到后续英文字符时再输出，保证整体 trim 语义
+ */
+export function createEnglishFilter() {
+  let started = false;
+  let inRun = false;
+  let anyRun = false;
+  let pendingSpace = "";
+  return {
+    push(chunk) {
+      let out = "";
+      const append = (char) => {
+        if (/\s/.test(char)) {
+          if (started) pendingSpace += char;
+          return;
+        }
+        out += pendingSpace + char;
+        pendingSpace = "";
+        started = true;
+      };
+      for (const char of String(chunk || "")) {
+        if (!ENGLISH_CHAR.test(char)) {
+          inRun = false;
+          continue;
+        }
+        // 两段英文之间以一个空格连接，对应 join(" ")
+        if (!inRun && anyRun) append(" ");
+        inRun = true;
+        anyRun = true;
+        append(char);
+      }
+      return out;
+    },
+  };
+}
+
+/**
+ * 使用 DeepSeek 优化提示词
+ * options.signal：客户端断开时取消上游调用（此时抛出，而不是返回降级结果）
+ */
+export async function optimizePromptWithDeepseek(textPrompt, env, options = {}) {
+  const init = buildOptimizeRequest(textPrompt, env);
 
   logInfo(env, `[Worker Log] 向 DeepSeek API 发送请求 (服务: optimizePromptWithDeepseek)`);
 
   try {
     const response = await fetchWithRetry(
-      deepseekApiUrl,
-      {
-        method: "POST",
-        headers,
-        body: JSON.stringify(payload),
-      },
+      resolveDeepseekApiUrl(env),
+      init,
       "DeepSeek Chat Completions",
-      env
+      env,
+      { idempotent: true, signal: options.signal }
     );
 
     if (!response.ok) {
@@ -58,75 +164,111 @@ export async function optimizePromptWithDeepseek(textPrompt, env) {
       console.error(
         `[Worker Error] DeepSeek API HTTPError: Status ${response.status}, Response: ${errorContent}`
       );
-      return {
-        error: `优化API调用失败 (HTTP ${response.status})`,
-        details: errorContent,
-        optimized_text: textPrompt,
-        raw_optimized: textPrompt,
-        original_prompt: textPrompt,
-      };
+      return optimizeFailure(textPrompt, `优化API调用失败 (HTTP ${response.status})`, errorContent);
     }
 
     const result = await response.json();
     const optimizedTextRaw = result.choices?.[0]?.message?.content?.trim() || "";
+    return finishOptimizedText(optimizedTextRaw, textPrompt, env);
+  } catch (error) {
+    if (options.signal?.aborted) {
+      throw error;
+    }
+    console.error(`[Worker Error] DeepSeek API 调用时发生未知错误: ${error.message}`);
+    console.error(error.stack);
+    return optimizeFailure(textPrompt, `优化API调用失败: ${error.message}`);
+  }
+}
 
-    const englishPattern = /[a-zA-Z0-9\s.,!?'":;()[\]{}<>#@$%^&*+=_\\|/~-]+/g;
-    const englishParts = optimizedTextRaw.match(englishPattern) || [];
-    let optimizedText = englishParts.join(" ").trim();
+/**
+ * 流式优化提示词：请求 stream: true，逐个 token 增量清洗后交给 options.onDelta(text)
+ * 返回值与 optimizePromptWithDeepseek 相同；已下发的片段拼接后等于 optimized_text
+ * （清洗后为空而退回原始输出时除外，以返回值为准）
+ */
+export async function streamOptimizePromptWithDeepseek(textPrompt, env, options = {}) {
+  const init = buildOptimizeRequest(textPrompt, env, true);
+  const onDelta = typeof options.onDelta === "function" ? options.onDelta : () => {};
+  const filter = createEnglishFilter();
 
-    if (!optimizedText && optimizedTextRaw) {
-      console.warn(
-        `[Worker Warning] DeepSeek优化后的提示词清洗后为空（原始：'${optimizedTextRaw}'）。将返回原始优化文本。`
-      );
-      optimizedText = optimizedTextRaw;
-    } else if (!optimizedTextRaw) {
-      console.error("[Worker Error] DeepSeek API返回了完全空的内容。将使用原始提示。");
-      return {
-        error: "优化API返回空内容",
-        optimized_text: textPrompt,
-        raw_optimized: textPrompt,
-        original_prompt: textPrompt,
-      };
-    }
+  logInfo(env, `[Worker Log] 向 DeepSeek API 发送流式请求 (服务: optimizePromptWithDeepseek)`);
+
+  try {
+    const response = await fetchWithRetry(
+      resolveDeepseekApiUrl(env),
+      init,
+      "DeepSeek Chat Completions",
+      env,
+      { idempotent: true, signal: options.signal }
+    );
 
-    if (optimizedTextRaw.length > optimizedText.length + 10 && /[\u4e00-\u9fff]/.test(textPrompt)) {
-      console.warn(
-        `[Worker Warning] 清洗后的提示词长度显著减少。原始: '${optimizedTextRaw}', 清洗后: '${optimizedText}'.`
+    if (!response.ok) {
+      const errorContent = await response.text();
+      console.error(
+        `[Worker Error] DeepSeek API HTTPError: Status ${response.status}, Response: ${errorContent}`
       );
+      return optimizeFailure(textPrompt, `优化API调用失败 (HTTP ${response.status})`, errorContent);
     }
 
-    logInfo(env, `[Worker Log] 优化后的提示词 (原始): ${optimizedTextRaw}`);
-    logInfo(env, `[Worker Log] 优化后的提示词 (清洗后): ${optimizedText}`);
-    return {
-      optimized_text: optimizedText,
-      raw_optimized: optimizedTextRaw,
-      original_prompt: textPrompt,
+    let raw = "";
+    const handleContent = (content) => {
+      // 与非流式一致：忽略模型输出开头的空白
+      const piece = raw ? content : content.trimStart();
+      if (!piece) return;
+      raw += piece;
+      const text = filter.push(piece);
+      if (text) onDelta(text);
     };
+
+    const contentType = response.headers.get("Content-Type") || "";
+    if (!contentType.includes("text/event-stream")) {
+      // 兼容忽略 stream 参数、直接返回完整 JSON 的实现
+      const result = await response.json();
+      handleContent(result.choices?.[0]?.message?.content || "");
+    } else {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split("\n");
+        buffered = lines.pop();
+        for (const line of lines) {
+          const data = line.trim();
+          if (!data.startsWith("data:")) continue;
+          const json = data.slice(5).trim();
+          if (json === "[DONE]") {
+            finished = true;
+            break;
+          }
+          try {
+            handleContent(JSON.parse(json).choices?.[0]?.delta?.content || "");
+          } catch (_) {}
+        }
+      }
+      if (finished) reader.cancel().catch(() => {});
+    }
+
+    return finishOptimizedText(raw.trim(), textPrompt, env);
   } catch (error) {
-    console.error(`[Worker Error] DeepSeek API 调用时发生未知错误: ${error.message}`);
-    console.error(error.stack);
-    return {
-      error: `优化API调用失败: ${error.message}`,
-      optimized_text: textPrompt,
-      raw_optimized: textPrompt,
-      original_prompt: textPrompt,
-    };
+    if (options.signal?.aborted) {
+      throw error;
+    }
+    console.error(`[Worker Error] DeepSeek 流式调用时发生错误: ${error.message}`);
+    return optimizeFailure(textPrompt, `优化API调用失败: ${error.message}`);
   }
 }
 
-export async function translateNegativePrompt(text, env) {
+export async function translateNegativePrompt(text, env, options = {}) {
   const deepseekApiKey = env.DEEPSEEK_API_KEY;
   if (!deepseekApiKey) {
     console.error("[Worker Error] DEEPSEEK_API_KEY not set for translateNegativePrompt.");
     throw new Error("服务器配置错误：翻译服务不可用");
   }
 
-  let deepseekApiUrl = env.DEEPSEEK_API_URL || "https://api.siliconflow.cn/v1/chat/completions";
-  if (!deepseekApiUrl.endsWith("/v1/chat/completions")) {
-    deepseekApiUrl = deepseekApiUrl.endsWith("/")
-      ? deepseekApiUrl + "v1/chat/completions"
-      : deepseekApiUrl + "/v1/chat/completions";
-  }
+  const deepseekApiUrl = resolveDeepseekApiUrl(env);
 
   const prompt = `请将下列中文负面提示词精准翻译为英文，保持逗号分隔，且不要添加任何修饰或润色，只输出英文短语列表：\n${text}`;
   const headers = {
@@ -147,7 +289,8 @@ export async function translateNegativePrompt(text, env) {
       body: JSON.stringify(payload),
     },
     "DeepSeek Chat Completions",
-    env
+    env,
+    { idempotent: true, signal: options.signal }
   );
 
   if (!response.ok) {
@@ -161,3 +304,243 @@ export async function translateNegativePrompt(text, env) {
   const translated = result.choices?.[0]?.message?.content?.trim() || text;
   return { translated_text: translated, translated: true };
 }
+
+/**
+ * 发送一次补全请求并把输出解析为 JSON 数组；HTTP 失败或无法解析时返回 null
+ */
+async function requestJsonArray(prompt, env, options, temperature) {
+  const deepseekApiKey = env.DEEPSEEK_API_KEY;
+  if (!deepseekApiKey) {
+    console.error("[Worker Error] DEEPSEEK_API_KEY not set for batched completion.");
+    throw new Error("服务器配置错误：翻译服务不可用");
+  }
+
+  const response = await fetchWithRetry(
+    resolveDeepseekApiUrl(env),
+    {
+      method: "POST",
+      headers: {
+        Authorization: `Bearer ${deepseekApiKey}`,
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        model: env.DEEPSEEK_MODEL || "deepseek-ai/DeepSeek-V2.5",
+        messages: [{ role: "user", content: prompt }],
+        temperature,
+      }),
+    },
+    "DeepSeek Chat Completions",
+    env,
+    { idempotent: true, signal: options.signal }
+  );
+
+  if (!response.ok) {
+    console.error(
+      `[Worker Error] DeepSeek API call failed for batched completion with status: ${response.status}`
+    );
+    return null;
+  }
+
+  const result = await response.json();
+  const content = result.choices?.[0]?.message?.content?.trim() || "";
+  // 模型偶尔会包一层 ```json 代码块
+  const match = content.match(/\[[\s\S]*\]/);
+  try {
+    const parsed = JSON.parse(match ? match[0] : content);
+    if (Array.isArray(parsed)) return parsed;
+  } catch (_) {}
+  console.warn(`[Worker Warning] 批量结果无法解析: '${content.slice(0, 200)}'`);
+  return null;
+}
+
+/**
+ * 批量翻译负面提示词短语：一次调用，要求模型按顺序返回 JSON 字符串数组
+ * 返回与输入等长的译文数组；模型输出无法解析或条数不符时返回 null，由调用方退回整段翻译
+ */
+export async function translatePhrasesWithDeepseek(phrases, env, options = {}) {
+  const prompt = `请把下面 JSON 数组中的每个中文负面提示词短语精准翻译为简短的英文短语，不要添加修饰或解释。
+只输出一个与输入等长、顺序一致的 JSON 字符串数组：
+${JSON.stringify(phrases)}`;
+  const translated = await requestJsonArray(prompt, env, options, 0.2);
+  if (
+    Array.isArray(translated) &&
+    translated.length === phrases.length &&
+    translated.every((item) => typeof item === "string" && item.trim())
+  ) {
+    return translated.map((item) => item.trim());
+  }
+  return null;
+}
+
+const DEFAULT_BATCH_TOKEN_BUDGET = 3000;
+const DEFAULT_BATCH_MAX_ITEMS = 20;
+const BATCH_PACK_CONCURRENCY = 2;
+const BATCH_FALLBACK_CONCURRENCY = 3;
+// 每条在 JSON 中的 id / 引号等额外开销
+const BATCH_ITEM_OVERHEAD_TOKENS = 8;
+// 每条优化结果的预计输出 token 数；翻译结果按输入的两倍估算
+const OPTIMIZE_OUTPUT_TOKENS = 200;
+
+function readBatchNumber(env, key, fallback) {
+  const value = parseInt(env?.[key] || "", 10);
+  return Number.isNaN(value) || value < 1 ? fallback : value;
+}
+
+/**
+ * 粗略估算 token 数：中日韩字符按 1 个 token，其余按 4 个字符 1 个 token
+ */
+export function estimateTokens(text) {
+  const str = String(text || "");
+  const cjk = (str.match(/[\u3400-\u9fff\uf900-\ufaff]/g) || []).length;
+  return cjk + Math.ceil((str.length - cjk) / 4);
+}
+
+/**
+ * 按 token 预算贪心打包：每包条目的输入 + 预计输出不超过 budget，且不超过 maxItems 条；
+ * 单条即超出预算时独占一包
+ * @returns {number[][]} 每包包含的下标
+ */
+export function packByTokenBudget(texts, { budget, maxItems, outputTokens }) {
+  const packs = [];
+  let current = [];
+  let used = 0;
+  texts.forEach((text, index) => {
+    const cost = estimateTokens(text) + BATCH_ITEM_OVERHEAD_TOKENS + outputTokens(text);
+    if (current.length && (used + cost > budget || current.length >= maxItems)) {
+      packs.push(current);
+      current = [];
+      used = 0;
+    }
+    current.push(index);
+    used += cost;
+  });
+  if (current.length) packs.push(current);
+  return packs;
+}
+
+/**
+ * 一包条目合并为一次调用：输入输出均为带 id 的 JSON 数组，按 id 对回；
+ * 缺失或无法解析的条目为 null，由调用方逐条回退
+ */
+async function completePack(instruction, texts, env, options, temperature) {
+  const items = texts.map((text, id) => ({ id, text }));
+  const prompt = `${instruction}
+
+下面以 JSON 数组给出 ${texts.length} 条输入，每项含 id 与 text。请对每一条独立处理，只输出一个 JSON 数组，每项为 {"id": 对应的 id, "result": 处理结果字符串}，不要输出其他内容：
+${JSON.stringify(items)}`;
+  const results = new Array(texts.length).fill(null);
+  const parsed = await requestJsonArray(prompt, env, options, temperature);
+  for (const entry of parsed || []) {
+    const id = entry?.id;
+    if (Number.isInteger(id) && id >= 0 && id < texts.length && typeof entry.result === "string") {
+      results[id] = entry.result.trim() || null;
+    }
+  }
+  return results;
+}
+
+/**
+ * 按 LLM_BATCH_TOKEN_BUDGET / LLM_BATCH_MAX_ITEMS 打包
+ */
+function planPacks(texts, env, outputTokens) {
+  return packByTokenBudget(texts, {
+    budget: readBatchNumber(env, "LLM_BATCH_TOKEN_BUDGET", DEFAULT_BATCH_TOKEN_BUDGET),
+    maxItems: readBatchNumber(env, "LLM_BATCH_MAX_ITEMS", DEFAULT_BATCH_MAX_ITEMS),
+    outputTokens,
+  });
+}
+
+/**
+ * 批量执行：去重后按 token 预算打包，每包一次调用；单条的包以及批量结果缺失的条目走 single 逐条处理
+ * @returns {Promise<{results: Array, stats: {packs: number, llm_calls: number, fallbacks: number}}>}
+ */
+async function runBatched(inputs, env, options, spec) {
+  // 相同文本只处理一次
+  const texts = [...new Set(inputs)];
+  const packs = planPacks(texts, env, spec.outputTokens);
+  const results = new Array(texts.length).fill(null);
+  const stats = { packs: packs.length, llm_calls: 0, fallbacks: 0 };
+
+  const packed = await mapWithConcurrency(
+    packs.filter((pack) => pack.length > 1),
+    BATCH_PACK_CONCURRENCY,
+    async (pack) => {
+      stats.llm_calls += 1;
+      const outputs = await completePack(
+        spec.instruction,
+        pack.map((index) => texts[index]),
+        env,
+        options,
+        spec.temperature
+      );
+      pack.forEach((index, i) => {
+        if (outputs[i]) results[index] = spec.finish(outputs[i], texts[index]);
+      });
+    }
+  );
+  for (const outcome of packed) {
+    if (!outcome.error) continue;
+    if (options.signal?.aborted) throw outcome.error;
+    console.warn(`[Worker Warning] 批量调用失败，逐条回退: ${outcome.error.message}`);
+  }
+
+  const pending = [];
+  results.forEach((result, index) => {
+    if (!result) pending.push(index);
+  });
+  const singles = await mapWithConcurrency(pending, BATCH_FALLBACK_CONCURRENCY, (index) => {
+    stats.llm_calls += 1;
+    return spec.single(texts[index]);
+  });
+  for (let i = 0; i < pending.length; i++) {
+    const { value, error } = singles[i];
+    if (error && options.signal?.aborted) throw error;
+    results[pending[i]] = error ? spec.failed(texts[pending[i]], error) : value;
+  }
+  // 单条的包本来就逐条处理，不计入回退
+  stats.fallbacks = pending.length - packs.filter((pack) => pack.length === 1).length;
+  const byText = new Map(texts.map((text, index) => [text, results[index]]));
+  return { results: inputs.map((text) => ({ ...byText.get(text) })), stats };
+}
+
+const BATCH_OUTPUT_TOKENS = {
+  optimize: () => OPTIMIZE_OUTPUT_TOKENS,
+  translate: (text) => estimateTokens(text) * 2,
+};
+
+/**
+ * 批量请求去重后会打成的包数（即批量上游调用次数），路由据此扣除额度
+ * @param {"optimize"|"translate"} kind
+ */
+export function countBatchPacks(texts, env, kind) {
+  return planPacks([...new Set(texts)], env, BATCH_OUTPUT_TOKENS[kind]).length;
+}
+
+/**
+ * 批量优化提示词：与 optimizePromptWithDeepseek 使用同一份优化要求，结果形状也相同
+ */
+export function optimizePromptBatch(texts, env, options = {}) {
+  return runBatched(texts, env, options, {
+    instruction: OPTIMIZE_INSTRUCTIONS,
+    temperature: OPTIMIZE_TEMPERATURE,
+    outputTokens: BATCH_OUTPUT_TOKENS.optimize,
+    finish: (raw, text) => finishOptimizedText(raw, text, env),
+    single: (text) => optimizePromptWithDeepseek(text, env, options),
+    failed: (text, error) => optimizeFailure(text, `优化API调用失败: ${error.message}`),
+  });
+}
+
+/**
+ * 批量翻译负面提示词：每条结果与 translateNegativePrompt 相同
+ */
+export function translateNegativePromptBatch(texts, env, options = {}) {
+  return runBatched(texts, env, options, {
+    instruction:
+      "请将每条中文负面提示词精准翻译为英文，保持逗号分隔，且不要添加任何修饰或润色，结果只包含英文短语列表。",
+    temperature: 0.2,
+    outputTokens: BATCH_OUTPUT_TOKENS.translate,
+    finish: (translated) => ({ translated_text: translated, translated: true }),
+    single: (text) => translateNegativePrompt(text, env, options),
+    failed: (text, error) => ({ translated_text: text, translated: false, error: error.message }),
+  });
+}
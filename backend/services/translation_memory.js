@@ -0,0 +1,264 @@
+/**
+ * 负面提示词短语级翻译记忆
+ * 负面提示词基本由少量固定短语（模糊、低质量、多余的手指……）组合而成，
+ * 按逗号拆分后逐个短语查表：内置词典 → isolate 内 LRU → KV（TRANSLATION_MEMORY，未绑定则用 IMAGES_CACHE），
+ * 只有未命中的短语才合并为一次 LLM 调用，新译文写回 KV 供后续请求复用。
+ * 不含中文的短语（用户已写成英文）原样保留，不查表也不翻译。
+ */
+import { logWarn } from "../utils/logger.js";
+import { LruCache } from "../utils/lru.js";
+import { recordMetric } from "../utils/metrics.js";
+
+import {
+  translateNegativePrompt,
+  translateNegativePromptBatch,
+  translatePhrasesWithDeepseek,
+} from "./translate.js";
+
+const KEY_PREFIX = "tm:v1:";
+const DEFAULT_TTL_SECONDS = 30 * 86400;
+const DEFAULT_MAX_ENTRIES = 2000;
+// 超长短语通常是整句描述，复用率低，不写入翻译记忆
+const MAX_PHRASE_LENGTH = 64;
+const CJK_PATTERN = /[\u3400-\u9fff\uf900-\ufaff]/;
+
+// 常见负面提示词的内置译文，冷启动时也无需调用 LLM
+const SEED_DICTIONARY = {
+  模糊: "blurry",
+  低质量: "low quality",
+  最差质量: "worst quality",
+  低分辨率: "low resolution",
+  噪点: "noise",
+  水印: "watermark",
+  文字: "text",
+  签名: "signature",
+  裁剪: "cropped",
+  畸形: "deformed",
+  变形: "distorted",
+  丑陋: "ugly",
+  多余的手指: "extra fingers",
+  多余的肢体: "extra limbs",
+  缺失的手指: "missing fingers",
+  手部畸形: "bad hands",
+  解剖结构错误: "bad anatomy",
+  比例失调: "bad proportions",
+  过度曝光: "overexposed",
+  曝光不足: "underexposed",
+  jpeg伪影: "jpeg artifacts",
+  重复: "duplicate",
+  脸部扭曲: "distorted face",
+  卡通: "cartoon",
+};
+
+let memoryCache = null;
+
+function memoryEnabled(env) {
+  return String(env?.TRANSLATION_MEMORY_ENABLED || "true").toLowerCase() !== "false";
+}
+
+function resolveTtlSeconds(env) {
+  const value = parseInt(env?.TRANSLATION_MEMORY_TTL_SECONDS || "", 10);
+  return !Number.isNaN(value) && value >= 60 ? value : DEFAULT_TTL_SECONDS;
+}
+
+function getMemoryCache(env) {
+  if (memoryCache === null) {
+    const value = parseInt(env?.TRANSLATION_MEMORY_MAX_ENTRIES ?? "", 10);
+    const maxEntries = !Number.isNaN(value) && value >= 0 ? value : DEFAULT_MAX_ENTRIES;
+    memoryCache = maxEntries > 0 ? new LruCache({ maxEntries }) : false;
+  }
+  return memoryCache || null;
+}
+
+function getStore(env) {
+  const store = env?.TRANSLATION_MEMORY || env?.IMAGES_CACHE;
+  return store && typeof store.get === "function" ? store : null;
+}
+
+/**
+ * 按中英文逗号、顿号、分号与换行拆分短语
+ */
+export function splitNegativePhrases(text) {
+  return String(text || "")
+    .split(/[,，、;；\n]+/)
+    .map((phrase) => phrase.trim())
+    .filter(Boolean);
+}
+
+/**
+ * 查表用的短语规范化：Unicode NFC、折叠空白、英文小写
+ */
+export function normalizePhrase(phrase) {
+  return String(phrase || "")
+    .normalize("NFC")
+    .replace(/\s+/g, " ")
+    .trim()
+    .toLowerCase();
+}
+
+async function lookupPhrases(phrases, env, memory, store) {
+  const found = new Map();
+  const pending = [];
+  for (const phrase of phrases) {
+    const hit = SEED_DICTIONARY[phrase] || memory?.get(phrase);
+    if (hit) found.set(phrase, hit);
+    else pending.push(phrase);
+  }
+  if (store && pending.length) {
+    const values = await Promise.all(
+      pending.map((phrase) =>
+        store.get(`${KEY_PREFIX}${phrase}`).catch((error) => {
+          logWarn(env, "[TranslationMemory] 读取翻译记忆失败", { error: error.message });
+          return null;
+        })
+      )
+    );
+    pending.forEach((phrase, index) => {
+      if (values[index]) {
+        found.set(phrase, values[index]);
+        memory?.set(phrase, values[index]);
+      }
+    });
+  }
+  return found;
+}
+
+function storePhrases(pairs, env, ctx, memory, store) {
+  for (const [phrase, translation] of pairs) {
+    memory?.set(phrase, translation);
+  }
+  const storable = pairs.filter(([phrase]) => phrase.length <= MAX_PHRASE_LENGTH);
+  if (!store || storable.length === 0) return null;
+  const expirationTtl = resolveTtlSeconds(env);
+  const write = Promise.all(
+    storable.map(([phrase, translation]) =>
+      store.put(`${KEY_PREFIX}${phrase}`, translation, { expirationTtl })
+    )
+  ).catch((error) => logWarn(env, "[TranslationMemory] 写入翻译记忆失败", { error: error.message }));
+  if (ctx && typeof ctx.waitUntil === "function") {
+    ctx.waitUntil(write);
+    return null;
+  }
+  return write;
+}
+
+/**
+ * 带翻译记忆的负面提示词翻译
+ * 批量翻译结果无法与短语一一对应时退回整段翻译（不写入记忆），保证结果与旧实现一致
+ * @returns {Promise<{translated_text: string, translated: boolean, memory_hits?: number, llm_phrases?: number}>}
+ */
+export async function translateNegativePromptWithMemory(text, env, ctx, options = {}) {
+  const phrases = splitNegativePhrases(text);
+  if (!memoryEnabled(env) || phrases.length === 0) {
+    return translateNegativePrompt(text, env, options);
+  }
+
+  const t0 = Date.now();
+  const memory = getMemoryCache(env);
+  const store = getStore(env);
+  const keys = phrases.map(normalizePhrase);
+  const cjkKeys = [...new Set(keys.filter((key) => CJK_PATTERN.test(key)))];
+  const known = await lookupPhrases(cjkKeys, env, memory, store);
+  const unknown = cjkKeys.filter((key) => !known.has(key));
+
+  if (unknown.length) {
+    const translations = await translatePhrasesWithDeepseek(unknown, env, options);
+    if (!translations) {
+      recordMetric(env, "translation_memory", {
+        phrases: phrases.length,
+        memory_hits: known.size,
+        llm_phrases: unknown.length,
+        fallback: true,
+      });
+      return translateNegativePrompt(text, env, options);
+    }
+    const pairs = unknown.map((key, index) => [key, translations[index]]);
+    pairs.forEach(([key, translation]) => known.set(key, translation));
+    const write = storePhrases(pairs, env, ctx, memory, store);
+    if (write) await write;
+  }
+
+  const translatedText = phrases
+    .map((phrase, index) => known.get(keys[index]) || phrase)
+    .join(", ");
+  const memoryHits = cjkKeys.length - unknown.length;
+  recordMetric(env, "translation_memory", {
+    phrases: phrases.length,
+    memory_hits: memoryHits,
+    llm_phrases: unknown.length,
+    dt_ms: Date.now() - t0,
+  });
+  return {
+    translated_text: translatedText,
+    translated: true,
+    memory_hits: memoryHits,
+    llm_phrases: unknown.length,
+  };
+}
+
+/**
+ * 带翻译记忆的批量翻译：所有文本的短语一起查表，只把未命中的短语（跨文本去重）交给
+ * translateNegativePromptBatch 打包翻译，译文写回翻译记忆；没有可拆分短语的文本整段批量翻译。
+ * 某个短语翻译失败时，包含它的文本按失败返回原文
+ * @returns {Promise<{results: Object[], stats: Object}>} stats 在批量统计之外附带 memory_hits / llm_phrases
+ */
+export async function translateNegativePromptsWithMemory(texts, env, ctx, options = {}) {
+  if (!memoryEnabled(env)) {
+    return translateNegativePromptBatch(texts, env, options);
+  }
+
+  const t0 = Date.now();
+  const memory = getMemoryCache(env);
+  const store = getStore(env);
+  const parsed = texts.map((text) => {
+    const phrases = splitNegativePhrases(text);
+    return { text, phrases, keys: phrases.map(normalizePhrase) };
+  });
+  const cjkKeys = [
+    ...new Set(parsed.flatMap(({ keys }) => keys.filter((key) => CJK_PATTERN.test(key)))),
+  ];
+  const known = await lookupPhrases(cjkKeys, env, memory, store);
+  const unknown = cjkKeys.filter((key) => !known.has(key));
+  const whole = parsed.filter(({ phrases }) => phrases.length === 0).map(({ text }) => text);
+
+  let stats = { packs: 0, llm_calls: 0, fallbacks: 0 };
+  const failed = new Map();
+  const wholeResults = new Map();
+  if (unknown.length || whole.length) {
+    const batch = await translateNegativePromptBatch([...unknown, ...whole], env, options);
+    stats = batch.stats;
+    const pairs = [];
+    unknown.forEach((key, index) => {
+      const result = batch.results[index];
+      if (result.translated) pairs.push([key, result.translated_text]);
+      else failed.set(key, result.error || "翻译失败");
+    });
+    whole.forEach((text, index) => wholeResults.set(text, batch.results[unknown.length + index]));
+    pairs.forEach(([key, translation]) => known.set(key, translation));
+    const write = storePhrases(pairs, env, ctx, memory, store);
+    if (write) await write;
+  }
+
+  const results = parsed.map(({ text, phrases, keys }) => {
+    if (phrases.length === 0) return { ...wholeResults.get(text) };
+    const error = keys.map((key) => failed.get(key)).find(Boolean);
+    if (error) return { translated_text: text, translated: false, error };
+    return {
+      translated_text: phrases.map((phrase, index) => known.get(keys[index]) || phrase).join(", "),
+      translated: true,
+    };
+  });
+  const memoryHits = cjkKeys.length - unknown.length;
+  recordMetric(env, "translation_memory", {
+    texts: texts.length,
+    phrases: cjkKeys.length,
+    memory_hits: memoryHits,
+    llm_phrases: unknown.length,
+    dt_ms: Date.now() - t0,
+  });
+  return { results, stats: { ...stats, memory_hits: memoryHits, llm_phrases: unknown.length } };
+}
+
+export function resetTranslationMemory() {
+  memoryCache = null;
+}
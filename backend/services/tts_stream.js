@@ -0,0 +1,167 @@
+/**
+ * 流式 TTS：按句子切分长文本，以有界并发逐段合成，并按原顺序把 MP3 帧串接输出
+ * 首段合成完成即可开始播放，不必等待整段文本合成
+ * 每段都经过生成结果缓存（与非流式请求共用同一键），示例句、分享链接等重复文本不再调用上游
+ */
+import { logError, logInfo } from "../utils/logger.js";
+import { recordMetric } from "../utils/metrics.js";
+
+import { requestAudioFromPollinations } from "./generation.js";
+import { normalizeAudioCacheParams, withGenerationCache } from "./generation_cache.js";
+
+const DEFAULT_SEGMENT_MAX_CHARS = 300;
+const DEFAULT_STREAM_CONCURRENCY = 2;
+// 句末标点（中英文），保留标点在句子末尾
+// 英文句点仅在其后为空白或文本结尾时视为句末，避免切开 3.14、e.g. 之类的写法
+const SENTENCE_PATTERN = /(?:[^。！？!?；;\n.]|\.(?!\s|$))+(?:[。！？!?；;\n]+|\.+(?=\s|$)|$)/g;
+
+// 以中日韩文字或全角标点结尾时直接拼接，否则补一个空格
+const CJK_TAIL = /[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]$/;
+
+const SPEAKABLE = /[\p{L}\p{N}]/u;
+
+function readPositiveInt(env, key, fallback) {
+  const value = parseInt(env?.[key] || "", 10);
+  return Number.isNaN(value) || value < 1 ? fallback : value;
+}
+
+/**
+ * 按句子边界切分文本；相邻短句合并到 maxChars 以内，超长句按逗号/空格再切
+ * @param {string} text
+ * @param {number} maxChars
+ * @returns {string[]}
+ */
+export function splitTextForSpeech(text, maxChars = DEFAULT_SEGMENT_MAX_CHARS) {
+  const sentences = String(text || "").match(SENTENCE_PATTERN) || [];
+  const pieces = [];
+  for (const raw of sentences) {
+    const sentence = raw.trim();
+    if (!sentence) continue;
+    if (sentence.length <= maxChars) {
+      pieces.push(sentence);
+      continue;
+    }
+    // 超长句：优先在逗号、空格处切分，实在没有就硬切
+    let rest = sentence;
+    while (rest.length > maxChars) {
+      const window = rest.slice(0, maxChars);
+      const cut = Math.max(
+        window.lastIndexOf("，"),
+        window.lastIndexOf(","),
+        window.lastIndexOf("、"),
+        window.lastIndexOf(" ")
+      );
+      const end = cut > maxChars / 2 ? cut + 1 : maxChars;
+      pieces.push(rest.slice(0, end).trim());
+      rest = rest.slice(end).trim();
+    }
+    if (rest) pieces.push(rest);
+  }
+
+  const segments = [];
+  for (const piece of pieces) {
+    const last = segments[segments.length - 1];
+    // 纯标点的碎片没有可朗读内容，直接并入上一段，即使略超 maxChars
+    const speakable = SPEAKABLE.test(piece);
+    if (last !== undefined && (!speakable || last.length + piece.length + 1 <= maxChars)) {
+      segments[segments.length - 1] =
+        CJK_TAIL.test(last) || !speakable ? last + piece : `${last} ${piece}`;
+    } else {
+      segments.push(piece);
+    }
+  }
+  return segments;
+}
+
+/**
+ * 去掉 ID3v2 标签头，避免后续分段的标签混入串接后的 MP3 帧流
+ */
+export function stripId3v2(bytes) {
+  if (bytes.length < 10 || bytes[0] !== 0x49 || bytes[1] !== 0x44 || bytes[2] !== 0x33) {
+    return bytes;
+  }
+  const size = (bytes[6] << 21) | (bytes[7] << 14) | (bytes[8] << 7) | bytes[9];
+  const hasFooter = (bytes[5] & 0x10) !== 0;
+  return bytes.subarray(Math.min(bytes.length, 10 + size + (hasFooter ? 10 : 0)));
+}
+
+/**
+ * 创建流式音频输出
+ * signal 取消或下游停止读取时，立即取消仍在进行的分段合成
+ * ctx 用于后台写入分段缓存
+ * @returns {{stream: ReadableStream, segments: number, done: Promise<void>}}
+ */
+export function createSpeechStream(text, env, { voice, model, speed, signal, ctx } = {}) {
+  const maxChars = readPositiveInt(env, "TTS_SEGMENT_MAX_CHARS", DEFAULT_SEGMENT_MAX_CHARS);
+  const concurrency = readPositiveInt(env, "TTS_STREAM_CONCURRENCY", DEFAULT_STREAM_CONCURRENCY);
+  const segments = splitTextForSpeech(text, maxChars);
+  const { readable, writable } = new TransformStream();
+  const writer = writable.getWriter();
+  const t0 = Date.now();
+  const abortController = new AbortController();
+  const onAbort = () => abortController.abort(signal.reason);
+  if (signal?.aborted) onAbort();
+  else signal?.addEventListener("abort", onAbort, { once: true });
+  // 客户端断开后写入失败，写端随之出错；借此取消尚未完成的分段
+  writer.closed.catch(() => abortController.abort());
+
+  let cacheHits = 0;
+  const synthesize = (index) => {
+    const segment = segments[index];
+    const normalized = normalizeAudioCacheParams({ text: segment, voice, model, speed });
+    const promise = withGenerationCache(env, ctx, "audio", normalized, () =>
+      requestAudioFromPollinations(segment, env, voice, model, speed, {
+        signal: abortController.signal,
+      })
+    ).then(({ response, cache }) => {
+      if (cache === "hit") cacheHits += 1;
+      return response.arrayBuffer();
+    });
+    // 提前启动的分段可能在被 await 之前失败，这里先挂上处理避免未处理的 rejection
+    promise.catch(() => {});
+    return promise;
+  };
+
+  const done = (async () => {
+    const pending = [];
+    for (let i = 0; i < Math.min(concurrency, segments.length); i++) {
+      pending[i] = synthesize(i);
+    }
+    let firstChunkMs;
+    try {
+      for (let i = 0; i < segments.length; i++) {
+        const audio = new Uint8Array(await pending[i]);
+        pending[i] = null;
+        if (i + concurrency < segments.length) {
+          pending[i + concurrency] = synthesize(i + concurrency);
+        }
+        await writer.write(i === 0 ? audio : stripId3v2(audio));
+        if (i === 0) firstChunkMs = Date.now() - t0;
+      }
+      await writer.close();
+      logInfo(env, `[Worker Log] 流式 TTS 完成，共 ${segments.length} 段`);
+      recordMetric(env, "generate_audio_stream", {
+        success: true,
+        segments: segments.length,
+        cache_hits: cacheHits,
+        first_chunk_ms: firstChunkMs,
+        dt_ms: Date.now() - t0,
+      });
+    } catch (error) {
+      // 响应头已发出，只能中断输出流；客户端会收到截断的音频
+      logError(env, "[Generation] 流式音频合成中断", { error: error.message });
+      recordMetric(env, "generate_audio_stream", {
+        success: false,
+        segments: segments.length,
+        dt_ms: Date.now() - t0,
+        error: error.message,
+      });
+      abortController.abort();
+      await writer.abort(error).catch(() => {});
+    } finally {
+      signal?.removeEventListener("abort", onAbort);
+    }
+  })();
+
+  return { stream: readable, segments: segments.length, done };
+}
@@ -0,0 +1,146 @@
+/**
+ * 用户记录缓存：isolate 内 LRU（短 TTL）→ Cache API（本数据中心）→ USERS KV
+ * 只缓存 token 验证需要的公开字段，不缓存密码哈希与盐值。
+ * 用户记录被修改（登录、重置密码、Google 登录）时调用 invalidateCachedUser；
+ * 其他 isolate / 数据中心的旧副本最多保留 USER_CACHE_TTL_SECONDS。
+ */
+import { logWarn } from "../utils/logger.js";
+import { LruCache } from "../utils/lru.js";
+import { recordMetric } from "../utils/metrics.js";
+
+const EDGE_CACHE_ORIGIN = "https://user-cache.internal";
+const DEFAULT_TTL_SECONDS = 60;
+const DEFAULT_MAX_ENTRIES = 1000;
+const CACHED_FIELDS = ["id", "username", "email", "createdAt", "lastLoginAt", "isActive"];
+
+let memoryCache = null;
+
+function cacheEnabled(env) {
+  return String(env?.USER_CACHE_ENABLED || "true").toLowerCase() !== "false";
+}
+
+function resolveTtlSeconds(env) {
+  const value = parseInt(env?.USER_CACHE_TTL_SECONDS || "", 10);
+  return !Number.isNaN(value) && value > 0 ? value : DEFAULT_TTL_SECONDS;
+}
+
+function getMemoryCache(env) {
+  if (memoryCache === null) {
+    const value = parseInt(env?.USER_CACHE_MAX_ENTRIES ?? "", 10);
+    const maxEntries = !Number.isNaN(value) && value >= 0 ? value : DEFAULT_MAX_ENTRIES;
+    memoryCache =
+      maxEntries > 0
+        ? new LruCache({ maxEntries, ttlMs: resolveTtlSeconds(env) * 1000 })
+        : false;
+  }
+  return memoryCache || null;
+}
+
+function getEdgeCache() {
+  try {
+    return typeof caches !== "undefined" && caches.default ? caches.default : null;
+  } catch (_) {
+    return null;
+  }
+}
+
+function normalizeEmail(email) {
+  return String(email || "")
+    .trim()
+    .toLowerCase();
+}
+
+async function edgeCacheRequest(emailKey) {
+  // Cache API 的键是 URL，用邮箱哈希避免邮箱出现在缓存键中
+  const digest = await crypto.subtle.digest("SHA-256", new TextEncoder().encode(emailKey));
+  const hash = [...new Uint8Array(digest)].map((b) => b.toString(16).padStart(2, "0")).join("");
+  return new Request(`${EDGE_CACHE_ORIGIN}/${hash}`);
+}
+
+function publicFields(user) {
+  const cached = {};
+  for (const field of CACHED_FIELDS) {
+    if (user[field] !== undefined) cached[field] = user[field];
+  }
+  return cached;
+}
+
+/**
+ * 读取用户记录（公开字段）；缓存未命中时调用 loader 读取 KV 并回填
+ * @param {Object} env
+ * @param {string} email
+ * @param {() => Promise<Object|null>} loader - 从 USERS KV 读取完整用户记录
+ * @returns {Promise<Object|null>}
+ */
+export async function getCachedUser(env, email, loader) {
+  if (!cacheEnabled(env)) {
+    const user = await loader();
+    return user ? publicFields(user) : null;
+  }
+
+  const emailKey = normalizeEmail(email);
+  const memory = getMemoryCache(env);
+  const inMemory = memory?.get(emailKey);
+  if (inMemory) {
+    recordMetric(env, "user_cache", { result: "hit", layer: "memory" });
+    return { ...inMemory };
+  }
+
+  const edge = getEdgeCache();
+  const ttlSeconds = resolveTtlSeconds(env);
+  if (edge) {
+    try {
+      const hit = await edge.match(await edgeCacheRequest(emailKey));
+      if (hit) {
+        const user = await hit.json();
+        memory?.set(emailKey, user);
+        recordMetric(env, "user_cache", { result: "hit", layer: "edge" });
+        return { ...user };
+      }
+    } catch (error) {
+      logWarn(env, "[UserCache] 边缘缓存读取失败", { error: error.message });
+    }
+  }
+
+  recordMetric(env, "user_cache", { result: "miss" });
+  const record = await loader();
+  if (!record) return null;
+  const user = publicFields(record);
+  memory?.set(emailKey, user);
+  if (edge) {
+    try {
+      await edge.put(
+        await edgeCacheRequest(emailKey),
+        new Response(JSON.stringify(user), {
+          headers: {
+            "Content-Type": "application/json",
+            "Cache-Control": `max-age=${ttlSeconds}`,
+          },
+        })
+      );
+    } catch (error) {
+      logWarn(env, "[UserCache] 边缘缓存写入失败", { error: error.message });
+    }
+  }
+  return { ...user };
+}
+
+/**
+ * 用户记录变更后清除本 isolate 与本数据中心的缓存
+ */
+export async function invalidateCachedUser(env, email) {
+  const emailKey = normalizeEmail(email);
+  if (!emailKey) return;
+  getMemoryCache(env)?.delete(emailKey);
+  const edge = getEdgeCache();
+  if (!edge) return;
+  try {
+    await edge.delete(await edgeCacheRequest(emailKey));
+  } catch (error) {
+    logWarn(env, "[UserCache] 边缘缓存清除失败", { error: error.message });
+  }
+}
+
+export function resetUserCache() {
+  memoryCache = null;
+}
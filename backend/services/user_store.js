@@ -0,0 +1,224 @@
+/**
+ * USERS KV 上的用户存储
+ * 主记录以 id 为键（user:<id>），另有小写邮箱 → id 的索引（email:<email>）。
+ * JWT 携带 userId，token 验证只需一次按 id 读取；登录、注册等按邮箱查找时先读索引再读主记录。
+ * 旧版记录直接以邮箱（可能是原始大小写）为键：migrateLegacyUsers 一次性批量迁移，
+ * 迁移完成前按邮箱查找仍会回退读取小写旧键，命中后顺带迁移该用户。
+ */
+import { mapWithConcurrency } from "../utils/concurrency.js";
+import { logInfo, logWarn } from "../utils/logger.js";
+import { recordMetric } from "../utils/metrics.js";
+
+const USER_PREFIX = "user:";
+const EMAIL_PREFIX = "email:";
+const MIGRATION_KEY = "CONFIG:user_store_migration";
+// KV 批量读取单次最多 100 个键
+const BULK_GET_LIMIT = 100;
+const LIST_PAGE_SIZE = 1000;
+const MIGRATION_CONCURRENCY = 10;
+// 迁移未完成时，隔多久重新读取一次完成标记
+const MIGRATION_RECHECK_MS = 60000;
+// 旧版用户键就是邮箱本身；新键与其他数据（RATE_LIMIT:、USAGE:、CONFIG: 等）都带冒号前缀
+const LEGACY_KEY_PATTERN = /^[^\s@:]+@[^\s@:]+$/;
+
+// isolate 内记住迁移是否已完成，完成后按邮箱查找不再回退读取旧键
+let migrationState = { done: false, checkedAt: 0 };
+
+export function normalizeUserEmail(email) {
+  return String(email || "")
+    .trim()
+    .toLowerCase();
+}
+
+function parseUser(value) {
+  if (!value) return null;
+  if (typeof value === "object") return value;
+  try {
+    return JSON.parse(value);
+  } catch (_) {
+    return null;
+  }
+}
+
+/**
+ * 批量读取：优先使用 KV 的多键 get（返回 Map），绑定不支持时退回逐键并发读取
+ * @returns {Promise<Map<string, any>>}
+ */
+export async function getMany(kv, keys, type = "text") {
+  const values = new Map();
+  for (let start = 0; start < keys.length; start += BULK_GET_LIMIT) {
+    const chunk = keys.slice(start, start + BULK_GET_LIMIT);
+    let bulk = null;
+    try {
+      bulk = await kv.get(chunk, type);
+    } catch (_) {
+      bulk = null;
+    }
+    if (bulk instanceof Map) {
+      for (const key of chunk) values.set(key, bulk.get(key) ?? null);
+      continue;
+    }
+    const single = await Promise.all(chunk.map((key) => kv.get(key, type)));
+    chunk.forEach((key, index) => values.set(key, single[index] ?? null));
+  }
+  return values;
+}
+
+async function isMigrationComplete(env) {
+  const now = Date.now();
+  if (!migrationState.done && now - migrationState.checkedAt >= MIGRATION_RECHECK_MS) {
+    try {
+      migrationState = { done: Boolean(await env.USERS.get(MIGRATION_KEY)), checkedAt: now };
+    } catch (_) {
+      return false;
+    }
+  }
+  return migrationState.done;
+}
+
+/**
+ * 写入主记录与邮箱索引（邮箱统一为小写）
+ */
+export async function putUser(env, user) {
+  const email = normalizeUserEmail(user.email);
+  const record = { ...user, email };
+  await Promise.all([
+    env.USERS.put(`${USER_PREFIX}${record.id}`, JSON.stringify(record)),
+    env.USERS.put(`${EMAIL_PREFIX}${email}`, record.id),
+  ]);
+  return record;
+}
+
+export async function getUserById(env, id) {
+  if (!id) return null;
+  return parseUser(await env.USERS.get(`${USER_PREFIX}${id}`));
+}
+
+/**
+ * 按 id 批量读取用户
+ * @returns {Promise<Map<string, Object|null>>}
+ */
+export async function getUsersByIds(env, ids) {
+  const unique = [...new Set(ids.filter(Boolean))];
+  const values = await getMany(env.USERS, unique.map((id) => `${USER_PREFIX}${id}`));
+  return new Map(unique.map((id) => [id, parseUser(values.get(`${USER_PREFIX}${id}`))]));
+}
+
+/**
+ * 把一条旧记录写成主记录 + 索引并删除旧键；邮箱以旧键为准，极早期缺少 id 的记录补上 id
+ */
+async function migrateOne(env, legacyKey, user) {
+  if (!user) return null;
+  const record = await putUser(env, {
+    ...user,
+    id: user.id || crypto.randomUUID(),
+    email: normalizeUserEmail(legacyKey),
+  });
+  await env.USERS.delete(legacyKey);
+  return record;
+}
+
+export async function getUserByEmail(env, email) {
+  const emailKey = normalizeUserEmail(email);
+  if (!emailKey) return null;
+  const id = await env.USERS.get(`${EMAIL_PREFIX}${emailKey}`);
+  if (id) {
+    return getUserById(env, id);
+  }
+  if (await isMigrationComplete(env)) {
+    return null;
+  }
+  const migrated = await migrateOne(env, emailKey, parseUser(await env.USERS.get(emailKey)));
+  if (migrated) {
+    recordMetric(env, "user_store", { event: "lazy_migrate" });
+  }
+  return migrated;
+}
+
+/**
+ * 一次性迁移旧版邮箱键：逐页列出 USERS 中形如邮箱的键，批量读取后写入主记录与索引并删除旧键。
+ * 同一邮箱同时存在小写键与原始大小写键时以小写键为准（与旧版读取顺序一致），其余旧键直接删除；
+ * 已有索引的邮箱视为已迁移，只删除旧键。
+ * 完成后写入 CONFIG:user_store_migration，再次调用直接返回记录的结果（options.force 强制重跑）。
+ * 无法解析的旧键原样保留并计入 skipped。
+ * @returns {Promise<{scanned: number, migrated: number, duplicates: number, skipped: number, failed: number}>}
+ */
+export async function migrateLegacyUsers(env, options = {}) {
+  if (!options.force) {
+    const previous = parseUser(await env.USERS.get(MIGRATION_KEY));
+    if (previous) {
+      migrationState = { done: true, checkedAt: Date.now() };
+      return { ...previous, alreadyDone: true };
+    }
+  }
+
+  const summary = { scanned: 0, migrated: 0, duplicates: 0, skipped: 0, failed: 0 };
+  let cursor;
+  do {
+    const page = await env.USERS.list({ cursor, limit: LIST_PAGE_SIZE });
+    cursor = page.list_complete ? undefined : page.cursor;
+    const groups = new Map();
+    for (const { name } of page.keys) {
+      if (!LEGACY_KEY_PATTERN.test(name)) continue;
+      const email = normalizeUserEmail(name);
+      if (!groups.has(email)) groups.set(email, []);
+      groups.get(email).push(name);
+      summary.scanned += 1;
+    }
+    if (groups.size === 0) continue;
+
+    // 列表按字节序返回，大写键排在小写键之前、甚至在另一页，所以每个邮箱都连同小写键一起读取
+    const emails = [...groups.keys()];
+    const [records, indexed] = await Promise.all([
+      getMany(env.USERS, [...new Set([...emails, ...groups.values()].flat())]),
+      getMany(env.USERS, emails.map((email) => `${EMAIL_PREFIX}${email}`)),
+    ]);
+
+    const outcomes = await mapWithConcurrency(emails, MIGRATION_CONCURRENCY, async (email) => {
+      const legacyKeys = groups.get(email);
+      const outcome = { migrated: 0, duplicates: 0, skipped: 0 };
+      const alreadyIndexed = Boolean(indexed.get(`${EMAIL_PREFIX}${email}`));
+      const source = alreadyIndexed
+        ? null
+        : [email, ...legacyKeys].find((key) => parseUser(records.get(key)));
+      if (!alreadyIndexed && !source) {
+        outcome.skipped = legacyKeys.length;
+        return outcome;
+      }
+      if (source) {
+        await migrateOne(env, source, parseUser(records.get(source)));
+        outcome.migrated = 1;
+      }
+      const rest = legacyKeys.filter((key) => key !== source);
+      await Promise.all(rest.map((key) => env.USERS.delete(key)));
+      outcome.duplicates = rest.length;
+      return outcome;
+    });
+    for (const outcome of outcomes) {
+      if (outcome.error) {
+        summary.failed += 1;
+        logWarn(env, "[UserStore] 迁移用户失败", { error: outcome.error.message });
+        continue;
+      }
+      for (const field of ["migrated", "duplicates", "skipped"]) {
+        summary[field] += outcome.value[field];
+      }
+    }
+  } while (cursor);
+
+  // 有失败时不写完成标记，修复后可再次运行
+  if (summary.failed === 0) {
+    await env.USERS.put(
+      MIGRATION_KEY,
+      JSON.stringify({ ...summary, completedAt: new Date().toISOString() })
+    );
+    migrationState = { done: true, checkedAt: Date.now() };
+  }
+  logInfo(env, "[UserStore] 旧版用户键迁移完成", summary);
+  recordMetric(env, "user_store", { event: "migrate", ...summary });
+  return summary;
+}
+
+export function resetUserStore() {
+  migrationState = { done: false, checkedAt: 0 };
+}
@@ -0,0 +1,23 @@
+/**
+ * 客户端断开（请求被取消）时的统一处理
+ * Workers 需开启 enable_request_signal 兼容标志，request.signal 才会在客户端断开时触发
+ */
+import { logInfo } from "./logger.js";
+import { recordMetric } from "./metrics.js";
+
+// 与 nginx / Cloudflare 日志中的约定一致：客户端主动关闭连接
+const CLIENT_CLOSED_REQUEST = 499;
+
+export function isClientAborted(request) {
+  return Boolean(request?.signal?.aborted);
+}
+
+/**
+ * 记录被放弃的请求并返回一个无人读取的占位响应
+ */
+export function clientAbortedResponse(env, route, startedAt) {
+  const dt = Date.now() - startedAt;
+  logInfo(env, `[Worker Log] 客户端已断开，取消 ${route} 的后续工作 (${dt}ms)`);
+  recordMetric(env, "request_aborted", { route, dt_ms: dt });
+  return new Response(null, { status: CLIENT_CLOSED_REQUEST });
+}
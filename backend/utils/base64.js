@@ -1,9 +1,38 @@
+import { Buffer } from "node:buffer";
+
+// 每块字节数必须是 3 的倍数，这样各块独立编码后的 base64 可以直接拼接（中间不会出现 "=" 填充）
+const CHUNK_BYTES = 3 * 8192;
+
+function toUint8Array(buffer) {
+  if (buffer instanceof Uint8Array) return buffer;
+  if (ArrayBuffer.isView(buffer)) {
+    return new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength);
+  }
+  return new Uint8Array(buffer);
+}
+
+/**
+ * 分块编码：每次只把 CHUNK_BYTES 字节转成二进制字符串再 btoa，
+ * 中间态内存固定为一块大小，不依赖 Node Buffer
+ */
+export function arrayBufferToBase64Chunked(buffer) {
+  const bytes = toUint8Array(buffer);
+  const parts = [];
+  for (let offset = 0; offset < bytes.byteLength; offset += CHUNK_BYTES) {
+    const chunk = bytes.subarray(offset, offset + CHUNK_BYTES);
+    parts.push(btoa(String.fromCharCode.apply(null, chunk)));
+  }
+  return parts.join("");
+}
+
+/**
+ * ArrayBuffer / TypedArray 转 base64
+ * 优先走 nodejs_compat 提供的原生 Buffer（零拷贝视图，直接输出 base64），不可用时回退到分块编码
+ */
 export function arrayBufferToBase64(buffer) {
-  let binary = "";
-  const bytes = new Uint8Array(buffer);
-  const len = bytes.byteLength;
-  for (let i = 0; i < len; i++) {
-    binary += String.fromCharCode(bytes[i]);
+  const bytes = toUint8Array(buffer);
+  if (typeof Buffer === "function" && typeof Buffer.from === "function") {
+    return Buffer.from(bytes.buffer, bytes.byteOffset, bytes.byteLength).toString("base64");
   }
-  return btoa(binary);
+  return arrayBufferToBase64Chunked(bytes);
 }
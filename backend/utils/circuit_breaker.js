@@ -0,0 +1,267 @@
+/**
+ * 上游熔断器（按 apiName；多端点路由时按 apiName + 端点，坏掉的镜像不会拖垮整个 API）
+ * 时间窗内请求数达到 CIRCUIT_MIN_REQUESTS 且失败率（429 / 5xx / 网络错误）达到 CIRCUIT_ERROR_RATE 时熔断，
+ * 熔断期间直接以 503 + Retry-After 失败，不再进入重试退避；CIRCUIT_OPEN_MS 后进入 half-open，
+ * 只放行 CIRCUIT_HALF_OPEN_PROBES 个探测请求，成功即恢复，失败则重新熔断。
+ * 熔断状态写入 KV（CIRCUIT_STATE，未绑定则用 IMAGES_CACHE），其他 isolate 每 CIRCUIT_SYNC_MS 读取一次，
+ * 一个 isolate 发现上游故障后，其余 isolate 也能很快停止打满重试。
+ */
+import { logInfo, logWarn } from "./logger.js";
+import { recordMetric } from "./metrics.js";
+import { apiEnvKey, readApiNumber } from "./upstream_config.js";
+
+const KEY_PREFIX = "circuit:";
+const DEFAULT_WINDOW_MS = 60000;
+const DEFAULT_MIN_REQUESTS = 10;
+const DEFAULT_ERROR_RATE = 0.5;
+const DEFAULT_OPEN_MS = 30000;
+const DEFAULT_HALF_OPEN_PROBES = 1;
+const DEFAULT_SYNC_MS = 10000;
+// half-open 时探测名额已满的请求，提示客户端稍后再试的秒数
+const HALF_OPEN_RETRY_AFTER_SECONDS = 5;
+
+const circuits = new Map();
+
+export function circuitBreakerEnabled(env) {
+  return String(env?.CIRCUIT_BREAKER_ENABLED || "true").toLowerCase() !== "false";
+}
+
+function circuitKey(apiName, scope) {
+  return scope ? `${apiName} @ ${scope}` : apiName;
+}
+
+function getCircuit(apiName, scope = null) {
+  const key = circuitKey(apiName, scope);
+  let circuit = circuits.get(key);
+  if (!circuit) {
+    circuit = {
+      apiName,
+      scope,
+      state: "closed",
+      openedUntil: 0,
+      windowStart: Date.now(),
+      requests: 0,
+      failures: 0,
+      probes: 0,
+      lastSync: 0,
+    };
+    circuits.set(key, circuit);
+  }
+  return circuit;
+}
+
+function getSharedStore(env) {
+  const store = env?.CIRCUIT_STATE || env?.IMAGES_CACHE;
+  return store && typeof store.get === "function" ? store : null;
+}
+
+function sharedKey(circuit) {
+  const suffix = circuit.scope ? `:${circuit.scope}` : "";
+  return `${KEY_PREFIX}${apiEnvKey(circuit.apiName)}${suffix}`;
+}
+
+function circuitOpenError(apiName, waitMs) {
+  const retryAfter = Math.max(1, Math.ceil(waitMs / 1000));
+  const err = new Error(`${apiName} 暂时不可用，请 ${retryAfter} 秒后重试`);
+  err.status = 503;
+  err.retryAfter = retryAfter;
+  err.code = "circuit_open";
+  return err;
+}
+
+/**
+ * 按间隔读取其他 isolate 写入的熔断状态
+ */
+async function syncShared(env, circuit) {
+  const { apiName } = circuit;
+  const store = getSharedStore(env);
+  const now = Date.now();
+  const interval = readApiNumber(env, apiName, "CIRCUIT_SYNC_MS", DEFAULT_SYNC_MS, { min: 0 });
+  if (!store || now - circuit.lastSync < interval) return;
+  circuit.lastSync = now;
+  try {
+    const shared = await store.get(sharedKey(circuit), "json");
+    if (shared?.until > now && circuit.state === "closed") {
+      circuit.state = "open";
+      circuit.openedUntil = shared.until;
+      logInfo(env, `[Worker Log] ${circuitKey(apiName, circuit.scope)} 已被其他实例熔断，同步熔断状态`);
+    }
+  } catch (error) {
+    logWarn(env, "[CircuitBreaker] 读取共享熔断状态失败", {
+      api: apiName,
+      endpoint: circuit.scope,
+      error: error.message,
+    });
+  }
+}
+
+async function writeShared(env, circuit, until) {
+  const store = getSharedStore(env);
+  if (!store) return;
+  const key = sharedKey(circuit);
+  try {
+    if (until) {
+      // KV 的 expirationTtl 最小为 60 秒；过期时间以 until 为准
+      const ttl = Math.max(60, Math.ceil((until - Date.now()) / 1000));
+      await store.put(key, JSON.stringify({ until }), { expirationTtl: ttl });
+    } else {
+      await store.delete(key);
+    }
+  } catch (error) {
+    logWarn(env, "[CircuitBreaker] 写入共享熔断状态失败", {
+      api: circuit.apiName,
+      endpoint: circuit.scope,
+      error: error.message,
+    });
+  }
+}
+
+async function openCircuit(env, circuit, reason) {
+  const { apiName, scope } = circuit;
+  const openMs = readApiNumber(env, apiName, "CIRCUIT_OPEN_MS", DEFAULT_OPEN_MS, { min: 0 });
+  circuit.state = "open";
+  circuit.openedUntil = Date.now() + openMs;
+  circuit.probes = 0;
+  logWarn(env, "[CircuitBreaker] 上游熔断", {
+    api: apiName,
+    endpoint: scope,
+    reason,
+    requests: circuit.requests,
+    failures: circuit.failures,
+  });
+  recordMetric(env, "circuit_breaker", { api: apiName, endpoint: scope, event: "open", reason });
+  await writeShared(env, circuit, circuit.openedUntil);
+}
+
+async function closeCircuit(env, circuit) {
+  const { apiName, scope } = circuit;
+  circuit.state = "closed";
+  circuit.openedUntil = 0;
+  circuit.windowStart = Date.now();
+  circuit.requests = 0;
+  circuit.failures = 0;
+  logInfo(env, `[Worker Log] ${circuitKey(apiName, scope)} 探测成功，熔断恢复`);
+  recordMetric(env, "circuit_breaker", { api: apiName, endpoint: scope, event: "close" });
+  await writeShared(env, circuit, null);
+}
+
+/**
+ * 申请一次上游调用：熔断中直接抛出 503（code = "circuit_open"）
+ * @param {{probe: boolean}} [held] - 同一次调用已持有的许可：重试前只检查是否已熔断，沿用原许可
+ * @param {string} [scope] - 端点：多端点路由时每个端点单独熔断，默认整个 apiName 共用一个熔断器
+ * @returns {Promise<{probe: boolean, scope: string|null}>} 许可，调用结束后交给 recordCircuitResult
+ */
+export async function checkCircuit(apiName, env, held = null, scope = held?.scope ?? null) {
+  if (!circuitBreakerEnabled(env)) {
+    return held || { probe: false, scope };
+  }
+  const circuit = getCircuit(apiName, scope);
+  await syncShared(env, circuit);
+
+  const now = Date.now();
+  if (circuit.state === "open") {
+    if (now < circuit.openedUntil) {
+      recordMetric(env, "circuit_breaker", { api: apiName, endpoint: scope, event: "reject" });
+      throw circuitOpenError(apiName, circuit.openedUntil - now);
+    }
+    circuit.state = "half_open";
+    circuit.probes = 0;
+  }
+  if (held) {
+    return held;
+  }
+  if (circuit.state === "half_open") {
+    const maxProbes = readApiNumber(
+      env,
+      apiName,
+      "CIRCUIT_HALF_OPEN_PROBES",
+      DEFAULT_HALF_OPEN_PROBES,
+      { min: 1 }
+    );
+    if (circuit.probes >= maxProbes) {
+      recordMetric(env, "circuit_breaker", { api: apiName, endpoint: scope, event: "reject" });
+      throw circuitOpenError(apiName, HALF_OPEN_RETRY_AFTER_SECONDS * 1000);
+    }
+    circuit.probes += 1;
+    recordMetric(env, "circuit_breaker", { api: apiName, endpoint: scope, event: "probe" });
+    return { probe: true, scope };
+  }
+  return { probe: false, scope };
+}
+
+/**
+ * 记录一次调用结果
+ * @param {boolean|null} ok - true 成功；false 上游故障；null 与上游健康无关（调用方取消、本地限流等）
+ * @param {{probe: boolean, scope: string|null}} permit - checkCircuit 返回的许可
+ */
+export async function recordCircuitResult(apiName, env, ok, permit) {
+  if (!circuitBreakerEnabled(env) || !permit) return;
+  const circuit = getCircuit(apiName, permit.scope);
+
+  if (permit.probe) {
+    circuit.probes = Math.max(0, circuit.probes - 1);
+    if (ok === true && circuit.state === "half_open") {
+      await closeCircuit(env, circuit);
+    } else if (ok === false) {
+      await openCircuit(env, circuit, "probe_failed");
+    }
+    return;
+  }
+  if (ok === null) return;
+
+  const now = Date.now();
+  const windowMs = readApiNumber(env, apiName, "CIRCUIT_WINDOW_MS", DEFAULT_WINDOW_MS, { min: 1 });
+  if (now - circuit.windowStart > windowMs) {
+    circuit.windowStart = now;
+    circuit.requests = 0;
+    circuit.failures = 0;
+  }
+  circuit.requests += 1;
+  if (!ok) circuit.failures += 1;
+
+  const minRequests = readApiNumber(env, apiName, "CIRCUIT_MIN_REQUESTS", DEFAULT_MIN_REQUESTS, {
+    min: 1,
+  });
+  const errorRate = readApiNumber(env, apiName, "CIRCUIT_ERROR_RATE", DEFAULT_ERROR_RATE, {
+    min: 0,
+    max: 1,
+  });
+  if (
+    circuit.state === "closed" &&
+    circuit.requests >= minRequests &&
+    circuit.failures / circuit.requests >= errorRate
+  ) {
+    await openCircuit(env, circuit, "error_rate");
+  }
+}
+
+/**
+ * 当前熔断状态快照；传入 apiNames 时同时读取共享状态，便于健康检查看到其他实例触发的熔断
+ * 按端点熔断的条目键为 "<apiName> @ <端点>"，并带 endpoint 字段
+ */
+export async function getCircuitStats(env, apiNames = []) {
+  for (const apiName of apiNames) {
+    getCircuit(apiName);
+  }
+  const stats = {};
+  for (const [key, circuit] of circuits) {
+    if (circuitBreakerEnabled(env)) {
+      await syncShared(env, circuit);
+    }
+    const now = Date.now();
+    const state =
+      circuit.state === "open" && now >= circuit.openedUntil ? "half_open" : circuit.state;
+    stats[key] = {
+      ...(circuit.scope ? { api: circuit.apiName, endpoint: circuit.scope } : {}),
+      state,
+      requests: circuit.requests,
+      failures: circuit.failures,
+      retry_after_ms: state === "open" ? circuit.openedUntil - now : 0,
+    };
+  }
+  return stats;
+}
+
+export function resetCircuits() {
+  circuits.clear();
+}
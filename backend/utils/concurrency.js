@@ -0,0 +1,27 @@
+/**
+ * 有界并发执行：最多同时运行 limit 个任务，结果按输入顺序返回
+ * fn 抛出的错误会被捕获为 { error }，不会中断其余任务
+ * @param {Array} items
+ * @param {number} limit
+ * @param {(item: any, index: number) => Promise<any>} fn
+ * @returns {Promise<Array<{value?: any, error?: Error}>>}
+ */
+export async function mapWithConcurrency(items, limit, fn) {
+  const results = new Array(items.length);
+  let next = 0;
+
+  async function worker() {
+    while (next < items.length) {
+      const index = next++;
+      try {
+        results[index] = { value: await fn(items[index], index) };
+      } catch (error) {
+        results[index] = { error };
+      }
+    }
+  }
+
+  const workers = Math.max(1, Math.min(limit || 1, items.length));
+  await Promise.all(Array.from({ length: workers }, () => worker()));
+  return results;
+}
@@ -1,67 +1,347 @@
+import { checkCircuit, recordCircuitResult } from "./circuit_breaker.js";
 import { logInfo } from "./logger.js";
+import { recordMetric } from "./metrics.js";
+import { readApiNumber } from "./upstream_config.js";
+import { acquireUpstreamSlot } from "./upstream_limiter.js";
 
-export async function fetchWithRetry(
-  url,
-  options,
-  apiName,
-  env,
-  maxRetries = 8,
-  initialDelay = 1500
-) {
-  const envMax = parseInt(env.RETRY_MAX_ATTEMPTS || env.FETCH_RETRY_MAX || "", 10);
-  if (!Number.isNaN(envMax) && envMax >= 0) {
-    maxRetries = envMax;
-  }
-  const envDelay = parseInt(
-    env.RETRY_INITIAL_DELAY_MS || env.FETCH_RETRY_INITIAL_DELAY_MS || "",
-    10
+const DEFAULT_MAX_ATTEMPTS = 8;
+const DEFAULT_INITIAL_DELAY_MS = 1500;
+const MAX_BACKOFF_MS = 30000;
+const DEFAULT_RETRY_BUDGET_MS = 30000;
+// 各上游默认的总耗时预算（含所有尝试与退避），按对应路由的 SLA 估算，可用 RETRY_BUDGET_MS_<API> 覆盖
+const API_RETRY_BUDGET_MS = {
+  "Pollinations Image API": 60000,
+  "Pollinations TTS API": 45000,
+  "DeepSeek Chat Completions": 30000,
+};
+const IDEMPOTENT_METHODS = new Set(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]);
+
+const retryTraces = new WeakMap();
+
+/**
+ * 读取 fetchWithRetry 返回的 Response 附带的重试轨迹
+ * @returns {{api: string, attempts: Array, total_wait_ms: number, elapsed_ms: number, outcome: string}|undefined}
+ */
+export function getRetryTrace(response) {
+  return response ? retryTraces.get(response) : undefined;
+}
+
+/**
+ * 某个上游的默认总耗时预算（RETRY_BUDGET_MS_<API> / RETRY_BUDGET_MS / 内置默认值）
+ */
+export function resolveRetryBudgetMs(env, apiName) {
+  return readApiNumber(
+    env,
+    apiName,
+    "RETRY_BUDGET_MS",
+    API_RETRY_BUDGET_MS[apiName] ?? DEFAULT_RETRY_BUDGET_MS,
+    { min: 0 }
   );
-  if (!Number.isNaN(envDelay) && envDelay >= 0) {
-    initialDelay = envDelay;
+}
+
+function readEnvInt(env, keys, fallback) {
+  for (const key of keys) {
+    const value = parseInt(env?.[key] || "", 10);
+    if (!Number.isNaN(value) && value >= 0) {
+      return value;
+    }
   }
+  return fallback;
+}
+
+/**
+ * 解析 Retry-After（秒数或 HTTP 日期）与 RateLimit-Reset（秒数），返回毫秒；无法解析返回 null
+ */
+export function parseRetryAfterMs(headers, now = Date.now()) {
+  const retryAfter = headers.get("Retry-After");
+  if (retryAfter) {
+    const seconds = Number(retryAfter);
+    if (Number.isFinite(seconds) && seconds >= 0) {
+      return Math.ceil(seconds * 1000);
+    }
+    const date = Date.parse(retryAfter);
+    if (!Number.isNaN(date)) {
+      return Math.max(0, date - now);
+    }
+  }
+  const resetHeader = headers.get("RateLimit-Reset") || headers.get("X-RateLimit-Reset");
+  const reset = resetHeader ? Number(resetHeader) : NaN;
+  if (Number.isFinite(reset) && reset >= 0) {
+    // 部分上游返回的是 epoch 秒而非剩余秒数
+    return reset > 1e9 ? Math.max(0, reset * 1000 - now) : Math.ceil(reset * 1000);
+  }
+  return null;
+}
+
+function fullJitterDelay(initialDelay, attempt) {
+  const ceiling = Math.min(MAX_BACKOFF_MS, initialDelay * Math.pow(2, attempt - 1));
+  return Math.floor(Math.random() * ceiling);
+}
+
+/**
+ * 合并多个 AbortSignal（任一取消即取消）；均为空时返回 undefined
+ */
+export function combineSignals(...signals) {
+  const present = signals.filter(Boolean);
+  if (present.length <= 1) return present[0];
+  return AbortSignal.any(present);
+}
+
+function abortError(signal) {
+  const reason = signal?.reason;
+  if (reason instanceof Error) return reason;
+  const error = new Error("请求已取消");
+  error.name = "AbortError";
+  return error;
+}
+
+function budgetExhaustedError(apiName, budgetMs) {
+  const error = new Error(`${apiName} 在 ${budgetMs}ms 预算内未返回响应`);
+  error.status = 504;
+  error.code = "budget_exhausted";
+  return error;
+}
 
-  for (let attempt = 1; attempt <= maxRetries; attempt++) {
+/**
+ * 可取消的退避等待：signal 取消时立即以 AbortError 结束
+ */
+function sleep(ms, signal) {
+  return new Promise((resolve, reject) => {
+    if (signal?.aborted) {
+      reject(abortError(signal));
+      return;
+    }
+    const onAbort = () => {
+      clearTimeout(timer);
+      reject(abortError(signal));
+    };
+    const timer = setTimeout(() => {
+      signal?.removeEventListener("abort", onAbort);
+      resolve();
+    }, ms);
+    signal?.addEventListener("abort", onAbort, { once: true });
+  });
+}
+
+/**
+ * 计入熔断失败率的状态：上游限流或服务端错误（其余 4xx 是请求本身的问题）
+ */
+function isUpstreamFailure(status) {
+  return status === 429 || status >= 500;
+}
+
+function isRetryableStatus(status, idempotent) {
+  if (status === 429) return true; // 上游明确拒绝处理，任何方法都可安全重试
+  if (!idempotent) return false;
+  return status === 408 || status >= 500;
+}
+
+function finishTrace(env, trace, outcome, startedAt) {
+  trace.outcome = outcome;
+  trace.elapsed_ms = Date.now() - startedAt;
+  recordMetric(env, "upstream_retry", {
+    api: trace.api,
+    attempts: trace.attempts.length,
+    total_wait_ms: trace.total_wait_ms,
+    elapsed_ms: trace.elapsed_ms,
+    outcome,
+  });
+  return trace;
+}
+
+/**
+ * 带重试预算的上游请求
+ * @param {string} url
+ * @param {RequestInit} options - 传给 fetch 的参数
+ * @param {string} apiName - 上游名称，用于日志、限流与按 API 覆盖配置
+ * @param {Object} env
+ * @param {Object} [policy]
+ * @param {number} [policy.maxAttempts] - 最大尝试次数（默认 RETRY_MAX_ATTEMPTS 或 8）
+ * @param {number} [policy.initialDelayMs] - 退避基数（默认 RETRY_INITIAL_DELAY_MS 或 1500）
+ * @param {number} [policy.budgetMs] - 总耗时预算（默认按 apiName）：超出后不再重试，
+ *   进行中的尝试到期仍未返回响应头则取消并以 504（code = "budget_exhausted"）失败
+ * @param {boolean} [policy.idempotent] - 是否可在 5xx/网络错误后重试，默认按 HTTP 方法判断
+ * @param {string} [policy.circuitScope] - 熔断范围（端点）：多端点路由时每个端点单独熔断
+ * @param {AbortSignal} [policy.signal] - 取消信号，同时作用于上游请求与退避等待
+ * @param {Function} [policy.onEvent] - 进度回调：attempt / response / backoff 事件
+ * @param {Function} [policy.send] - 单次尝试的发送函数 (url, init) => Promise<Response>，默认 fetch；
+ *   对冲请求在这里替换，只对冲单次尝试，不重复占用重试预算与限流名额
+ * @returns {Promise<Response>} 成功的 Response，可通过 getRetryTrace 读取重试轨迹
+ */
+export async function fetchWithRetry(url, options, apiName, env, policy = {}) {
+  const maxAttempts =
+    policy.maxAttempts ??
+    readEnvInt(env, ["RETRY_MAX_ATTEMPTS", "FETCH_RETRY_MAX"], DEFAULT_MAX_ATTEMPTS);
+  const initialDelay =
+    policy.initialDelayMs ??
+    readEnvInt(
+      env,
+      ["RETRY_INITIAL_DELAY_MS", "FETCH_RETRY_INITIAL_DELAY_MS"],
+      DEFAULT_INITIAL_DELAY_MS
+    );
+  const budgetMs = policy.budgetMs ?? resolveRetryBudgetMs(env, apiName);
+  const method = String(options?.method || "GET").toUpperCase();
+  const idempotent = policy.idempotent ?? IDEMPOTENT_METHODS.has(method);
+  const signal = combineSignals(options?.signal, policy.signal);
+  const send = policy.send || ((target, init) => fetch(target, init));
+  const emit = (event) => {
+    if (typeof policy.onEvent !== "function") return;
     try {
-      const response = await fetch(url, options);
-      if (response.ok) {
-        logInfo(env, `[Worker Log] 成功从 ${apiName} 获取响应 (尝试 ${attempt}/${maxRetries}).`);
-        return response;
-      }
+      policy.onEvent({ api: apiName, ...event });
+    } catch (_) {}
+  };
+
+  const startedAt = Date.now();
+  const deadline = startedAt + budgetMs;
+  const trace = { api: apiName, attempts: [], total_wait_ms: 0 };
+  let lastError;
+  // 熔断器按逻辑调用计数：整个重试循环只占一个许可，结束时按最后一次到达上游的结果记录一次，
+  // 避免一次被重试的调用在窗口内被算成多次失败
+  let circuitPermit = null;
+  let circuitOutcome = null;
+
+  try {
+    for (let attempt = 1; attempt <= Math.max(1, maxAttempts); attempt++) {
+      const entry = { attempt, started_ms: Date.now() - startedAt };
+      trace.attempts.push(entry);
+      let waitMs = null;
+      emit({ type: "attempt", attempt, max_attempts: maxAttempts });
 
-      if (response.status === 429 && attempt < maxRetries) {
-        const jitter = Math.floor(Math.random() * 1000);
-        const delay = initialDelay * Math.pow(2, attempt - 1) + jitter;
-        const errorContent = await response.text().catch(() => "无法读取错误内容");
+      try {
+        // 每次尝试前先过熔断器与限流器：熔断中或排不上队都直接抛出 503（不再重试）
+        circuitPermit = await checkCircuit(apiName, env, circuitPermit, policy.circuitScope);
+        const release = await acquireUpstreamSlot(apiName, env, { deadline, signal });
+        // 单次尝试同样受预算约束：到期仍未收到响应头就取消；收到响应头后清除计时，不影响读取响应体
+        const attemptTimeout = new AbortController();
+        const timer = setTimeout(
+          () => attemptTimeout.abort(budgetExhaustedError(apiName, budgetMs)),
+          Math.max(0, deadline - Date.now())
+        );
+        let response;
+        try {
+          response = await send(url, {
+            ...options,
+            signal: combineSignals(signal, attemptTimeout.signal),
+          });
+        } catch (error) {
+          throw attemptTimeout.signal.aborted && !signal?.aborted
+            ? attemptTimeout.signal.reason
+            : error;
+        } finally {
+          clearTimeout(timer);
+          release();
+        }
+        circuitOutcome = !isUpstreamFailure(response.status);
+        entry.status = response.status;
+        emit({
+          type: "response",
+          attempt,
+          status: response.status,
+          elapsed_ms: Date.now() - startedAt,
+        });
+
+        if (response.ok) {
+          logInfo(env, `[Worker Log] 成功从 ${apiName} 获取响应 (尝试 ${attempt}/${maxAttempts}).`);
+          retryTraces.set(response, finishTrace(env, trace, "success", startedAt));
+          return response;
+        }
+
+        const errorContent = await response
+          .text()
+          .catch(() => `Status ${response.status} with no readable body`);
+        const err = new Error(`${apiName}调用失败 (HTTP ${response.status}): ${errorContent}`);
+        err.status = response.status;
+        const hintedWait = parseRetryAfterMs(response.headers);
+        if (hintedWait !== null) {
+          err.retryAfter = Math.max(1, Math.ceil(hintedWait / 1000));
+        }
+        lastError = err;
+
+        if (!isRetryableStatus(response.status, idempotent)) {
+          entry.cause = `http_${response.status}`;
+          throw err;
+        }
+        entry.cause = `http_${response.status}`;
+        waitMs = hintedWait ?? fullJitterDelay(initialDelay, attempt);
         logInfo(
           env,
-          `[Worker Warning] ${apiName} 返回 429 (Too Many Requests). 尝试 #${attempt} of ${maxRetries}. 在 ${delay}ms 后重试... 错误: ${errorContent}`
+          `[Worker Warning] ${apiName} 返回 ${response.status}. 尝试 #${attempt} of ${maxAttempts}. 错误: ${errorContent}`
+        );
+      } catch (error) {
+        // 已按响应记录过的 HTTP 错误不重复记录；熔断拒绝、本地排队失败或调用方取消与上游健康无关，
+        // 都保留上一次尝试的结果
+        const unrelated =
+          error === lastError ||
+          error.code === "circuit_open" ||
+          error.code === "upstream_saturated" ||
+          signal?.aborted;
+        if (!unrelated) circuitOutcome = false;
+        if (error.code === "budget_exhausted") {
+          entry.cause = "budget_exhausted";
+          logInfo(env, `[Worker Warning] ${apiName} 单次请求超出重试预算 ${budgetMs}ms，不再重试。`);
+        }
+        if (
+          error.code === "circuit_open" ||
+          error.code === "upstream_saturated" ||
+          error.code === "budget_exhausted" ||
+          error === lastError
+        ) {
+          error.retryTrace = finishTrace(env, trace, error.code || entry.cause, startedAt);
+          throw error;
+        }
+        // 调用方已取消（客户端断开、对冲请求的落败方等），不再重试
+        if (signal?.aborted) {
+          entry.cause = "aborted";
+          error.retryTrace = finishTrace(env, trace, "aborted", startedAt);
+          throw error;
+        }
+        // fetch 本身抛错（网络错误等）：无法确认上游是否已处理，仅幂等请求重试
+        console.error(
+          `[Worker Error] 调用 ${apiName} 时发生错误 (尝试 #${attempt}/${maxAttempts}): ${error.message}`
         );
-        await new Promise((resolve) => setTimeout(resolve, delay));
-        continue;
+        entry.cause = "network_error";
+        lastError = error;
+        if (!idempotent) {
+          error.retryTrace = finishTrace(env, trace, "network_error", startedAt);
+          throw error;
+        }
+        waitMs = fullJitterDelay(initialDelay, attempt);
       }
 
-      const errorContent = await response
-        .text()
-        .catch(() => `Status ${response.status} with no readable body`);
-      const err = new Error(`${apiName}调用失败 (HTTP ${response.status}): ${errorContent}`);
-      err.status = response.status;
-      throw err;
-    } catch (error) {
-      console.error(
-        `[Worker Error] 调用 ${apiName} 时发生错误 (尝试 #${attempt}/${maxRetries}): ${error.message}`
-      );
-
-      if (attempt < maxRetries) {
-        const jitter = Math.floor(Math.random() * 1000);
-        const delay = initialDelay * Math.pow(2, attempt - 1) + jitter;
-        logInfo(env, `[Worker Warning] 请求失败，将在 ${delay}ms 后重试...`);
-        await new Promise((resolve) => setTimeout(resolve, delay));
-      } else {
-        console.error(`[Worker Error] 所有 ${maxRetries} 次尝试均失败。`);
+      if (attempt >= maxAttempts) {
+        break;
+      }
+      if (Date.now() + waitMs >= deadline) {
+        logInfo(env, `[Worker Warning] ${apiName} 重试预算 ${budgetMs}ms 将被超出，停止重试。`);
+        entry.cause = `${entry.cause}_budget_exhausted`;
+        break;
+      }
+
+      entry.wait_ms = waitMs;
+      trace.total_wait_ms += waitMs;
+      logInfo(env, `[Worker Warning] 将在 ${waitMs}ms 后重试 ${apiName}...`);
+      emit({ type: "backoff", attempt, wait_ms: waitMs, cause: entry.cause });
+      try {
+        await sleep(waitMs, signal);
+      } catch (error) {
+        entry.cause = "aborted";
+        error.retryTrace = finishTrace(env, trace, "aborted", startedAt);
         throw error;
       }
     }
-  }
 
-  throw new Error(`${apiName} 在 ${maxRetries} 次重试后仍然失败。`);
+    console.error(`[Worker Error] ${apiName} 在 ${trace.attempts.length} 次尝试后仍然失败。`);
+    const finalError = lastError || new Error(`${apiName} 在 ${maxAttempts} 次重试后仍然失败。`);
+    finalError.retryTrace = finishTrace(
+      env,
+      trace,
+      trace.attempts[trace.attempts.length - 1]?.cause || "exhausted",
+      startedAt
+    );
+    throw finalError;
+  } finally {
+    if (circuitPermit) {
+      await recordCircuitResult(apiName, env, circuitOutcome, circuitPermit);
+    }
+  }
 }
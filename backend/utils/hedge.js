@@ -0,0 +1,205 @@
+/**
+ * 对冲请求（hedged requests）：首个请求在指定分位延迟内仍未拿到响应头时，
+ * 再并行发起一个相同请求，先拿到成功响应（2xx）者胜出，另一个通过 AbortController 取消；
+ * 先返回的 429/5xx 等失败响应不算胜出，继续等待另一个，两者都失败时才返回失败结果。
+ * 对冲次数受 HEDGE_MAX_RATE 限制（窗口内最多 floor(请求数 × 比例) + 1 次），避免把上游负载翻倍，
+ * 同时低流量的 isolate 也有一次对冲名额。
+ * 对冲作用于 fetchWithRetry 的单次尝试：分位延迟只统计单次尝试的响应头耗时（不含重试与退避），
+ * 两个请求共用同一次尝试的限流名额与重试预算。
+ */
+import { combineSignals, fetchWithRetry } from "./fetch.js";
+import { recordMetric } from "./metrics.js";
+import { readApiNumber } from "./upstream_config.js";
+
+const SAMPLE_SIZE = 200;
+const RATE_WINDOW_MS = 60000;
+const DEFAULT_PERCENTILE = 0.95;
+const DEFAULT_FALLBACK_DELAY_MS = 10000;
+const DEFAULT_MIN_DELAY_MS = 1000;
+const DEFAULT_MIN_SAMPLES = 20;
+const DEFAULT_MAX_RATE = 0.05;
+
+const hedgeStates = new Map();
+
+function getState(key) {
+  let state = hedgeStates.get(key);
+  if (!state) {
+    state = {
+      samples: [],
+      windowStart: Date.now(),
+      windowRequests: 0,
+      windowHedges: 0,
+      counters: { requests: 0, triggered: 0, capped: 0, primaryWins: 0, hedgeWins: 0 },
+    };
+    hedgeStates.set(key, state);
+  }
+  return state;
+}
+
+export function hedgingEnabled(env) {
+  return String(env?.HEDGE_ENABLED || "false").toLowerCase() === "true";
+}
+
+function recordLatency(state, ms) {
+  state.samples.push(ms);
+  if (state.samples.length > SAMPLE_SIZE) {
+    state.samples.shift();
+  }
+}
+
+function percentile(values, p) {
+  const sorted = [...values].sort((a, b) => a - b);
+  const index = Math.min(sorted.length - 1, Math.max(0, Math.ceil(p * sorted.length) - 1));
+  return sorted[index];
+}
+
+/**
+ * 计算对冲触发延迟：样本足够时取响应头延迟的分位数，否则使用固定回退值
+ */
+export function resolveHedgeDelayMs(env, key) {
+  const state = getState(key);
+  const minSamples = readApiNumber(env, key, "HEDGE_MIN_SAMPLES", DEFAULT_MIN_SAMPLES, { min: 1 });
+  const minDelay = readApiNumber(env, key, "HEDGE_MIN_DELAY_MS", DEFAULT_MIN_DELAY_MS, { min: 0 });
+  if (state.samples.length < minSamples) {
+    return readApiNumber(env, key, "HEDGE_DELAY_MS", DEFAULT_FALLBACK_DELAY_MS, { min: 0 });
+  }
+  const p = readApiNumber(env, key, "HEDGE_PERCENTILE", DEFAULT_PERCENTILE, { min: 0.5, max: 1 });
+  return Math.max(minDelay, percentile(state.samples, p));
+}
+
+function rollWindow(state) {
+  const now = Date.now();
+  if (now - state.windowStart > RATE_WINDOW_MS) {
+    state.windowStart = now;
+    state.windowRequests = 0;
+    state.windowHedges = 0;
+  }
+}
+
+/**
+ * 令牌式配额：窗口内可对冲 floor(请求数 × HEDGE_MAX_RATE) + 1 次；比例为 0 时不对冲
+ */
+function hedgeAllowed(env, key, state) {
+  const maxRate = readApiNumber(env, key, "HEDGE_MAX_RATE", DEFAULT_MAX_RATE, { min: 0, max: 1 });
+  return maxRate > 0 && state.windowHedges < Math.floor(state.windowRequests * maxRate) + 1;
+}
+
+function discard(promise, controller) {
+  controller.abort();
+  promise.then((response) => response?.body?.cancel().catch(() => {})).catch(() => {});
+}
+
+function settle(promise, winner) {
+  return promise.then(
+    (response) => ({ response, winner }),
+    (error) => ({ error, winner })
+  );
+}
+
+function cancelBody(outcome) {
+  outcome.response?.body?.cancel().catch(() => {});
+}
+
+/**
+ * 以对冲方式执行请求
+ * @param {Object} env
+ * @param {string} key - 统计维度，通常为 apiName
+ * @param {Function} attempt - (signal) => Promise<Response>，必须响应 signal 取消
+ * @returns {Promise<Response>}
+ */
+export async function hedgedFetch(env, key, attempt) {
+  if (!hedgingEnabled(env)) {
+    return attempt(undefined);
+  }
+
+  const state = getState(key);
+  rollWindow(state);
+  state.windowRequests += 1;
+  state.counters.requests += 1;
+
+  const startedAt = Date.now();
+  const primaryController = new AbortController();
+  const primary = attempt(primaryController.signal).then((response) => {
+    recordLatency(state, Date.now() - startedAt);
+    return response;
+  });
+
+  const delayMs = resolveHedgeDelayMs(env, key);
+  let timer;
+  const trigger = new Promise((resolve) => {
+    timer = setTimeout(() => resolve("hedge"), delayMs);
+  });
+  const first = await Promise.race([primary.then(() => "primary", () => "primary"), trigger]);
+  if (first === "primary") {
+    clearTimeout(timer);
+    return primary;
+  }
+
+  if (!hedgeAllowed(env, key, state)) {
+    state.counters.capped += 1;
+    recordMetric(env, "upstream_hedge", { api: key, event: "capped", delay_ms: delayMs });
+    return primary;
+  }
+
+  state.windowHedges += 1;
+  state.counters.triggered += 1;
+  recordMetric(env, "upstream_hedge", { api: key, event: "triggered", delay_ms: delayMs });
+
+  const hedgeController = new AbortController();
+  const hedge = attempt(hedgeController.signal);
+  const outcomes = { primary: settle(primary, "primary"), hedge: settle(hedge, "hedge") };
+
+  let result = await Promise.race([outcomes.primary, outcomes.hedge]);
+  if (result.response?.ok) {
+    if (result.winner === "primary") discard(hedge, hedgeController);
+    else discard(primary, primaryController);
+  } else {
+    // 先到的是失败响应或异常：不算胜出，等待另一个；两者都失败时优先返回响应而不是异常
+    const other = await outcomes[result.winner === "primary" ? "hedge" : "primary"];
+    if (other.response?.ok || (result.error && other.response)) {
+      cancelBody(result);
+      result = other;
+    } else {
+      cancelBody(other);
+    }
+  }
+  if (result.error) {
+    throw result.error;
+  }
+
+  if (result.winner === "primary") {
+    state.counters.primaryWins += 1;
+  } else {
+    state.counters.hedgeWins += 1;
+  }
+  recordMetric(env, "upstream_hedge", {
+    api: key,
+    event: "win",
+    winner: result.winner,
+    elapsed_ms: Date.now() - startedAt,
+  });
+  return result.response;
+}
+
+/**
+ * fetchWithRetry 的对冲版本：policy.hedge 为 true 且 HEDGE_ENABLED 时对每次尝试启用对冲，
+ * 否则等同 fetchWithRetry
+ */
+export function fetchWithHedging(url, init, apiName, env, policy = {}) {
+  if (!policy.hedge || !hedgingEnabled(env)) {
+    return fetchWithRetry(url, init, apiName, env, policy);
+  }
+  const send = (target, attemptInit) =>
+    hedgedFetch(env, apiName, (signal) =>
+      fetch(target, { ...attemptInit, signal: combineSignals(attemptInit.signal, signal) })
+    );
+  return fetchWithRetry(url, init, apiName, env, { ...policy, send });
+}
+
+export function getHedgeStats() {
+  const stats = {};
+  for (const [key, state] of hedgeStates) {
+    stats[key] = { ...state.counters, samples: state.samples.length };
+  }
+  return stats;
+}
@@ -0,0 +1,92 @@
+/**
+ * isolate 内的 LRU 缓存：按条目数与字节预算淘汰最久未使用的条目，并支持 TTL
+ * 仅在单个 isolate 内有效，适合作为 KV / Cache API 之前的热点层
+ */
+export class LruCache {
+  /**
+   * @param {Object} [options]
+   * @param {number} [options.maxEntries] - 最大条目数
+   * @param {number} [options.maxBytes] - 字节预算，配合 sizeOf 使用
+   * @param {number} [options.ttlMs] - 默认过期时间，0 表示不过期
+   * @param {(value: any) => number} [options.sizeOf] - 计算条目大小
+   */
+  constructor({ maxEntries = Infinity, maxBytes = Infinity, ttlMs = 0, sizeOf } = {}) {
+    this.maxEntries = maxEntries;
+    this.maxBytes = maxBytes;
+    this.ttlMs = ttlMs;
+    this.sizeOf = sizeOf || (() => 0);
+    this.entries = new Map();
+    this.bytes = 0;
+    this.stats = { hits: 0, misses: 0, evictions: 0 };
+  }
+
+  get size() {
+    return this.entries.size;
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) {
+      this.stats.misses += 1;
+      return undefined;
+    }
+    if (entry.expiresAt && entry.expiresAt <= Date.now()) {
+      this.delete(key);
+      this.stats.misses += 1;
+      return undefined;
+    }
+    // Map 保持插入顺序：删除后重新插入即移动到最近使用端
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.stats.hits += 1;
+    return entry.value;
+  }
+
+  has(key) {
+    const entry = this.entries.get(key);
+    return Boolean(entry) && !(entry.expiresAt && entry.expiresAt <= Date.now());
+  }
+
+  /**
+   * 写入条目；单个条目超过字节预算时不缓存
+   * @param {string} key
+   * @param {any} value
+   * @param {Object} [options]
+   * @param {number} [options.ttlMs] - 覆盖默认 TTL
+   * @returns {boolean} 是否写入
+   */
+  set(key, value, { ttlMs = this.ttlMs } = {}) {
+    const size = this.sizeOf(value);
+    this.delete(key);
+    if (size > this.maxBytes) {
+      return false;
+    }
+    this.entries.set(key, { value, size, expiresAt: ttlMs > 0 ? Date.now() + ttlMs : 0 });
+    this.bytes += size;
+    this.evict();
+    return true;
+  }
+
+  delete(key) {
+    const entry = this.entries.get(key);
+    if (!entry) return false;
+    this.entries.delete(key);
+    this.bytes -= entry.size;
+    return true;
+  }
+
+  clear() {
+    this.entries.clear();
+    this.bytes = 0;
+  }
+
+  evict() {
+    for (const [key] of this.entries) {
+      if (this.entries.size <= this.maxEntries && this.bytes <= this.maxBytes) {
+        break;
+      }
+      this.delete(key);
+      this.stats.evictions += 1;
+    }
+  }
+}
@@ -9,9 +9,12 @@ import { logWarn, logError } from "./logger.js";
  * 检查请求频率与今日额度
  * @param {Request} request
  * @param {Object} env
+ * @param {Object} [options]
+ * @param {number} [options.cost=1] - 本次请求消耗的额度（批量请求一次性扣除全部条目）
  * @returns {Promise<Object>} { allowed: boolean, error?: string, status?: number, headers?: Object, retryAfter?: number, remaining?: number, total?: number }
  */
-export async function checkRateLimitAndQuota(request, env) {
+export async function checkRateLimitAndQuota(request, env, options = {}) {
+  const cost = Math.max(1, parseInt(options.cost, 10) || 1);
   try {
     // 1. 尝试获取登录态
     const user = await authenticateUser(request, env);
@@ -73,23 +76,25 @@ export async function checkRateLimitAndQuota(request, env) {
     // ---- 检查日额度 ----
     const usageState = usageStateData || { used: 0, day: dateStr };
 
-    if (usageState.used >= quotaMax) {
+    // 批量请求要么全部扣除，要么整体拒绝，避免只生成一部分
+    if (usageState.used + cost > quotaMax) {
       logWarn(env, `[RateLimit] 每日额度耗尽: ${scope}=${identifier}`, {
         used: usageState.used,
+        cost,
         total: quotaMax,
       });
       return {
         allowed: false,
         status: 402,
-        error: "今日额度已用完",
-        remaining: 0,
+        error: cost > 1 ? "今日剩余额度不足以完成本次批量请求" : "今日额度已用完",
+        remaining: Math.max(0, quotaMax - usageState.used),
         total: quotaMax,
       };
     }
 
     // ---- 更新状态并在后台保存 (乐观执行以减少响应延迟) ----
     rlState.count += 1;
-    usageState.used += 1;
+    usageState.used += cost;
 
     // KV 写入：频率键 60s 过期，额度键 24小时(86400秒)过期
     // 因为路由可能没有透传 ctx，为了确保写入，使用 await 阻塞保存
@@ -19,7 +19,12 @@ export function addCorsHeaders(responseHeaders, env, request) {
 }
 
 export function addSecurityHeaders(responseHeaders, env) {
-  responseHeaders.set("Vary", "Origin");
+  // 保留路由自身声明的 Vary（如按 Accept 协商的图片格式）
+  const vary = responseHeaders.get("Vary");
+  responseHeaders.set(
+    "Vary",
+    vary && !/\borigin\b/i.test(vary) ? `${vary}, Origin` : vary || "Origin"
+  );
   responseHeaders.set("X-Content-Type-Options", "nosniff");
   responseHeaders.set("Referrer-Policy", "no-referrer-when-downgrade");
   responseHeaders.set(
@@ -52,6 +57,98 @@ export function jsonResponse(body, env, status = 200, additionalHeaders = {}, re
   return new Response(payload, { status, headers });
 }
 
+/**
+ * 上游调用失败时的统一 JSON 响应：
+ * 限流器 503 或上游 429（带 Retry-After 提示）统一返回 503 + Retry-After，其余错误按 500 处理
+ */
+export function upstreamErrorResponse(error, env, message, request) {
+  if (error?.retryAfter && (error.status === 503 || error.status === 429)) {
+    return jsonResponse(
+      { error: message, retry_after: error.retryAfter },
+      env,
+      503,
+      { "Retry-After": String(error.retryAfter) },
+      request
+    );
+  }
+  return jsonResponse({ error: message }, env, 500, {}, request);
+}
+
+/**
+ * 二进制/流式响应：body 可以是 ReadableStream 或 ArrayBuffer，原样透传给客户端
+ * contentLength 仅在已知时设置（例如上游返回了 Content-Length）
+ */
+export function binaryResponse(body, env, options = {}, request) {
+  const { status = 200, contentType, contentLength, headers: extraHeaders = {} } = options;
+  const headers = new Headers(extraHeaders);
+  headers.set("Content-Type", contentType || "application/octet-stream");
+  if (contentLength !== undefined && contentLength !== null && contentLength !== "") {
+    headers.set("Content-Length", String(contentLength));
+  }
+  addCorsHeaders(headers, env, request);
+  addSecurityHeaders(headers, env);
+  return new Response(body, { status, headers });
+}
+
+/**
+ * 解析单段 Range 请求头（bytes=start-end / bytes=start- / bytes=-suffix）
+ * 未携带或无法识别（含多段）时返回 null，按完整内容响应；范围无法满足时返回 { unsatisfiable: true }
+ */
+export function parseByteRange(header, size) {
+  const match = /^bytes=(\d*)-(\d*)$/.exec(String(header || "").trim());
+  if (!match || (match[1] === "" && match[2] === "")) {
+    return null;
+  }
+  let start;
+  let end;
+  if (match[1] === "") {
+    const suffix = parseInt(match[2], 10);
+    if (suffix === 0) return { unsatisfiable: true };
+    start = Math.max(0, size - suffix);
+    end = size - 1;
+  } else {
+    start = parseInt(match[1], 10);
+    end = match[2] === "" ? size - 1 : Math.min(parseInt(match[2], 10), size - 1);
+  }
+  if (start >= size || start > end) {
+    return { unsatisfiable: true };
+  }
+  return { start, end };
+}
+
+/**
+ * 支持 Range 的二进制响应：bytes 为完整内容（ArrayBuffer），按请求头返回 200 / 206 / 416
+ */
+export function rangeResponse(bytes, env, options = {}, request) {
+  const { contentType, headers: extraHeaders = {} } = options;
+  const size = bytes.byteLength;
+  const range = parseByteRange(request?.headers?.get("Range"), size);
+  const headers = { "Accept-Ranges": "bytes", ...extraHeaders };
+
+  if (range?.unsatisfiable) {
+    return binaryResponse(
+      null,
+      env,
+      { status: 416, contentType, headers: { ...headers, "Content-Range": `bytes */${size}` } },
+      request
+    );
+  }
+  if (range) {
+    return binaryResponse(
+      bytes.slice(range.start, range.end + 1),
+      env,
+      {
+        status: 206,
+        contentType,
+        contentLength: range.end - range.start + 1,
+        headers: { ...headers, "Content-Range": `bytes ${range.start}-${range.end}/${size}` },
+      },
+      request
+    );
+  }
+  return binaryResponse(bytes, env, { contentType, contentLength: size, headers }, request);
+}
+
 export function makeCorsResponse(request, env) {
   logInfo(env, "[Worker Log] makeCorsResponse called.");
   const allowOrigin = computeAllowedOrigin(request, env);
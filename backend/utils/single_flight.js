@@ -0,0 +1,173 @@
+/**
+ * 单飞（single-flight）合并：同一 isolate 内相同键的并发请求只发起一次上游调用
+ * 其余调用方等待同一个 Promise，并各自拿到一份独立的字节副本
+ * 共享调用有自己的 AbortController：只有全部参与者都取消后才会真正取消上游，
+ * 进度事件会广播给所有仍在等待的参与者。
+ */
+
+const inflight = new Map();
+
+function abortError(signal) {
+  if (signal?.reason instanceof Error) return signal.reason;
+  const error = new Error("请求已取消");
+  error.name = "AbortError";
+  return error;
+}
+
+/**
+ * 参与者加入共享调用；未提供 signal 的参与者不会放弃，因此会一直保持上游调用
+ */
+function join(key, entry, signal, onEvent) {
+  entry.participants += 1;
+  if (typeof onEvent === "function") entry.listeners.add(onEvent);
+  if (!signal) return;
+  const abandon = () => {
+    entry.listeners.delete(onEvent);
+    entry.abandoned += 1;
+    if (entry.abandoned >= entry.participants) {
+      // 没有人再等待结果：取消上游，并让后来的同键请求重新发起
+      if (inflight.get(key) === entry) inflight.delete(key);
+      entry.controller.abort(abortError(signal));
+    }
+  };
+  if (signal.aborted) {
+    abandon();
+  } else {
+    signal.addEventListener("abort", abandon, { once: true });
+  }
+}
+
+/**
+ * 等待 promise，但在 signal 取消时立即以 AbortError 结束（不影响 promise 本身）
+ */
+function untilAborted(promise, signal) {
+  if (!signal) return promise;
+  if (signal.aborted) return Promise.reject(abortError(signal));
+  return new Promise((resolve, reject) => {
+    const onAbort = () => reject(abortError(signal));
+    signal.addEventListener("abort", onAbort, { once: true });
+    promise.then(resolve, reject).finally(() => signal.removeEventListener("abort", onAbort));
+  });
+}
+
+/**
+ * 以 key 合并并发调用
+ * @param {string} key - 规范化后的请求键
+ * @param {Function} fn - 真正执行上游调用的函数，接收 { signal, emit, waiting, detach }：
+ *   waiting() 为仍在等待结果的参与者数；detach() 让后来的同键请求不再加入本次调用
+ * @param {Object} [options]
+ * @param {AbortSignal} [options.signal] - 本参与者的取消信号
+ * @param {Function} [options.onEvent] - 接收 fn 通过 emit 发出的进度事件
+ * @returns {{promise: Promise<any>, leader: boolean}} leader 为 true 表示本次调用实际发起了请求
+ */
+export function singleFlight(key, fn, { signal, onEvent } = {}) {
+  let entry = inflight.get(key);
+  const leader = !entry;
+  if (!entry) {
+    const created = {
+      controller: new AbortController(),
+      listeners: new Set(),
+      participants: 0,
+      abandoned: 0,
+    };
+    const emit = (event) => {
+      for (const listener of created.listeners) {
+        try {
+          listener(event);
+        } catch (_) {}
+      }
+    };
+    const waiting = () => created.participants - created.abandoned;
+    const detach = () => {
+      if (inflight.get(key) === created) {
+        inflight.delete(key);
+      }
+    };
+    created.promise = Promise.resolve()
+      .then(() => fn({ signal: created.controller.signal, emit, waiting, detach }))
+      .finally(() => {
+        if (inflight.get(key) === created) {
+          inflight.delete(key);
+        }
+      });
+    inflight.set(key, created);
+    entry = created;
+  }
+  join(key, entry, signal, onEvent);
+  return { promise: entry.promise, leader };
+}
+
+/**
+ * 合并返回 ArrayBuffer 的调用；跟随者拿到 slice 出来的副本
+ */
+export async function singleFlightBytes(key, fn, options = {}) {
+  const { promise, leader } = singleFlight(key, fn, options);
+  const bytes = await untilAborted(promise, options.signal);
+  return { bytes: leader ? bytes : bytes.slice(0), leader };
+}
+
+/**
+ * 合并返回 Response 的调用，同时保留领头请求的流式 body：
+ * 响应头到达时若已有跟随者，领头请求 tee 出一路直接返回，另一路读完后供跟随者构造各自的 Response；
+ * 没有跟随者时直接返回上游 body，不做缓冲，并从合并表中移除，之后的同键请求重新发起
+ * @param {string} key
+ * @param {Function} produce - 接收 { signal, emit }，返回上游 Response
+ * @param {Object} [options] - 同 singleFlight 的 { signal, onEvent }
+ * @returns {Promise<{response: Response, leader: boolean}>}
+ */
+export async function singleFlightResponse(key, produce, options = {}) {
+  let resolveLeader;
+  let rejectLeader;
+  const leaderReady = new Promise((resolve, reject) => {
+    resolveLeader = resolve;
+    rejectLeader = reject;
+  });
+
+  const { promise, leader } = singleFlight(
+    key,
+    async (flight) => {
+      let upstream;
+      try {
+        upstream = await produce(flight);
+      } catch (error) {
+        rejectLeader(error);
+        throw error;
+      }
+      if (!upstream.body) {
+        resolveLeader(upstream);
+        return { bytes: new ArrayBuffer(0), status: upstream.status, headers: upstream.headers };
+      }
+      if (flight.waiting() <= 1) {
+        flight.detach();
+        resolveLeader(upstream);
+        return null;
+      }
+      const [clientBranch, sharedBranch] = upstream.body.tee();
+      resolveLeader(
+        new Response(clientBranch, { status: upstream.status, headers: upstream.headers })
+      );
+      const bytes = await new Response(sharedBranch).arrayBuffer();
+      return { bytes, status: upstream.status, headers: upstream.headers };
+    },
+    options
+  );
+
+  if (leader) {
+    // 领头请求在上游响应头到达后即可返回，不必等共享分支读完
+    promise.catch(() => {});
+    return { response: await untilAborted(leaderReady, options.signal), leader: true };
+  }
+
+  const shared = await untilAborted(promise, options.signal);
+  return {
+    response: new Response(shared.bytes.slice(0), {
+      status: shared.status,
+      headers: shared.headers,
+    }),
+    leader: false,
+  };
+}
+
+export function getInflightCount() {
+  return inflight.size;
+}
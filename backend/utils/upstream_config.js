@@ -0,0 +1,26 @@
+/**
+ * 按上游 apiName 读取可覆盖的数值配置
+ * 例如 apiName = "Pollinations Image API"、baseName = "UPSTREAM_MAX_INFLIGHT"：
+ * 先读 UPSTREAM_MAX_INFLIGHT_POLLINATIONS_IMAGE_API，再读 UPSTREAM_MAX_INFLIGHT，最后用默认值
+ */
+
+export function apiEnvKey(apiName) {
+  return String(apiName || "")
+    .toUpperCase()
+    .replace(/[^A-Z0-9]+/g, "_")
+    .replace(/^_+|_+$/g, "");
+}
+
+export function readApiNumber(env, apiName, baseName, fallback, { min, max } = {}) {
+  const candidates = [`${baseName}_${apiEnvKey(apiName)}`, baseName];
+  for (const key of candidates) {
+    const raw = env?.[key];
+    if (raw === undefined || raw === null || String(raw).trim() === "") continue;
+    const value = parseFloat(raw);
+    if (Number.isNaN(value)) continue;
+    if (min !== undefined && value < min) continue;
+    if (max !== undefined && value > max) continue;
+    return value;
+  }
+  return fallback;
+}
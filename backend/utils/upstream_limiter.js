@@ -0,0 +1,201 @@
+/**
+ * 上游并发/速率限制器（isolate 内，按 apiName 分桶）
+ * 令牌桶控制请求速率，maxInFlight 控制同时在途数；拿不到许可的请求进入有界等待队列，
+ * 预计等待超过调用方预算或队列已满时立即以 503 + Retry-After 失败，而不是等上游 429 后再退避。
+ */
+import { recordMetric } from "./metrics.js";
+import { readApiNumber } from "./upstream_config.js";
+
+const DEFAULT_RATE_PER_SEC = 2;
+const DEFAULT_BURST = 4;
+const DEFAULT_MAX_INFLIGHT = 4;
+const DEFAULT_QUEUE_MAX = 16;
+const DEFAULT_QUEUE_TIMEOUT_MS = 10000;
+
+const buckets = new Map();
+
+function resolveLimiterConfig(env, apiName) {
+  return {
+    ratePerSec: readApiNumber(env, apiName, "UPSTREAM_RATE_PER_SEC", DEFAULT_RATE_PER_SEC, {
+      min: 0.01,
+    }),
+    burst: readApiNumber(env, apiName, "UPSTREAM_BURST", DEFAULT_BURST, { min: 1 }),
+    maxInFlight: readApiNumber(env, apiName, "UPSTREAM_MAX_INFLIGHT", DEFAULT_MAX_INFLIGHT, {
+      min: 1,
+    }),
+    queueMax: readApiNumber(env, apiName, "UPSTREAM_QUEUE_MAX", DEFAULT_QUEUE_MAX, { min: 0 }),
+    queueTimeoutMs: readApiNumber(
+      env,
+      apiName,
+      "UPSTREAM_QUEUE_TIMEOUT_MS",
+      DEFAULT_QUEUE_TIMEOUT_MS,
+      { min: 0 }
+    ),
+  };
+}
+
+function limiterEnabled(env) {
+  return String(env?.UPSTREAM_LIMITER_ENABLED || "true").toLowerCase() !== "false";
+}
+
+function getBucket(apiName, config) {
+  let bucket = buckets.get(apiName);
+  if (!bucket) {
+    bucket = {
+      tokens: config.burst,
+      lastRefill: Date.now(),
+      inFlight: 0,
+      queue: [],
+      timer: null,
+      config,
+    };
+    buckets.set(apiName, bucket);
+  }
+  bucket.config = config;
+  return bucket;
+}
+
+function refill(bucket) {
+  const now = Date.now();
+  const elapsed = (now - bucket.lastRefill) / 1000;
+  bucket.tokens = Math.min(bucket.config.burst, bucket.tokens + elapsed * bucket.config.ratePerSec);
+  bucket.lastRefill = now;
+}
+
+function canProceed(bucket) {
+  return bucket.tokens >= 1 && bucket.inFlight < bucket.config.maxInFlight;
+}
+
+function grant(bucket) {
+  bucket.tokens -= 1;
+  bucket.inFlight += 1;
+  let released = false;
+  return () => {
+    if (released) return;
+    released = true;
+    bucket.inFlight -= 1;
+    pump(bucket);
+  };
+}
+
+function pump(bucket) {
+  refill(bucket);
+  while (bucket.queue.length && canProceed(bucket)) {
+    const waiter = bucket.queue.shift();
+    clearTimeout(waiter.timer);
+    waiter.resolve(grant(bucket));
+  }
+  // 队列仍有等待者且只缺令牌时，按补充速率定时唤醒；缺并发槽位时由 release 唤醒
+  if (
+    bucket.queue.length &&
+    bucket.inFlight < bucket.config.maxInFlight &&
+    bucket.tokens < 1 &&
+    !bucket.timer
+  ) {
+    const waitMs = Math.ceil(((1 - bucket.tokens) / bucket.config.ratePerSec) * 1000);
+    bucket.timer = setTimeout(() => {
+      bucket.timer = null;
+      pump(bucket);
+    }, waitMs);
+  }
+}
+
+function estimateWaitMs(bucket) {
+  const tokensNeeded = bucket.queue.length + 1 - bucket.tokens;
+  return Math.max(0, Math.ceil((tokensNeeded / bucket.config.ratePerSec) * 1000));
+}
+
+function saturationError(apiName, waitMs) {
+  const retryAfter = Math.max(1, Math.ceil(waitMs / 1000));
+  const err = new Error(`${apiName} 当前繁忙，请 ${retryAfter} 秒后重试`);
+  err.status = 503;
+  err.retryAfter = retryAfter;
+  err.code = "upstream_saturated";
+  return err;
+}
+
+/**
+ * 获取一个上游调用许可
+ * @param {string} apiName
+ * @param {Object} env
+ * @param {Object} [options]
+ * @param {number} [options.deadline] - 调用方可接受的最晚开始时间（时间戳，毫秒）
+ * @param {AbortSignal} [options.signal] - 调用方取消时立即退出排队
+ * @returns {Promise<Function>} release 函数，上游响应头到达（或失败）后调用
+ */
+export async function acquireUpstreamSlot(apiName, env, options = {}) {
+  if (!limiterEnabled(env)) {
+    return () => {};
+  }
+  const config = resolveLimiterConfig(env, apiName);
+  const bucket = getBucket(apiName, config);
+  refill(bucket);
+
+  if (!bucket.queue.length && canProceed(bucket)) {
+    return grant(bucket);
+  }
+
+  const now = Date.now();
+  const deadline = Math.min(options.deadline ?? Infinity, now + config.queueTimeoutMs);
+  const estimatedWait = estimateWaitMs(bucket);
+  if (bucket.queue.length >= config.queueMax || now + estimatedWait > deadline) {
+    recordMetric(env, "upstream_limiter", {
+      api: apiName,
+      result: "rejected",
+      queued: bucket.queue.length,
+      in_flight: bucket.inFlight,
+      est_wait_ms: estimatedWait,
+    });
+    throw saturationError(apiName, estimatedWait);
+  }
+
+  const enqueuedAt = now;
+  const release = await new Promise((resolve, reject) => {
+    const waiter = { resolve, reject, timer: null };
+    waiter.timer = setTimeout(
+      () => {
+        const index = bucket.queue.indexOf(waiter);
+        if (index >= 0) bucket.queue.splice(index, 1);
+        recordMetric(env, "upstream_limiter", { api: apiName, result: "timeout" });
+        reject(saturationError(apiName, estimateWaitMs(bucket)));
+      },
+      Math.max(0, deadline - now)
+    );
+    options.signal?.addEventListener(
+      "abort",
+      () => {
+        const index = bucket.queue.indexOf(waiter);
+        if (index < 0) return; // 已获得许可，由调用方负责 release
+        bucket.queue.splice(index, 1);
+        clearTimeout(waiter.timer);
+        reject(options.signal.reason || new Error("请求已取消"));
+      },
+      { once: true }
+    );
+    bucket.queue.push(waiter);
+    pump(bucket);
+  });
+  recordMetric(env, "upstream_limiter", {
+    api: apiName,
+    result: "queued",
+    wait_ms: Date.now() - enqueuedAt,
+  });
+  return release;
+}
+
+/**
+ * 当前各上游的限流状态快照（用于排障）
+ */
+export function getUpstreamLimiterStats() {
+  const stats = {};
+  for (const [apiName, bucket] of buckets) {
+    refill(bucket);
+    stats[apiName] = {
+      tokens: Number(bucket.tokens.toFixed(2)),
+      inFlight: bucket.inFlight,
+      queued: bucket.queue.length,
+      ...bucket.config,
+    };
+  }
+  return stats;
+}
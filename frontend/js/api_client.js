@@ -126,17 +126,51 @@ class ApiClient {
     }
   }
 
+  /**
+   * 提交异步生成任务（POST /api/jobs），立即返回任务信息，配合 pollTaskUntilCompletion 轮询
+   * @param {string} text - 输入文本
+   * @param {string} type - 任务类型 ('image' 或 'audio')
+   * @param {Object} options - 生成参数，可包含 webhook_url
+   * @returns {Promise<Object>} - 含 id、status 与 status_url
+   */
+  async submitJob(text, type, options = {}) {
+    const response = await fetch(`${this.getBaseUrl()}/api/jobs`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "application/json" },
+      body: JSON.stringify({ ...options, text, type }),
+    });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      const error = new Error(`HTTP error! status: ${response.status}`);
+      error.details = data;
+      throw error;
+    }
+    return data;
+  }
+
+  /**
+   * 获取任务结果的完整地址
+   * @param {Object} taskInfo - SUCCESS 状态的任务信息
+   * @returns {string|null}
+   */
+  getJobResultUrl(taskInfo) {
+    const url = taskInfo && taskInfo.result && taskInfo.result.url;
+    if (!url) return null;
+    return url.startsWith("http") ? url : `${this.getBaseUrl()}${url}`;
+  }
+
   /**
    * 获取指定任务ID的状态
-   * @param {string} taskStatusUrl - 任务状态查询的完整URL或相对路径 (例如 /api/tasks/task_id)
+   * @param {string} taskStatusUrl - 任务状态查询的完整URL、/api/jobs/:id 路径或任务 id
    * @returns {Promise<Object>} - 返回任务状态信息
    */
-  // @deprecated 后端当前未提供 /tasks/:id 查询路由；仅保留以兼容旧调用路径
   async getTaskStatus(taskStatusUrl) {
-    // 如果 taskStatusUrl 不是以 http 开头，则假定它是相对路径并拼接 baseUrl
-    const fullUrl = taskStatusUrl.startsWith("http")
-      ? taskStatusUrl
-      : `${this.baseUrl}/tasks/${taskStatusUrl.split("/").pop()}`;
+    let fullUrl = taskStatusUrl;
+    if (!taskStatusUrl.startsWith("http")) {
+      fullUrl = taskStatusUrl.startsWith("/")
+        ? `${this.getBaseUrl()}${taskStatusUrl}`
+        : `${this.getBaseUrl()}/api/jobs/${taskStatusUrl}`;
+    }
     console.log(`ApiClient: Getting task status from ${fullUrl}`);
     try {
       const response = await fetch(fullUrl, {
@@ -181,7 +215,7 @@ class ApiClient {
 
           if (taskInfo.status === "SUCCESS" || taskInfo.status === "FAILURE") {
             console.log(
-              `ApiClient: Task ${taskInfo.task_id} polling complete. Status: ${taskInfo.status}`
+              `ApiClient: Task ${taskInfo.id} polling complete. Status: ${taskInfo.status}`
             );
             resolve(taskInfo); // 任务完成 (成功或失败)
           } else if (attempts >= this.maxPollingAttempts) {
@@ -292,6 +326,56 @@ class ApiClient {
     }
   }
 
+  /**
+   * 流式优化文本提示词（SSE），优化结果边生成边回调
+   * @param {string} text - 原始文本
+   * @param {(partial:string, delta:string)=>void} [onDelta] - 每收到一段时回调当前累计文本与本段增量
+   * @param {AbortSignal} [signal] - 取消信号
+   * @returns {Promise<string>} - 返回最终优化后的文本
+   */
+  async optimizeTextStream(text, onDelta, signal) {
+    const response = await fetch(`${this.getBaseUrl()}/api/prompts/optimize`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+      body: JSON.stringify({ text, stream: true }),
+      signal,
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    let partial = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const blocks = buffered.split("\n\n");
+      buffered = blocks.pop();
+      for (const block of blocks) {
+        let event = "message";
+        let data = "";
+        for (const line of block.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+        if (event === "delta") {
+          partial += payload.text;
+          if (typeof onDelta === "function") onDelta(partial, payload.text);
+        } else if (event === "done") {
+          return payload.optimized_text;
+        } else if (event === "error") {
+          throw new Error(payload.error || "优化服务未返回优化后的文本");
+        }
+      }
+    }
+    throw new Error("优化流意外结束");
+  }
+
   /**
    * 翻译文本
    * @param {string} text - 要翻译的文本
@@ -385,6 +469,55 @@ class ApiClient {
     }
   }
 
+  /**
+   * 批量生成多张图片（一次请求，后端按完成顺序以 NDJSON 逐行返回）
+   * @param {string} text - 提示词
+   * @param {Array<Object>} variants - 变体列表，每项可包含 seed/width/height/model/negative/nologo
+   * @param {Object} options - 所有变体共享的默认参数
+   * @param {(result:Object)=>void} [onResult] - 每完成一张即回调，result 含 index 与 data 或 error
+   * @returns {Promise<Array<Object>>} 按 index 排列的全部结果
+   */
+  async generateImageBatch(text, variants, options = {}, onResult) {
+    const response = await fetch(`${this.getBaseUrl()}/api/generate/batch`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "application/x-ndjson",
+      },
+      body: JSON.stringify({ ...options, text, variants }),
+    });
+
+    if (!response.ok) {
+      const errorDetails = await response.json().catch(() => ({}));
+      const error = new Error(`HTTP error! status: ${response.status}`);
+      error.details = errorDetails;
+      throw error;
+    }
+
+    const results = new Array(variants.length);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    const handleLine = (line) => {
+      if (!line.trim()) return;
+      const result = JSON.parse(line);
+      if (result.done) return;
+      results[result.index] = result;
+      if (typeof onResult === "function") onResult(result);
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split("\n");
+      buffered = lines.pop();
+      lines.forEach(handleLine);
+    }
+    handleLine(buffered + decoder.decode());
+    return results;
+  }
+
   /**
    * 获取可用的图像模型
    * 2026-03 更新：同步 gen.pollinations.ai 最新模型列表
@@ -441,6 +574,8 @@ class ApiClient {
   async generateVoice(options) {
     try {
       const { text, voice = "nova", speed = 1.0 } = options;
+      // 流式模式：后端逐段合成并分块返回 MP3，浏览器用 MediaSource 边收边播
+      const stream = Boolean(options.stream) && this.supportsStreamingAudio();
 
       console.log(
         `ApiClient: Generating voice - Text: ${text.substring(0, 50)}..., Voice: ${voice}, Speed: ${speed}`
@@ -457,6 +592,7 @@ class ApiClient {
           voice: voice,
           speed: speed,
           mode: "tts",
+          stream,
         }),
       });
 
@@ -471,6 +607,11 @@ class ApiClient {
         throw new Error(errorMessage);
       }
 
+      if (stream && response.body) {
+        console.log("ApiClient: Voice generation streaming started");
+        return this.createStreamingAudio(response);
+      }
+
       // 对于音频生成，后端应该返回音频的blob数据
       const audioBlob = await response.blob();
       const mimeType = audioBlob.type || response.headers.get("content-type") || "";
@@ -529,6 +670,70 @@ class ApiClient {
     ];
   }
 
+  /**
+   * 浏览器是否支持以 MediaSource 播放分块 MP3
+   * @returns {boolean}
+   */
+  supportsStreamingAudio() {
+    return (
+      typeof window !== "undefined" &&
+      typeof window.MediaSource === "function" &&
+      typeof window.MediaSource.isTypeSupported === "function" &&
+      window.MediaSource.isTypeSupported("audio/mpeg")
+    );
+  }
+
+  /**
+   * 把流式音频响应接入 MediaSource：audioUrl 可立即赋给 <audio>，首段到达即可播放
+   * 完整音频在流结束后通过 blobPromise 提供（用于下载/保存）
+   * @param {Response} response
+   * @returns {Object}
+   */
+  createStreamingAudio(response) {
+    const mediaSource = new MediaSource();
+    const audioUrl = URL.createObjectURL(mediaSource);
+    const chunks = [];
+
+    const blobPromise = new Promise((resolve, reject) => {
+      mediaSource.addEventListener(
+        "sourceopen",
+        async () => {
+          try {
+            const sourceBuffer = mediaSource.addSourceBuffer("audio/mpeg");
+            const reader = response.body.getReader();
+            while (true) {
+              const { value, done } = await reader.read();
+              if (done) break;
+              chunks.push(value);
+              await new Promise((appended) => {
+                sourceBuffer.addEventListener("updateend", appended, { once: true });
+                sourceBuffer.appendBuffer(value);
+              });
+            }
+            mediaSource.endOfStream();
+            resolve(new Blob(chunks, { type: "audio/mpeg" }));
+          } catch (error) {
+            try {
+              mediaSource.endOfStream("network");
+            } catch (e) {}
+            reject(error);
+          }
+        },
+        { once: true }
+      );
+    });
+
+    return {
+      success: true,
+      audioUrl,
+      blob: null,
+      blobPromise,
+      mimeType: "audio/mpeg",
+      fileExtension: "mp3",
+      streaming: true,
+    };
+  }
+
   /**
    * 获取语速选项
    * @returns {Array} 语速选项列表
@@ -120,6 +120,26 @@ class UIEnhancements {
     try {
       this.updateResultStatus(t("loading"), "loading");
 
+      // 流式优化：边生成边写入输入框，首个 token 到达即可看到结果
+      if (window.APIClient && typeof window.APIClient.optimizeTextStream === "function") {
+        const original = textInput.value;
+        try {
+          const optimized = await window.APIClient.optimizeTextStream(original, (partial) => {
+            textInput.value = partial;
+          });
+          textInput.value = optimized;
+          this.updateResultStatus(t("optimizationSuccess"));
+          textInput.style.borderColor = "#2ecc71";
+          setTimeout(() => {
+            textInput.style.borderColor = "";
+          }, 1000);
+          return;
+        } catch (streamError) {
+          textInput.value = original;
+          throw streamError;
+        }
+      }
+
       const apiBase = (window.APP_CONFIG && window.APP_CONFIG.API_BASE) || window.API_BASE || "";
       const response = await fetch(`${apiBase}/api/prompts/optimize`, {
         method: "POST",
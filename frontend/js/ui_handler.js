@@ -607,48 +607,80 @@ class UIHandler {
     // 尝试使用Pollinations.AI新功能
     const usePollinations = this._shouldUsePollinations();
 
-    for (let i = 0; i < numImages; i++) {
-      try {
-        this.showLoading(`${t("generating")} ${i + 1}/${numImages}...`);
-
-        let imageUrl;
-        if (usePollinations) {
-          // 使用Pollinations.AI新API
-          imageUrl = await this.apiClient.generateImageWithPollinations(optimizedText, {
-            ...imageOptions,
-            seed: Math.floor(Math.random() * 100000000),
-          });
+    if (!usePollinations && numImages > 1) {
+      // 多张图片走批量接口：一次请求、一次扣除额度，后端并发生成并按完成顺序返回
+      const variants = Array.from({ length: numImages }, () => ({
+        seed: Math.floor(Math.random() * 100000000),
+      }));
+      let completed = 0;
+      this.showLoading(`${t("generating")} 1/${numImages}...`);
+      const results = await this.apiClient.generateImageBatch(
+        optimizedText,
+        variants,
+        imageOptions,
+        () => {
+          completed += 1;
+          if (completed < numImages) {
+            this.showLoading(`${t("generating")} ${completed + 1}/${numImages}...`);
+          }
+        }
+      );
+      let firstError = null;
+      results.forEach((result) => {
+        if (result && result.data) {
+          allImageUrls.push(`data:${result.content_type || "image/jpeg"};base64,${result.data}`);
         } else {
-          // 使用原有API
-          const response = await this.apiClient.submitGenerationTask(optimizedText, "image", {
-            ...imageOptions,
-            seed: Math.floor(Math.random() * 100000000),
-          });
-          if (response && response.data) {
-            imageUrl = `data:image/jpeg;base64,${response.data}`;
+          failedCount++;
+          firstError = firstError || (result && result.error);
+        }
+      });
+      if (firstError) {
+        this.showError(firstError);
+      }
+    } else {
+      for (let i = 0; i < numImages; i++) {
+        try {
+          this.showLoading(`${t("generating")} ${i + 1}/${numImages}...`);
+
+          let imageUrl;
+          if (usePollinations) {
+            // 使用Pollinations.AI新API
+            imageUrl = await this.apiClient.generateImageWithPollinations(optimizedText, {
+              ...imageOptions,
+              seed: Math.floor(Math.random() * 100000000),
+            });
           } else {
-            throw new Error("API did not return image data.");
+            // 使用原有API
+            const response = await this.apiClient.submitGenerationTask(optimizedText, "image", {
+              ...imageOptions,
+              seed: Math.floor(Math.random() * 100000000),
+            });
+            if (response && response.data) {
+              imageUrl = `data:image/jpeg;base64,${response.data}`;
+            } else {
+              throw new Error("API did not return image data.");
+            }
           }
-        }
 
-        allImageUrls.push(imageUrl);
-      } catch (error) {
-        console.error(`UIHandler: Error generating image ${i + 1}:`, error);
-        let userFriendlyError =
-          getCurrentLang && getCurrentLang() === "zh"
-            ? `图片 ${i + 1} 生成失败。`
-            : `Image ${i + 1} generation failed.`;
-        if (error.details && error.details.error) {
-          userFriendlyError = error.details.error;
-          if (error.details.details) {
-            userFriendlyError += ` (${error.details.details})`;
+          allImageUrls.push(imageUrl);
+        } catch (error) {
+          console.error(`UIHandler: Error generating image ${i + 1}:`, error);
+          let userFriendlyError =
+            getCurrentLang && getCurrentLang() === "zh"
+              ? `图片 ${i + 1} 生成失败。`
+              : `Image ${i + 1} generation failed.`;
+          if (error.details && error.details.error) {
+            userFriendlyError = error.details.error;
+            if (error.details.details) {
+              userFriendlyError += ` (${error.details.details})`;
+            }
+          } else {
+            userFriendlyError = `${t("error")}: ${error.message}`;
           }
-        } else {
-          userFriendlyError = `${t("error")}: ${error.message}`;
+          this.showError(userFriendlyError);
+          failedCount++;
+          break;
         }
-        this.showError(userFriendlyError);
-        failedCount++;
-        break;
       }
     }
 
@@ -423,6 +423,7 @@ class VoiceApp {
         text: text,
         voice: voiceModel.value,
         speed: parseFloat(voiceSpeed.value),
+        stream: true,
       };
 
       console.log("开始语音生成，参数:", requestData);
@@ -436,6 +437,19 @@ class VoiceApp {
         this.currentAudioUrl = response.audioUrl;
         this.currentAudioBlob = response.blob || null;
         this.displayVoiceResult(response);
+        if (response.blobPromise) {
+          // 流式播放时完整音频稍后才就绪，就绪后再用于下载/保存
+          response.blobPromise
+            .then((blob) => {
+              this.currentAudioBlob = blob;
+              const fileSizeEl = document.getElementById("voice-filesize");
+              if (fileSizeEl) {
+                const fmt = window.formatBytesSafe || this.formatBytes.bind(this);
+                fileSizeEl.textContent = fmt(blob.size);
+              }
+            })
+            .catch((error) => this.log(`Stream error: ${error.message}`));
+        }
         this.showSuccess(t("voiceGenerationSuccess"));
         this.updateProgress(100, t("completed"));
         this.saveHistory();
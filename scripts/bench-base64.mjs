@@ -0,0 +1,69 @@
+#!/usr/bin/env node
+
+// 对比旧版逐字节拼接与新版分块/原生 base64 编码器的耗时
+// 用法: node scripts/bench-base64.mjs [--rounds <n>]
+
+import { randomBytes } from 'node:crypto';
+import process from 'node:process';
+
+import { arrayBufferToBase64, arrayBufferToBase64Chunked } from '../backend/utils/base64.js';
+
+const SIZES = [
+  { label: '256 KB', bytes: 256 * 1024 },
+  { label: '1 MB', bytes: 1024 * 1024 },
+  { label: '4 MB', bytes: 4 * 1024 * 1024 },
+];
+
+// 旧实现（逐字节 += 拼接），仅用于对比
+function legacyArrayBufferToBase64(buffer) {
+  let binary = '';
+  const bytes = new Uint8Array(buffer);
+  const len = bytes.byteLength;
+  for (let i = 0; i < len; i++) {
+    binary += String.fromCharCode(bytes[i]);
+  }
+  return btoa(binary);
+}
+
+function parseRounds(argv) {
+  const idx = argv.indexOf('--rounds');
+  const value = idx >= 0 ? parseInt(argv[idx + 1] || '', 10) : NaN;
+  return Number.isNaN(value) || value <= 0 ? 10 : value;
+}
+
+function measure(fn, input, rounds) {
+  fn(input); // 预热
+  const samples = [];
+  for (let i = 0; i < rounds; i++) {
+    const start = process.hrtime.bigint();
+    fn(input);
+    samples.push(Number(process.hrtime.bigint() - start) / 1e6);
+  }
+  samples.sort((a, b) => a - b);
+  return samples[Math.floor(samples.length / 2)];
+}
+
+function main() {
+  const rounds = parseRounds(process.argv.slice(2));
+  const encoders = [
+    ['legacy', legacyArrayBufferToBase64],
+    ['chunked', arrayBufferToBase64Chunked],
+    ['native', arrayBufferToBase64],
+  ];
+
+  console.log(`base64 编码基准（中位数，${rounds} 轮）`);
+  for (const { label, bytes } of SIZES) {
+    const input = new Uint8Array(randomBytes(bytes)).buffer;
+    const expected = legacyArrayBufferToBase64(input);
+    const row = [];
+    for (const [name, fn] of encoders) {
+      if (fn(input) !== expected) {
+        throw new Error(`${name} 编码结果与旧实现不一致 (${label})`);
+      }
+      row.push(`${name}=${measure(fn, input, rounds).toFixed(2)}ms`);
+    }
+    console.log(`${label.padEnd(7)} ${row.join('  ')}`);
+  }
+}
+
+main();
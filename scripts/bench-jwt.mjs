@@ -0,0 +1,81 @@
+#!/usr/bin/env node
+
+// 对比 validateUserToken 在关闭/开启缓存（CryptoKey、已验证 token LRU、用户记录缓存）时的吞吐
+// 用法: node scripts/bench-jwt.mjs [--iterations <n>] [--sessions <n>]
+
+import process from 'node:process';
+
+import { __authTestables, validateUserToken } from '../backend/auth.js';
+import { resetUserCache } from '../backend/services/user_cache.js';
+
+const { generateJWT, resetJwtCaches } = __authTestables;
+const SECRET = 'bench-secret-0123456789abcdef';
+
+function parseArg(argv, name, fallback) {
+  const idx = argv.indexOf(name);
+  const value = idx >= 0 ? parseInt(argv[idx + 1] || '', 10) : NaN;
+  return Number.isNaN(value) || value <= 0 ? fallback : value;
+}
+
+// 内存版 USERS KV，只实现 get / put
+function createUsers() {
+  const store = new Map();
+  return {
+    store,
+    async get(key) {
+      return store.has(key) ? store.get(key) : null;
+    },
+    async put(key, value) {
+      store.set(key, value);
+    },
+  };
+}
+
+async function createSessions(users, count) {
+  const tokens = [];
+  for (let i = 0; i < count; i++) {
+    const email = `bench${i}@example.com`;
+    const user = { id: `u${i}`, username: `bench${i}`, email, isActive: true };
+    users.store.set(`user:${user.id}`, JSON.stringify(user));
+    users.store.set(`email:${email}`, user.id);
+    tokens.push(await generateJWT({ userId: user.id, email }, SECRET, 3600));
+  }
+  return tokens;
+}
+
+async function measure(env, tokens, iterations) {
+  resetJwtCaches();
+  resetUserCache();
+  for (const token of tokens) await validateUserToken(token, env); // 预热
+  const start = process.hrtime.bigint();
+  for (let i = 0; i < iterations; i++) {
+    const result = await validateUserToken(tokens[i % tokens.length], env);
+    if (!result.success) throw new Error(`token 验证失败: ${result.error}`);
+  }
+  const ms = Number(process.hrtime.bigint() - start) / 1e6;
+  return { ops: Math.round((iterations / ms) * 1000), usPerOp: (ms * 1000) / iterations };
+}
+
+async function main() {
+  const argv = process.argv.slice(2);
+  const iterations = parseArg(argv, '--iterations', 20000);
+  const sessions = parseArg(argv, '--sessions', 50);
+  const users = createUsers();
+  const tokens = await createSessions(users, sessions);
+  const base = { JWT_SECRET: SECRET, USERS: users, JWT_ALLOW_LEGACY: 'false' };
+
+  console.log(`validateUserToken 基准（${iterations} 次，${sessions} 个会话轮流）`);
+  const rows = [
+    ['无缓存', { ...base, JWT_CACHE_ENABLED: 'false', USER_CACHE_ENABLED: 'false' }],
+    ['有缓存', base],
+  ];
+  const results = [];
+  for (const [label, env] of rows) {
+    const { ops, usPerOp } = await measure(env, tokens, iterations);
+    results.push(ops);
+    console.log(`${label}  ${String(ops).padStart(8)} ops/s  ${usPerOp.toFixed(1)} µs/op`);
+  }
+  console.log(`提升 ${(results[1] / results[0]).toFixed(1)}x`);
+}
+
+main();
@@ -0,0 +1,101 @@
+#!/usr/bin/env node
+
+/**
+ * 用内置提示词模板预热 /api/prompts/optimize 的结果缓存
+ * 模板来自 frontend/js/prompt_templates.js（浏览器脚本，这里只取出 PROMPT_TEMPLATES 字面量求值）
+ */
+import { readFile } from 'node:fs/promises';
+import process from 'node:process';
+import vm from 'node:vm';
+
+const TEMPLATE_FILE = new URL('../frontend/js/prompt_templates.js', import.meta.url);
+
+function parseArgs(argv) {
+  const options = {
+    url: process.env.HEALTH_CHECK_URL || '',
+    token: process.env.HEALTH_CHECK_TOKEN || '',
+    dryRun: false,
+  };
+  const args = [...argv];
+  while (args.length) {
+    const arg = args.shift();
+    if (arg === '--help') {
+      options.help = true;
+    } else if (arg === '--url') {
+      options.url = args.shift() || '';
+    } else if (arg === '--token') {
+      options.token = args.shift() || '';
+    } else if (arg === '--dry-run') {
+      options.dryRun = true;
+    }
+  }
+  return options;
+}
+
+function printUsage() {
+  console.log(`用法: node scripts/warm-prompt-cache.mjs [--url <worker_url>] [--token <token>] [--dry-run]
+
+选项:
+  --url <worker_url>          目标 Worker 基地址 (默认读取 HEALTH_CHECK_URL)
+  --token <token>             内部接口令牌 (默认读取 HEALTH_CHECK_TOKEN)
+  --dry-run                   只列出将要预热的提示词
+  --help                      显示此帮助
+`);
+}
+
+async function loadTemplatePrompts() {
+  const source = await readFile(TEMPLATE_FILE, 'utf8');
+  const start = source.indexOf('const PROMPT_TEMPLATES =');
+  const end = source.indexOf('\n};', start);
+  if (start < 0 || end < 0) {
+    throw new Error('未在 prompt_templates.js 中找到 PROMPT_TEMPLATES');
+  }
+  const literal = source.slice(source.indexOf('{', start), end + 2);
+  const templates = vm.runInNewContext(`(${literal})`);
+  const prompts = Object.values(templates)
+    .flat()
+    .map((template) => template.prompt)
+    .filter(Boolean);
+  return [...new Set(prompts)];
+}
+
+async function main() {
+  const options = parseArgs(process.argv.slice(2));
+  if (options.help) {
+    printUsage();
+    return;
+  }
+  const prompts = await loadTemplatePrompts();
+  console.log(`共 ${prompts.length} 条模板提示词`);
+  if (options.dryRun) {
+    prompts.forEach((prompt) => console.log(`  - ${prompt.slice(0, 80)}`));
+    return;
+  }
+  if (!options.url) {
+    console.error('缺少目标 URL，请使用 --url 或设置 HEALTH_CHECK_URL');
+    process.exit(1);
+  }
+  if (!options.token) {
+    console.error('缺少内部接口令牌，请使用 --token 或设置 HEALTH_CHECK_TOKEN');
+    process.exit(1);
+  }
+
+  const res = await fetch(new URL('/internal/prompts/warm', options.url), {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${options.token}`,
+    },
+    body: JSON.stringify({ prompts }),
+  });
+  const bodyText = await res.text();
+  console.log(`status=${res.status} ${bodyText}`);
+  if (!res.ok) {
+    process.exit(1);
+  }
+}
+
+main().catch((err) => {
+  console.error('预热脚本错误:', err);
+  process.exit(1);
+});
@@ -1,42 +1,115 @@
 import test from 'node:test';
 import assert from 'node:assert/strict';
+import { Buffer } from 'node:buffer';
+import { pbkdf2Sync } from 'node:crypto';
 
-import { __authTestables } from '../../backend/auth.js';
+import { __authTestables, handleUserLogin } from '../../backend/auth.js';
 
 const {
+  generateJWT,
+  verifyJWT,
+  resetJwtCaches,
   hashPasswordLegacy,
   hashPasswordPBKDF2,
   verifyPasswordAgainstUser,
   upgradeUserPassword,
   resolvePBKDF2Iterations,
+  resolveTargetIterations,
+  resetPBKDF2Calibration,
   resolvePBKDF2KeyLength,
   resolvePBKDF2Digest,
   resolveGoogleOAuthConfig,
 } = __authTestables;
 
+function createKv(entries = {}) {
+  const store = new Map(Object.entries(entries));
+  return {
+    store,
+    puts: 0,
+    async get(key, type) {
+      const value = store.get(key);
+      if (value === undefined) return null;
+      return type === 'json' ? JSON.parse(value) : value;
+    },
+    async put(key, value) {
+      this.puts += 1;
+      store.set(key, value);
+    },
+    async delete(key) {
+      store.delete(key);
+    },
+  };
+}
+
 const TEST_ENV = {
   PBKDF2_ITERATIONS: '120000',
   PBKDF2_KEYLEN: '64',
   PBKDF2_DIGEST: 'sha512',
 };
 
-test('hashPasswordPBKDF2 produces deterministic hex string', () => {
+test('hashPasswordPBKDF2 produces deterministic hex string', async () => {
   const password = 'S3cure!';
   const salt = 'a1b2c3d4e5f60718293a4b5c6d7e8f90';
-  const hashA = hashPasswordPBKDF2(password, salt, 120000, 64, 'sha512');
-  const hashB = hashPasswordPBKDF2(password, salt, 120000, 64, 'sha512');
+  const hashA = await hashPasswordPBKDF2(password, salt, 120000, 64, 'sha512');
+  const hashB = await hashPasswordPBKDF2(password, salt, 120000, 64, 'sha512');
 
   assert.equal(hashA, hashB, 'hash should be deterministic');
   assert.equal(hashA.length, 128, 'hex string length should be keyLen*2');
 });
 
-test('verifyPasswordAgainstUser validates pbkdf2 user without upgrade', () => {
+test('hashPasswordPBKDF2 matches the previous pbkdf2Sync output byte for byte', async () => {
+  const cases = [
+    ['S3cure!', 'a1b2c3d4e5f60718293a4b5c6d7e8f90', 50000, 64, 'sha256'],
+    ['密码-ünïcode', '00112233445566778899aabbccddeeff', 60000, 32, 'sha384'],
+    ['p', 'ffeeddccbbaa99887766554433221100', 120000, 128, 'sha512'],
+  ];
+  for (const [password, salt, iterations, keyLength, digest] of cases) {
+    const expected = pbkdf2Sync(password, salt, iterations, keyLength, digest).toString('hex');
+    assert.equal(
+      await hashPasswordPBKDF2(password, salt, iterations, keyLength, digest),
+      expected
+    );
+  }
+});
+
+test('hashPasswordPBKDF2 verifies legacy iteration counts without WebCrypto', async (t) => {
+  const original = crypto.subtle.deriveBits;
+  crypto.subtle.deriveBits = async () => {
+    throw new DOMException('iteration counts above 100000 are not supported', 'NotSupportedError');
+  };
+  t.after(() => {
+    crypto.subtle.deriveBits = original;
+  });
+  const salt = 'a1b2c3d4e5f60718293a4b5c6d7e8f90';
+  const expected = pbkdf2Sync('S3cure!', salt, 120000, 64, 'sha256').toString('hex');
+  assert.equal(await hashPasswordPBKDF2('S3cure!', salt, 120000, 64, 'sha256'), expected);
+});
+
+test('hashPasswordPBKDF2 does not block the event loop during a login storm', async () => {
+  const salt = '0123456789abcdef0123456789abcdef';
+  let pending = 0;
+  const storm = Array.from({ length: 8 }, (_, i) => {
+    pending += 1;
+    return hashPasswordPBKDF2(`storm-${i}`, salt, 120000, 64, 'sha512').finally(() => {
+      pending -= 1;
+    });
+  });
+  // 其他请求的计时器在派生进行中就能得到执行
+  const start = Date.now();
+  await new Promise((resolve) => setTimeout(resolve, 0));
+  const timerDelay = Date.now() - start;
+  assert.ok(pending > 0, 'timer should fire while derivations are still running');
+  await Promise.all(storm);
+  assert.ok(timerDelay < 50, `timer was delayed ${timerDelay}ms`);
+});
+
+test('verifyPasswordAgainstUser validates pbkdf2 user without upgrade', async () => {
   const password = 'pbkdf2-pass';
   const salt = '11112222333344445555666677778888';
   const iterations = resolvePBKDF2Iterations(TEST_ENV);
   const keyLength = resolvePBKDF2KeyLength(TEST_ENV);
   const digest = resolvePBKDF2Digest(TEST_ENV);
-  const hash = hashPasswordPBKDF2(password, salt, iterations, keyLength, digest);
+  const hash = await hashPasswordPBKDF2(password, salt, iterations, keyLength, digest);
   const user = {
     salt,
     passwordHash: hash,
@@ -46,40 +119,67 @@ test('verifyPasswordAgainstUser validates pbkdf2 user without upgrade', () => {
     passwordDigest: digest,
   };
 
-  const result = verifyPasswordAgainstUser(password, user, TEST_ENV);
+  const result = await verifyPasswordAgainstUser(password, user, TEST_ENV);
   assert.equal(result.valid, true);
   assert.equal(result.needsUpgrade, false);
   assert.equal(result.metadataNeedsUpdate, false);
 });
 
-test('verifyPasswordAgainstUser flags legacy hash for upgrade', () => {
+test('verifyPasswordAgainstUser flags legacy hash for upgrade', async () => {
   const password = 'legacy-pass';
   const salt = '0f0e0d0c0b0a09080706050403020100';
   const hash = hashPasswordLegacy(password, salt);
   const user = { salt, passwordHash: hash };
 
-  const result = verifyPasswordAgainstUser(password, user, TEST_ENV);
+  const result = await verifyPasswordAgainstUser(password, user, TEST_ENV);
   assert.equal(result.valid, true);
   assert.equal(result.needsUpgrade, true, 'legacy hash should require upgrade');
   assert.equal(result.metadataNeedsUpdate, false);
 });
 
-test('upgradeUserPassword migrates legacy user to pbkdf2', () => {
+test('upgradeUserPassword migrates legacy user to pbkdf2', async () => {
   const password = 'UpgradeMe!';
   const salt = 'abcdefabcdefabcdefabcdefabcdefab';
   const legacyHash = hashPasswordLegacy(password, salt);
   const user = { salt, passwordHash: legacyHash };
 
-  const upgraded = upgradeUserPassword(user, password, TEST_ENV);
+  const upgraded = await upgradeUserPassword(user, password, TEST_ENV);
   assert.equal(upgraded.passwordAlgorithm, 'pbkdf2');
   assert.ok(upgraded.passwordHash, 'should generate pbkdf2 hash');
   assert.equal(typeof upgraded.passwordUpdatedAt, 'string');
 
-  const verification = verifyPasswordAgainstUser(password, upgraded, TEST_ENV);
+  const verification = await verifyPasswordAgainstUser(password, upgraded, TEST_ENV);
   assert.equal(verification.valid, true);
   assert.equal(verification.needsUpgrade, false);
 });
 
+test('new hashes stay within the WebCrypto limit and legacy costs are rehashed', async () => {
+  // TEST_ENV 配置了 120000，新哈希按 WebCrypto 上限
+  assert.equal(resolvePBKDF2Iterations(TEST_ENV), 100000);
+  assert.equal(resolvePBKDF2Iterations({}), 100000);
+
+  // 旧记录没有保存迭代次数时按旧默认值 120000 验证，并标记重新哈希
+  const salt = '99990000aaaabbbbccccddddeeeeffff';
+  const user = {
+    salt,
+    passwordHash: await hashPasswordPBKDF2('OldCost!', salt, 120000, 64, 'sha256'),
+    passwordAlgorithm: 'pbkdf2',
+    passwordKeyLength: 64,
+    passwordDigest: 'sha256',
+  };
+  const env = { PBKDF2_DIGEST: 'sha256' };
+  const result = await verifyPasswordAgainstUser('OldCost!', user, env);
+  assert.equal(result.valid, true);
+  assert.equal(result.iterations, 120000);
+  assert.equal(result.needsRehash, true);
+
+  const upgraded = await upgradeUserPassword(user, 'OldCost!', env);
+  assert.equal(upgraded.passwordIterations, 100000);
+  const recheck = await verifyPasswordAgainstUser('OldCost!', upgraded, env);
+  assert.equal(recheck.valid, true);
+  assert.equal(recheck.needsRehash, false);
+});
+
 test('resolveGoogleOAuthConfig surfaces missing configuration', () => {
   const result = resolveGoogleOAuthConfig({});
   assert.ok(result.errors.includes('GOOGLE_CLIENT_ID 未配置'));
@@ -98,3 +198,174 @@ test('resolveGoogleOAuthConfig derives redirect from FRONTEND_URL', () => {
   assert.equal(result.redirectUri, 'https://example.com/app/auth/google/callback');
   assert.equal(result.warnings.length, 1);
 });
+
+test('verifyJWT imports the HMAC key once and caches verified tokens', async (t) => {
+  resetJwtCaches();
+  const originalImport = crypto.subtle.importKey;
+  const originalSign = crypto.subtle.sign;
+  let imports = 0;
+  let signs = 0;
+  crypto.subtle.importKey = (...args) => {
+    imports += 1;
+    return originalImport.apply(crypto.subtle, args);
+  };
+  crypto.subtle.sign = (...args) => {
+    signs += 1;
+    return originalSign.apply(crypto.subtle, args);
+  };
+  t.after(() => {
+    crypto.subtle.importKey = originalImport;
+    crypto.subtle.sign = originalSign;
+    resetJwtCaches();
+  });
+
+  const secret = 'unit-secret';
+  const tokenA = await generateJWT({ userId: 'a', email: 'a@example.com' }, secret, 60);
+  const tokenB = await generateJWT({ userId: 'b', email: 'b@example.com' }, secret, 60);
+  for (let i = 0; i < 3; i++) {
+    assert.equal((await verifyJWT(tokenA, secret, {})).userId, 'a');
+    assert.equal((await verifyJWT(tokenB, secret, {})).userId, 'b');
+  }
+  assert.equal(imports, 1);
+  // 两次签发 + 两个 token 各验签一次
+  assert.equal(signs, 4);
+
+  // 同一签名配篡改过的载荷不能命中缓存
+  const [header, , signature] = tokenA.split('.');
+  const forgedClaims = JSON.stringify({ userId: 'b', email: 'b@example.com' });
+  const forged = Buffer.from(forgedClaims).toString('base64url');
+  assert.equal(await verifyJWT(`${header}.${forged}.${signature}`, secret, {}), null);
+  assert.equal(await verifyJWT(tokenA, 'other-secret', {}), null);
+});
+
+test('verifyJWT does not serve cached claims past exp', async (t) => {
+  resetJwtCaches();
+  const realNow = Date.now;
+  t.after(() => {
+    Date.now = realNow;
+    resetJwtCaches();
+  });
+  const token = await generateJWT({ userId: 'a', email: 'a@example.com' }, 'unit-secret', 5);
+  assert.ok(await verifyJWT(token, 'unit-secret', {}));
+  const later = realNow() + 10000;
+  Date.now = () => later;
+  assert.equal(await verifyJWT(token, 'unit-secret', {}), null);
+});
+
+test('resolveTargetIterations calibrates once and shares the result through KV', async (t) => {
+  resetPBKDF2Calibration();
+  t.after(resetPBKDF2Calibration);
+  const USERS = createKv();
+  const env = { ...TEST_ENV, PBKDF2_TARGET_MS: '50', USERS };
+
+  const iterations = await resolveTargetIterations(env);
+  assert.equal(iterations % 10000, 0);
+  assert.ok(iterations >= 50000 && iterations <= 100000);
+  assert.equal(await resolveTargetIterations(env), iterations);
+  assert.equal(USERS.puts, 1);
+
+  // 新 isolate 直接读取 KV 中的校准值；目标耗时变化时重新校准
+  resetPBKDF2Calibration();
+  assert.equal(await resolveTargetIterations(env), iterations);
+  assert.equal(USERS.puts, 1);
+  resetPBKDF2Calibration();
+  await resolveTargetIterations({ ...env, PBKDF2_TARGET_MS: '100' });
+  assert.equal(USERS.puts, 2);
+
+  assert.equal(await resolveTargetIterations(TEST_ENV), resolvePBKDF2Iterations(TEST_ENV));
+});
+
+test('an unmeasurable calibration is shared so other isolates skip the probe', async (t) => {
+  resetPBKDF2Calibration();
+  const originalNow = performance.now;
+  const originalDerive = crypto.subtle.deriveBits;
+  let derivations = 0;
+  // Workers 中纯计算期间时钟不前进
+  performance.now = () => 0;
+  crypto.subtle.deriveBits = (...args) => {
+    derivations += 1;
+    return originalDerive.apply(crypto.subtle, args);
+  };
+  t.after(() => {
+    performance.now = originalNow;
+    crypto.subtle.deriveBits = originalDerive;
+    resetPBKDF2Calibration();
+  });
+  const USERS = createKv();
+  const env = { ...TEST_ENV, PBKDF2_TARGET_MS: '50', USERS };
+
+  assert.equal(await resolveTargetIterations(env), resolvePBKDF2Iterations(TEST_ENV));
+  assert.equal(JSON.parse(USERS.store.get('CONFIG:pbkdf2_calibration')).unmeasurable, true);
+  const probed = derivations;
+  assert.ok(probed > 0);
+
+  resetPBKDF2Calibration();
+  assert.equal(await resolveTargetIterations(env), resolvePBKDF2Iterations(TEST_ENV));
+  assert.equal(derivations, probed);
+  assert.equal(USERS.puts, 1);
+});
+
+test('a wrong password does not resolve the calibrated target', async (t) => {
+  resetPBKDF2Calibration();
+  t.after(resetPBKDF2Calibration);
+  const USERS = createKv();
+  const env = { ...TEST_ENV, PBKDF2_TARGET_MS: '50', USERS };
+  const salt = '0123456789abcdef0123456789abcdef';
+  const user = {
+    salt,
+    passwordHash: await hashPasswordPBKDF2('right', salt, 50000, 64, 'sha512'),
+    passwordAlgorithm: 'pbkdf2',
+    passwordIterations: 50000,
+    passwordKeyLength: 64,
+    passwordDigest: 'sha512',
+  };
+
+  const result = await verifyPasswordAgainstUser('wrong', user, env);
+  assert.equal(result.valid, false);
+  assert.equal(result.needsRehash, false);
+  assert.equal(USERS.store.size, 0);
+  assert.equal(USERS.puts, 0);
+});
+
+test('handleUserLogin rehashes when the stored cost differs from the target', async (t) => {
+  resetPBKDF2Calibration();
+  t.after(resetPBKDF2Calibration);
+  const email = 'cost@example.com';
+  const salt = 'a1b2c3d4e5f60718293a4b5c6d7e8f90';
+  const passwordHash = await hashPasswordPBKDF2('S3cure!', salt, 50000, 64, 'sha512');
+  const USERS = createKv({
+    'CONFIG:pbkdf2_calibration': JSON.stringify({ targetMs: 250, iterations: 120000 }),
+    [email]: JSON.stringify({
+      id: 'u1',
+      email,
+      isActive: true,
+      passwordHash,
+      salt,
+      passwordAlgorithm: 'pbkdf2',
+      passwordIterations: 50000,
+      passwordKeyLength: 64,
+      passwordDigest: 'sha512',
+    }),
+  });
+  const env = {
+    ...TEST_ENV,
+    PBKDF2_TARGET_MS: '250',
+    USER_CACHE_ENABLED: 'false',
+    JWT_SECRET: 'unit-secret',
+    USERS,
+  };
+
+  const result = await handleUserLogin({ email, password: 'S3cure!' }, env);
+  assert.equal(result.success, true);
+  const stored = JSON.parse(USERS.store.get('user:u1'));
+  // KV 中旧的校准值超出 WebCrypto 上限，按上限重新哈希
+  assert.equal(stored.passwordIterations, 100000);
+  assert.notEqual(stored.passwordHash, passwordHash);
+
+  // 重新哈希后成本已达标，再次登录不再重写哈希
+  const check = await verifyPasswordAgainstUser('S3cure!', stored, env);
+  assert.equal(check.valid, true);
+  assert.equal(check.needsRehash, false);
+  assert.equal((await handleUserLogin({ email, password: 'S3cure!' }, env)).success, true);
+  assert.equal(JSON.parse(USERS.store.get('user:u1')).passwordHash, stored.passwordHash);
+});
@@ -0,0 +1,25 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+import { randomBytes } from 'node:crypto';
+
+import { arrayBufferToBase64, arrayBufferToBase64Chunked } from '../../backend/utils/base64.js';
+
+const SIZES = [0, 1, 2, 3, 24575, 24576, 24577, 100000];
+
+test('arrayBufferToBase64 matches Buffer encoding across chunk boundaries', () => {
+  for (const size of SIZES) {
+    const bytes = randomBytes(size);
+    const expected = bytes.toString('base64');
+    const input = new Uint8Array(bytes).buffer;
+    assert.equal(arrayBufferToBase64(input), expected, `native size=${size}`);
+    assert.equal(arrayBufferToBase64Chunked(input), expected, `chunked size=${size}`);
+  }
+});
+
+test('arrayBufferToBase64 accepts typed array views with offsets', () => {
+  const backing = new Uint8Array([0, 1, 2, 3, 4, 5, 6, 7]);
+  const view = backing.subarray(2, 7);
+  const expected = Buffer.from([2, 3, 4, 5, 6]).toString('base64');
+  assert.equal(arrayBufferToBase64(view), expected);
+  assert.equal(arrayBufferToBase64Chunked(view), expected);
+});
@@ -0,0 +1,81 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  checkCircuit,
+  getCircuitStats,
+  recordCircuitResult,
+  resetCircuits,
+} from '../../backend/utils/circuit_breaker.js';
+
+function createKv() {
+  const store = new Map();
+  return {
+    store,
+    async get(key, type) {
+      const value = store.get(key);
+      return value && type === 'json' ? JSON.parse(value) : (value ?? null);
+    },
+    async put(key, value) {
+      store.set(key, value);
+    },
+    async delete(key) {
+      store.delete(key);
+    },
+  };
+}
+
+function createEnv(kv) {
+  return {
+    LOG_LEVEL: 'error',
+    CIRCUIT_STATE: kv,
+    CIRCUIT_MIN_REQUESTS: '4',
+    CIRCUIT_ERROR_RATE: '0.5',
+    CIRCUIT_OPEN_MS: '50',
+    CIRCUIT_SYNC_MS: '0',
+  };
+}
+
+async function fail(env, times) {
+  for (let i = 0; i < times; i++) {
+    const permit = await checkCircuit('Breaker API', env);
+    await recordCircuitResult('Breaker API', env, false, permit);
+  }
+}
+
+test('circuit opens on error rate, fails fast and shares state through KV', async () => {
+  resetCircuits();
+  const kv = createKv();
+  const env = createEnv(kv);
+  await fail(env, 4);
+
+  await assert.rejects(checkCircuit('Breaker API', env), (err) => {
+    assert.equal(err.status, 503);
+    assert.equal(err.code, 'circuit_open');
+    assert.ok(err.retryAfter >= 1);
+    return true;
+  });
+  assert.equal(kv.store.size, 1);
+
+  // 另一个 isolate（本地状态为空）从 KV 同步到熔断
+  resetCircuits();
+  await assert.rejects(checkCircuit('Breaker API', env), { code: 'circuit_open' });
+});
+
+test('half-open admits one probe and closes on success', async () => {
+  resetCircuits();
+  const kv = createKv();
+  const env = createEnv(kv);
+  await fail(env, 4);
+  await new Promise((resolve) => setTimeout(resolve, 60));
+
+  const probe = await checkCircuit('Breaker API', env);
+  assert.equal(probe.probe, true);
+  await assert.rejects(checkCircuit('Breaker API', env), { code: 'circuit_open' });
+
+  await recordCircuitResult('Breaker API', env, true, probe);
+  assert.equal((await checkCircuit('Breaker API', env)).probe, false);
+  assert.equal(kv.store.size, 0);
+  const stats = await getCircuitStats(env);
+  assert.equal(stats['Breaker API'].state, 'closed');
+});
@@ -0,0 +1,23 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { mapWithConcurrency } from '../../backend/utils/concurrency.js';
+
+test('mapWithConcurrency caps parallelism and keeps input order', async () => {
+  let running = 0;
+  let peak = 0;
+  const results = await mapWithConcurrency([30, 10, 20, 5, 15], 2, async (delay, index) => {
+    running += 1;
+    peak = Math.max(peak, running);
+    await new Promise((resolve) => setTimeout(resolve, delay));
+    running -= 1;
+    if (index === 3) throw new Error('boom');
+    return index;
+  });
+  assert.equal(peak, 2);
+  assert.deepEqual(
+    results.map((r) => r.value),
+    [0, 1, 2, undefined, 4]
+  );
+  assert.equal(results[3].error.message, 'boom');
+});
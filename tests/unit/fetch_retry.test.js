@@ -0,0 +1,182 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { getCircuitStats, resetCircuits } from '../../backend/utils/circuit_breaker.js';
+import { fetchWithRetry, getRetryTrace, parseRetryAfterMs } from '../../backend/utils/fetch.js';
+
+const ENV = { LOG_LEVEL: 'error', UPSTREAM_LIMITER_ENABLED: 'false' };
+
+function stubFetch(t, responses) {
+  const calls = [];
+  const original = globalThis.fetch;
+  globalThis.fetch = async (url, options) => {
+    calls.push({ url, options });
+    const next = responses.shift();
+    if (next instanceof Error) throw next;
+    return next;
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+  return calls;
+}
+
+test('parseRetryAfterMs understands seconds, HTTP dates and RateLimit-Reset', () => {
+  const now = Date.parse('2026-01-01T00:00:00Z');
+  assert.equal(parseRetryAfterMs(new Headers({ 'Retry-After': '2' }), now), 2000);
+  assert.equal(
+    parseRetryAfterMs(new Headers({ 'Retry-After': 'Thu, 01 Jan 2026 00:00:05 GMT' }), now),
+    5000
+  );
+  assert.equal(parseRetryAfterMs(new Headers({ 'RateLimit-Reset': '3' }), now), 3000);
+  assert.equal(parseRetryAfterMs(new Headers(), now), null);
+});
+
+test('fetchWithRetry honours Retry-After and records a trace', async (t) => {
+  const calls = stubFetch(t, [
+    new Response('slow down', { status: 429, headers: { 'Retry-After': '0' } }),
+    new Response('ok', { status: 200 }),
+  ]);
+  const response = await fetchWithRetry('https://up.test', { method: 'POST' }, 'Test API', ENV, {
+    initialDelayMs: 1,
+  });
+  assert.equal(await response.text(), 'ok');
+  assert.equal(calls.length, 2);
+  const trace = getRetryTrace(response);
+  assert.equal(trace.outcome, 'success');
+  assert.deepEqual(
+    trace.attempts.map((a) => a.status),
+    [429, 200]
+  );
+  assert.equal(trace.attempts[0].wait_ms, 0);
+});
+
+test('fetchWithRetry does not retry plain 4xx or non-idempotent 5xx', async (t) => {
+  const calls = stubFetch(t, [
+    new Response('bad', { status: 400 }),
+    new Response('boom', { status: 500 }),
+    new Response('boom', { status: 500 }),
+    new Response('ok', { status: 200 }),
+  ]);
+  await assert.rejects(
+    fetchWithRetry('https://up.test', {}, 'Test API', ENV, { initialDelayMs: 1 }),
+    (err) => err.status === 400 && err.retryTrace.attempts.length === 1
+  );
+  await assert.rejects(
+    fetchWithRetry('https://up.test', { method: 'POST' }, 'Test API', ENV, { initialDelayMs: 1 }),
+    (err) => err.status === 500 && err.retryTrace.outcome === 'http_500'
+  );
+  const response = await fetchWithRetry('https://up.test', { method: 'POST' }, 'Test API', ENV, {
+    initialDelayMs: 1,
+    idempotent: true,
+  });
+  assert.equal(response.status, 200);
+  assert.equal(calls.length, 4);
+});
+
+test('fetchWithRetry stops when the next wait would exceed the budget', async (t) => {
+  const calls = stubFetch(t, [
+    new Response('later', { status: 429, headers: { 'Retry-After': '120' } }),
+  ]);
+  const started = Date.now();
+  await assert.rejects(
+    fetchWithRetry('https://up.test', {}, 'Test API', ENV, { budgetMs: 1000 }),
+    (err) => err.status === 429 && err.retryAfter === 120
+  );
+  assert.equal(calls.length, 1);
+  assert.ok(Date.now() - started < 500, 'should fail fast instead of sleeping');
+});
+
+test('fetchWithRetry reports progress events and aborts during backoff', async (t) => {
+  stubFetch(t, [new Response('busy', { status: 429, headers: { 'Retry-After': '5' } })]);
+  const events = [];
+  const controller = new AbortController();
+  const pending = fetchWithRetry('https://up.test', {}, 'Test API', ENV, {
+    signal: controller.signal,
+    onEvent: (event) => {
+      events.push(event.type);
+      if (event.type === 'backoff') controller.abort();
+    },
+  });
+  await assert.rejects(pending, (err) => err.retryTrace.outcome === 'aborted');
+  assert.deepEqual(events, ['attempt', 'response', 'backoff']);
+});
+
+test('fetchWithRetry leaves the upstream limiter queue as soon as the caller aborts', async (t) => {
+  const env = {
+    LOG_LEVEL: 'error',
+    UPSTREAM_MAX_INFLIGHT_ABORT_TEST: '1',
+    UPSTREAM_QUEUE_TIMEOUT_MS_ABORT_TEST: '60000',
+  };
+  let releaseFirst;
+  stubFetch(t, [
+    new Promise((resolve) => {
+      releaseFirst = () => resolve(new Response('ok'));
+    }),
+  ]);
+  const first = fetchWithRetry('https://up.test', {}, 'Abort Test', env);
+  const controller = new AbortController();
+  const queued = fetchWithRetry('https://up.test', {}, 'Abort Test', env, {
+    signal: controller.signal,
+  });
+  const t0 = Date.now();
+  setTimeout(() => controller.abort(), 10);
+  await assert.rejects(queued, (err) => err.retryTrace.outcome === 'aborted');
+  assert.ok(Date.now() - t0 < 1000);
+  releaseFirst();
+  assert.equal((await first).status, 200);
+});
+
+test('fetchWithRetry cancels a hung attempt at the budget and does not retry it', async (t) => {
+  const original = globalThis.fetch;
+  let calls = 0;
+  globalThis.fetch = (url, options) => {
+    calls += 1;
+    return new Promise((resolve, reject) => {
+      options.signal.addEventListener('abort', () => reject(options.signal.reason), { once: true });
+    });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+
+  const started = Date.now();
+  await assert.rejects(
+    fetchWithRetry('https://up.test', {}, 'Hung API', ENV, { budgetMs: 50, initialDelayMs: 1 }),
+    (error) => {
+      assert.equal(error.code, 'budget_exhausted');
+      assert.equal(error.status, 504);
+      assert.equal(error.retryTrace.outcome, 'budget_exhausted');
+      return true;
+    }
+  );
+  assert.equal(calls, 1);
+  assert.ok(Date.now() - started < 1000);
+});
+
+test('a retried call counts once in the circuit breaker', async (t) => {
+  resetCircuits();
+  t.after(resetCircuits);
+  const env = { ...ENV, CIRCUIT_MIN_REQUESTS: '2', CIRCUIT_ERROR_RATE: '0.6' };
+  const calls = stubFetch(t, [
+    new Response('busy', { status: 503 }),
+    new Response('busy', { status: 503 }),
+    new Response('ok', { status: 200 }),
+    new Response('busy', { status: 503 }),
+    new Response('busy', { status: 503 }),
+  ]);
+  const policy = { maxAttempts: 3, initialDelayMs: 1 };
+
+  await fetchWithRetry('https://up.test', {}, 'Breaker Retry API', env, policy);
+  let stats = (await getCircuitStats(env))['Breaker Retry API'];
+  assert.deepEqual([stats.state, stats.requests, stats.failures], ['closed', 1, 0]);
+
+  // 按尝试计数时第一次调用就是 2/3 失败而熔断；按调用计数，两次 503 后放弃也只算一次失败
+  await assert.rejects(
+    fetchWithRetry('https://up.test', {}, 'Breaker Retry API', env, { ...policy, maxAttempts: 2 }),
+    { status: 503 }
+  );
+  stats = (await getCircuitStats(env))['Breaker Retry API'];
+  assert.equal(calls.length, 5);
+  assert.deepEqual([stats.state, stats.requests, stats.failures], ['closed', 2, 1]);
+});
@@ -0,0 +1,153 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  normalizeAudioCacheParams,
+  normalizeImageCacheParams,
+  readGenerationCacheById,
+  withGenerationCache,
+} from '../../backend/services/generation_cache.js';
+import { parseByteRange } from '../../backend/utils/response.js';
+
+function createKv() {
+  const store = new Map();
+  return {
+    store,
+    async getWithMetadata(key) {
+      const entry = store.get(key);
+      return entry ? { value: entry.value, metadata: entry.metadata } : { value: null, metadata: null };
+    },
+    async put(key, value, options = {}) {
+      store.set(key, { value, metadata: options.metadata });
+    },
+  };
+}
+
+function createCtx() {
+  const pending = [];
+  return {
+    waitUntil(promise) {
+      pending.push(promise);
+    },
+    flush: () => Promise.all(pending.splice(0)),
+  };
+}
+
+test('normalizeImageCacheParams bypasses random seeds', () => {
+  assert.equal(normalizeImageCacheParams({ prompt: 'cat', seed: -1 }), null);
+  assert.equal(normalizeImageCacheParams({ prompt: 'cat' }), null);
+  assert.deepEqual(
+    normalizeImageCacheParams({ prompt: ' cat ', seed: '42', width: '512', model: 'FLUX' }),
+    normalizeImageCacheParams({ prompt: 'cat', seed: 42, width: 512, model: 'flux' })
+  );
+});
+
+test('withGenerationCache serves repeat requests from the backing store', async () => {
+  const env = { IMAGES_CACHE: createKv() };
+  const ctx = createCtx();
+  const params = normalizeImageCacheParams({ prompt: 'cat', seed: 7 });
+  let upstreamCalls = 0;
+  const produce = async () => {
+    upstreamCalls++;
+    return new Response(new Uint8Array([9, 8, 7]), { headers: { 'Content-Type': 'image/png' } });
+  };
+
+  const first = await withGenerationCache(env, ctx, 'image', params, produce);
+  assert.equal(first.cache, 'miss');
+  assert.deepEqual(new Uint8Array(await first.response.arrayBuffer()), new Uint8Array([9, 8, 7]));
+  await ctx.flush();
+
+  const second = await withGenerationCache(env, ctx, 'image', params, produce);
+  assert.equal(second.cache, 'hit');
+  assert.equal(second.response.headers.get('Content-Type'), 'image/png');
+  assert.deepEqual(new Uint8Array(await second.response.arrayBuffer()), new Uint8Array([9, 8, 7]));
+  assert.equal(upstreamCalls, 1);
+});
+
+test('withGenerationCache skips payloads above the size limit', async () => {
+  const env = { IMAGES_CACHE: createKv(), GENERATION_CACHE_MAX_MB: '0.000001' };
+  const ctx = createCtx();
+  const params = normalizeImageCacheParams({ prompt: 'dog', seed: 3 });
+  const produce = async () => new Response(new Uint8Array(16));
+
+  const result = await withGenerationCache(env, ctx, 'image', params, produce);
+  await result.response.arrayBuffer();
+  await ctx.flush();
+  assert.equal(env.IMAGES_CACHE.store.size, 0);
+});
+
+test('random-seed results stored by id are readable by id but never reused', async () => {
+  const env = { IMAGES_CACHE: createKv() };
+  const ctx = createCtx();
+  const params = normalizeImageCacheParams({ prompt: 'owl', seed: -1 });
+  let upstreamCalls = 0;
+  const produce = async () => {
+    upstreamCalls++;
+    return new Response(new Uint8Array([upstreamCalls]), {
+      headers: { 'Content-Type': 'image/png', 'Content-Length': '1' },
+    });
+  };
+
+  const first = await withGenerationCache(env, ctx, 'image', params, produce, { storeById: true });
+  assert.equal(first.cache, 'bypass');
+  assert.match(first.id, /^[a-f0-9]{64}$/);
+  assert.deepEqual(new Uint8Array(await first.response.arrayBuffer()), new Uint8Array([1]));
+  await ctx.flush();
+
+  const second = await withGenerationCache(env, ctx, 'image', params, produce, { storeById: true });
+  assert.notEqual(second.id, first.id);
+  assert.deepEqual(new Uint8Array(await second.response.arrayBuffer()), new Uint8Array([2]));
+  await ctx.flush();
+
+  const stored = await readGenerationCacheById(env, ctx, 'image', first.id);
+  assert.deepEqual(new Uint8Array(stored.bytes), new Uint8Array([1]));
+  assert.equal(stored.contentType, 'image/png');
+
+  const plain = await withGenerationCache(env, ctx, 'image', params, produce);
+  assert.equal(plain.id, undefined);
+
+  // 长度未知的结果可能因超限而不写入，不返回无法回读的 id
+  const unsized = await withGenerationCache(
+    env,
+    ctx,
+    'image',
+    params,
+    async () => new Response(new Uint8Array([7])),
+    { storeById: true }
+  );
+  assert.equal(unsized.id, undefined);
+  await unsized.response.arrayBuffer();
+});
+
+test('withGenerationCache returns an id on a miss only when the write is certain', async () => {
+  const env = { IMAGES_CACHE: createKv(), GENERATION_CACHE_MAX_MB: '0.000001' };
+  const ctx = createCtx();
+  const params = normalizeImageCacheParams({ prompt: 'fox', seed: 11 });
+  // 没有 Content-Length，读完才发现超限，不会写入
+  const result = await withGenerationCache(env, ctx, 'image', params, async () => {
+    return new Response(new Uint8Array(16));
+  });
+  assert.equal(result.cache, 'miss');
+  assert.equal(result.id, undefined);
+  await result.response.arrayBuffer();
+  await ctx.flush();
+  assert.equal(env.IMAGES_CACHE.store.size, 0);
+});
+
+test('normalizeAudioCacheParams folds whitespace, case and speed', () => {
+  assert.deepEqual(
+    normalizeAudioCacheParams({ text: ' Hello   world ', voice: 'Nova', speed: '1.0' }),
+    normalizeAudioCacheParams({ text: 'Hello world', voice: 'nova', model: 'openai-audio' })
+  );
+  assert.equal(normalizeAudioCacheParams({ text: '   ' }), null);
+});
+
+test('parseByteRange handles open, suffix and unsatisfiable ranges', () => {
+  assert.deepEqual(parseByteRange('bytes=2-4', 10), { start: 2, end: 4 });
+  assert.deepEqual(parseByteRange('bytes=8-', 10), { start: 8, end: 9 });
+  assert.deepEqual(parseByteRange('bytes=-3', 10), { start: 7, end: 9 });
+  assert.deepEqual(parseByteRange('bytes=5-100', 10), { start: 5, end: 9 });
+  assert.deepEqual(parseByteRange('bytes=10-', 10), { unsatisfiable: true });
+  assert.equal(parseByteRange('bytes=0-1,4-5', 10), null);
+  assert.equal(parseByteRange(null, 10), null);
+});
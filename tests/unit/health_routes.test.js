@@ -0,0 +1,75 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { registerHealthRoutes } from '../../backend/routes/health.js';
+
+function collectRoutes() {
+  const routes = new Map();
+  registerHealthRoutes((route) => routes.set(`${route.method} ${route.path}`, route));
+  return routes;
+}
+
+function post(path, body, headers = {}) {
+  return new Request(`https://worker.example${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...headers },
+    body: JSON.stringify(body),
+  });
+}
+
+test('user migration route fails closed when no token is configured', async () => {
+  const route = collectRoutes().get('POST /internal/users/migrate');
+  let listed = 0;
+  const USERS = {
+    async get() {
+      return null;
+    },
+    async put() {},
+    async list() {
+      listed++;
+      return { keys: [], list_complete: true };
+    },
+  };
+
+  const denied = await route.handler({
+    request: post('/internal/users/migrate', {}),
+    env: { USERS, LOG_LEVEL: 'error' },
+  });
+  assert.equal(denied.status, 401);
+  assert.equal(listed, 0);
+
+  const env = { USERS, LOG_LEVEL: 'error', HEALTH_CHECK_TOKEN: 'secret' };
+  const wrongToken = await route.handler({
+    request: post('/internal/users/migrate', {}, { Authorization: 'Bearer nope' }),
+    env,
+  });
+  assert.equal(wrongToken.status, 401);
+
+  const allowed = await route.handler({
+    request: post('/internal/users/migrate', {}, { Authorization: 'Bearer secret' }),
+    env,
+  });
+  assert.equal(allowed.status, 200);
+  assert.equal(listed, 1);
+});
+
+test('prompt warm route fails closed when no token is configured', async () => {
+  const route = collectRoutes().get('POST /internal/prompts/warm');
+  const original = globalThis.fetch;
+  let upstreamCalls = 0;
+  globalThis.fetch = async () => {
+    upstreamCalls++;
+    throw new Error('unexpected upstream call');
+  };
+  try {
+    const response = await route.handler({
+      request: post('/internal/prompts/warm', { prompts: ['a cat'] }),
+      env: { LOG_LEVEL: 'error' },
+      ctx: { waitUntil() {} },
+    });
+    assert.equal(response.status, 401);
+    assert.equal(upstreamCalls, 0);
+  } finally {
+    globalThis.fetch = original;
+  }
+});
@@ -0,0 +1,125 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { getRetryTrace } from '../../backend/utils/fetch.js';
+import { fetchWithHedging, getHedgeStats, hedgedFetch } from '../../backend/utils/hedge.js';
+
+const ENV = {
+  LOG_LEVEL: 'error',
+  UPSTREAM_LIMITER_ENABLED: 'false',
+  HEDGE_ENABLED: 'true',
+  HEDGE_DELAY_MS: '10',
+  HEDGE_MAX_RATE: '1',
+};
+
+function pendingUntilAborted(signal) {
+  return new Promise((_, reject) => {
+    signal.addEventListener('abort', () => reject(new Error('aborted')));
+  });
+}
+
+test('hedgedFetch returns the hedge when the primary is slow and aborts the primary', async () => {
+  const signals = [];
+  const response = await hedgedFetch(ENV, 'Hedge Slow API', async (signal) => {
+    signals.push(signal);
+    if (signals.length === 1) return pendingUntilAborted(signal);
+    return new Response('hedge');
+  });
+  assert.equal(await response.text(), 'hedge');
+  assert.equal(signals.length, 2);
+  assert.equal(signals[0].aborted, true);
+  assert.equal(signals[1].aborted, false);
+  assert.equal(getHedgeStats()['Hedge Slow API'].hedgeWins, 1);
+});
+
+test('hedgedFetch does not hedge fast requests or when the rate cap is reached', async () => {
+  let calls = 0;
+  const fast = await hedgedFetch(ENV, 'Hedge Fast API', async () => {
+    calls += 1;
+    return new Response('fast');
+  });
+  assert.equal(await fast.text(), 'fast');
+  assert.equal(calls, 1);
+
+  const capped = { ...ENV, HEDGE_MAX_RATE: '0' };
+  calls = 0;
+  const slow = await hedgedFetch(capped, 'Hedge Capped API', async () => {
+    calls += 1;
+    await new Promise((resolve) => setTimeout(resolve, 30));
+    return new Response('slow');
+  });
+  assert.equal(await slow.text(), 'slow');
+  assert.equal(calls, 1);
+  assert.equal(getHedgeStats()['Hedge Capped API'].capped, 1);
+});
+
+test('hedgedFetch keeps waiting when the first response is an upstream error', async () => {
+  let calls = 0;
+  const response = await hedgedFetch(ENV, 'Hedge Error API', async () => {
+    calls += 1;
+    if (calls === 1) {
+      await new Promise((resolve) => setTimeout(resolve, 50));
+      return new Response('ok');
+    }
+    return new Response('busy', { status: 503 });
+  });
+  assert.equal(response.status, 200);
+  assert.equal(await response.text(), 'ok');
+  assert.equal(getHedgeStats()['Hedge Error API'].primaryWins, 1);
+
+  // 两者都失败时返回失败响应
+  calls = 0;
+  const failed = await hedgedFetch(ENV, 'Hedge Error API', async () => {
+    calls += 1;
+    if (calls === 1) {
+      await new Promise((resolve) => setTimeout(resolve, 30));
+      return new Response('limited', { status: 429 });
+    }
+    throw new Error('network down');
+  });
+  assert.equal(failed.status, 429);
+});
+
+test('hedge allowance lets a low-traffic isolate hedge once per window', async () => {
+  const env = { ...ENV, HEDGE_MAX_RATE: '0.05' };
+  const slow = async (signal) => {
+    await new Promise((resolve) => setTimeout(resolve, 30));
+    if (signal.aborted) throw new Error('aborted');
+    return new Response('slow');
+  };
+  await hedgedFetch(env, 'Hedge Quiet API', slow);
+  await hedgedFetch(env, 'Hedge Quiet API', slow);
+  const stats = getHedgeStats()['Hedge Quiet API'];
+  assert.equal(stats.triggered, 1);
+  assert.equal(stats.capped, 1);
+});
+
+test('fetchWithHedging hedges a single attempt and samples per-attempt latency', async (t) => {
+  const original = globalThis.fetch;
+  const signals = [];
+  const statuses = [503, 'hang', 200];
+  globalThis.fetch = async (url, options) => {
+    signals.push(options.signal);
+    const next = statuses.shift();
+    if (next === 'hang') return pendingUntilAborted(options.signal);
+    return new Response(String(next), { status: next });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+
+  const response = await fetchWithHedging('https://up.test', {}, 'Hedge Retry API', ENV, {
+    hedge: true,
+    initialDelayMs: 1,
+  });
+  assert.equal(await response.text(), '200');
+  // 第一次尝试 503 后重试；第二次尝试的主请求挂起，由对冲请求完成，没有再占用一次重试
+  assert.deepEqual(
+    getRetryTrace(response).attempts.map((a) => a.status),
+    [503, 200]
+  );
+  assert.equal(signals.length, 3);
+  assert.equal(signals[1].aborted, true);
+  // 只有单次尝试的响应头耗时进入样本：503 那次；挂起的主请求被取消，不计入
+  assert.equal(getHedgeStats()['Hedge Retry API'].samples, 1);
+});
@@ -0,0 +1,79 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  createImageVariant,
+  negotiateImageFormat,
+  readThumbnailSizes,
+} from '../../backend/services/image_variants.js';
+
+const ENV = { LOG_LEVEL: 'error', GENERATION_CACHE_MEMORY_MB: '1' };
+
+function accept(value) {
+  return new Request('https://example.test/', { headers: { Accept: value } });
+}
+
+function fakeImages(calls) {
+  return {
+    input(stream) {
+      const op = { transforms: [] };
+      calls.push(op);
+      const pipeline = {
+        transform(options) {
+          op.transforms.push(options);
+          return pipeline;
+        },
+        async output(options) {
+          op.output = options;
+          const bytes = await new Response(stream).arrayBuffer();
+          return {
+            response: () =>
+              new Response(bytes.slice(0, 2), { headers: { 'Content-Type': options.format } }),
+          };
+        },
+      };
+      return pipeline;
+    },
+  };
+}
+
+test('negotiateImageFormat honours explicit Accept entries and q values', () => {
+  assert.equal(negotiateImageFormat(accept('image/avif,image/webp,*/*'), ENV), 'image/avif');
+  assert.equal(negotiateImageFormat(accept('image/avif;q=0.5,image/webp'), ENV), 'image/webp');
+  assert.equal(negotiateImageFormat(accept('image/*,*/*;q=0.8'), ENV), null);
+  assert.equal(
+    negotiateImageFormat(accept('image/avif,image/webp'), { IMAGE_OUTPUT_FORMATS: 'webp' }),
+    'image/webp'
+  );
+});
+
+test('readThumbnailSizes parses the configured names', () => {
+  assert.deepEqual(readThumbnailSizes({}), { thumb: 256, preview: 512 });
+  assert.deepEqual(readThumbnailSizes({ IMAGE_THUMBNAIL_SIZES: 'small:128, bad, big:x' }), {
+    small: 128,
+  });
+});
+
+test('createImageVariant passes through without IMAGES and caches by content', async () => {
+  const source = new Uint8Array([1, 2, 3, 4]).buffer;
+  const passthrough = await createImageVariant(ENV, null, source, {
+    width: 256,
+    format: 'image/webp',
+    contentType: 'image/jpeg',
+  });
+  assert.equal(passthrough.variant, 'original');
+  assert.equal(passthrough.contentType, 'image/jpeg');
+
+  const calls = [];
+  const env = { ...ENV, IMAGES: fakeImages(calls) };
+  const spec = { width: 256, format: 'image/webp', contentType: 'image/jpeg' };
+  const first = await createImageVariant(env, null, source, spec);
+  await new Promise((resolve) => setTimeout(resolve, 0));
+  const second = await createImageVariant(env, null, source.slice(0), spec);
+
+  assert.equal(first.variant, 'miss');
+  assert.equal(second.variant, 'hit');
+  assert.equal(second.contentType, 'image/webp');
+  assert.equal(calls.length, 1);
+  assert.deepEqual(calls[0].transforms, [{ width: 256, fit: 'scale-down' }]);
+});
@@ -0,0 +1,124 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  createJob,
+  getJob,
+  getJobResult,
+  handleJobQueueBatch,
+  readJobStatus,
+  runJob,
+} from '../../backend/services/jobs.js';
+
+function createKv() {
+  const store = new Map();
+  return {
+    store,
+    async get(key, type) {
+      const entry = store.get(key);
+      if (!entry) return null;
+      return type === 'json' ? JSON.parse(entry.value) : entry.value;
+    },
+    async getWithMetadata(key) {
+      const entry = store.get(key);
+      if (!entry) return { value: null, metadata: null };
+      return { value: entry.value, metadata: entry.metadata };
+    },
+    async put(key, value, options = {}) {
+      store.set(key, { value, metadata: options.metadata });
+    },
+  };
+}
+
+test('jobs run in the background and store their result once', async (t) => {
+  let upstreamCalls = 0;
+  const original = globalThis.fetch;
+  globalThis.fetch = async () => {
+    upstreamCalls++;
+    return new Response(new Uint8Array([1, 2, 3]), { headers: { 'Content-Type': 'image/png' } });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+
+  const env = {
+    JOBS: createKv(),
+    LOG_LEVEL: 'error',
+    POLLINATIONS_API_TOKEN: 'token',
+    UPSTREAM_LIMITER_ENABLED: 'false',
+    GENERATION_CACHE_ENABLED: 'false',
+  };
+  const pending = [];
+  const ctx = { waitUntil: (promise) => pending.push(promise) };
+
+  const job = await createJob(env, ctx, { type: 'image', params: { text: 'cat' } });
+  assert.equal(job.status, 'PENDING');
+  await Promise.all(pending);
+
+  const stored = await getJob(env, job.id);
+  assert.equal(stored.status, 'SUCCESS');
+  assert.equal(stored.result.content_type, 'image/png');
+  const result = await getJobResult(env, job.id);
+  assert.deepEqual(new Uint8Array(result.bytes), new Uint8Array([1, 2, 3]));
+
+  // 队列重复投递时不会重复生成
+  await runJob(env, ctx, job.id);
+  assert.equal(upstreamCalls, 1);
+});
+
+test('status reads report jobs stuck in RUNNING as timed out', async () => {
+  const env = { JOBS: createKv(), LOG_LEVEL: 'error', JOB_TIMEOUT_SECONDS: '60' };
+  const now = Date.now();
+  const stuck = { id: 'stuck', type: 'image', status: 'RUNNING', created_at: now - 90000 };
+  await env.JOBS.put('JOB:stuck', JSON.stringify({ ...stuck, started_at: now - 90000 }));
+  await env.JOBS.put('JOB:busy', JSON.stringify({ ...stuck, id: 'busy', started_at: now - 1000 }));
+
+  const timedOut = await readJobStatus(env, 'stuck');
+  assert.equal(timedOut.status, 'FAILURE');
+  assert.equal(timedOut.timed_out, true);
+  assert.equal((await getJob(env, 'stuck')).status, 'FAILURE');
+  assert.equal((await readJobStatus(env, 'busy')).status, 'RUNNING');
+});
+
+test('queue mode hands retryable failures back to the queue until the last attempt', async (t) => {
+  const original = globalThis.fetch;
+  globalThis.fetch = async () => new Response('busy', { status: 503 });
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+
+  const sent = [];
+  const env = {
+    JOBS: createKv(),
+    GENERATION_QUEUE: { send: async (body) => sent.push(body) },
+    LOG_LEVEL: 'error',
+    POLLINATIONS_API_TOKEN: 'token',
+    UPSTREAM_LIMITER_ENABLED: 'false',
+    GENERATION_CACHE_ENABLED: 'false',
+    CIRCUIT_BREAKER_ENABLED: 'false',
+    RETRY_MAX_ATTEMPTS: '1',
+    JOB_QUEUE_MAX_RETRIES: '1',
+  };
+  const job = await createJob(env, { waitUntil() {} }, { type: 'image', params: { text: 'cat' } });
+  assert.deepEqual(sent, [{ jobId: job.id }]);
+
+  const deliver = async (attempts) => {
+    const outcome = [];
+    const message = {
+      body: { jobId: job.id },
+      attempts,
+      ack: () => outcome.push('ack'),
+      retry: () => outcome.push('retry'),
+    };
+    await handleJobQueueBatch({ messages: [message] }, env, { waitUntil() {} });
+    return outcome;
+  };
+
+  assert.deepEqual(await deliver(1), ['retry']);
+  assert.equal((await getJob(env, job.id)).status, 'PENDING');
+  // 队列模式下排队中的任务不按超时处理
+  assert.equal((await readJobStatus(env, job.id)).status, 'PENDING');
+
+  assert.deepEqual(await deliver(2), ['ack']);
+  assert.equal((await getJob(env, job.id)).status, 'FAILURE');
+});
@@ -0,0 +1,30 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { LruCache } from '../../backend/utils/lru.js';
+
+test('LruCache evicts the least recently used entry past the byte budget', () => {
+  const cache = new LruCache({ maxBytes: 10, sizeOf: (v) => v.length });
+  cache.set('a', 'aaaa');
+  cache.set('b', 'bbbb');
+  assert.equal(cache.get('a'), 'aaaa');
+  cache.set('c', 'cccc');
+  assert.equal(cache.has('b'), false);
+  assert.equal(cache.get('a'), 'aaaa');
+  assert.equal(cache.bytes, 8);
+  assert.equal(cache.set('huge', 'x'.repeat(11)), false);
+  assert.equal(cache.stats.evictions, 1);
+});
+
+test('LruCache honours maxEntries and TTL', async () => {
+  const cache = new LruCache({ maxEntries: 2, ttlMs: 20 });
+  cache.set('a', 1);
+  cache.set('b', 2);
+  cache.set('c', 3);
+  assert.equal(cache.size, 2);
+  assert.equal(cache.get('a'), undefined);
+  cache.set('d', 4, { ttlMs: 0 });
+  await new Promise((resolve) => setTimeout(resolve, 30));
+  assert.equal(cache.get('c'), undefined);
+  assert.equal(cache.get('d'), 4);
+});
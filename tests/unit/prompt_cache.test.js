@@ -0,0 +1,56 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  buildPromptCacheKey,
+  getPromptCacheStats,
+  optimizePromptCached,
+} from '../../backend/services/prompt_cache.js';
+
+const ENV = {
+  LOG_LEVEL: 'error',
+  DEEPSEEK_API_KEY: 'test-key',
+  UPSTREAM_LIMITER_ENABLED: 'false',
+};
+
+function stubCompletion(t, content) {
+  let calls = 0;
+  const original = globalThis.fetch;
+  globalThis.fetch = async () => {
+    calls += 1;
+    return Response.json({ choices: [{ message: { content } }] });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+  return () => calls;
+}
+
+test('buildPromptCacheKey folds whitespace and case but separates models', async () => {
+  const a = await buildPromptCacheKey(ENV, '  一只  Cat ');
+  const b = await buildPromptCacheKey(ENV, '一只 cat');
+  const c = await buildPromptCacheKey({ ...ENV, DEEPSEEK_MODEL: 'other' }, '一只 cat');
+  assert.equal(a, b);
+  assert.notEqual(a, c);
+});
+
+test('optimizePromptCached serves repeats from cache without calling the LLM', async (t) => {
+  const calls = stubCompletion(t, 'a cute cat, best quality');
+  const first = await optimizePromptCached('可爱的猫 unique-1', ENV, null);
+  const second = await optimizePromptCached('可爱的猫   UNIQUE-1', ENV, null);
+
+  assert.equal(first.cache, 'miss');
+  assert.equal(second.cache, 'hit');
+  assert.equal(second.result.optimized_text, 'a cute cat, best quality');
+  assert.equal(second.result.original_prompt, '可爱的猫   UNIQUE-1');
+  assert.equal(calls(), 1);
+  assert.ok(getPromptCacheStats().hits >= 1);
+});
+
+test('optimizePromptCached does not cache failed optimizations', async (t) => {
+  const calls = stubCompletion(t, '');
+  await optimizePromptCached('空结果 unique-2', ENV, null);
+  const again = await optimizePromptCached('空结果 unique-2', ENV, null);
+  assert.equal(again.cache, 'miss');
+  assert.equal(calls(), 2);
+});
@@ -0,0 +1,160 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { getCircuitStats, resetCircuits } from '../../backend/utils/circuit_breaker.js';
+import { fetchWithRetry } from '../../backend/utils/fetch.js';
+import {
+  getProviderStats,
+  pickEndpoint,
+  resetProviderStats,
+  routeUpstream,
+} from '../../backend/services/provider_router.js';
+
+const ENV = {
+  LOG_LEVEL: 'error',
+  POLLINATIONS_PROVIDERS: JSON.stringify({
+    default: ['https://a.test', 'https://b.test/'],
+    solo: ['https://solo.test'],
+  }),
+  ROUTER_BREAKER_FAILURES: '2',
+  ROUTER_BREAKER_COOLDOWN_MS: '60000',
+};
+
+function failure(status) {
+  const error = new Error(`HTTP ${status}`);
+  error.status = status;
+  return error;
+}
+
+test('routeUpstream fails over to another endpoint and limits per-endpoint attempts', async () => {
+  resetProviderStats();
+  const calls = [];
+  const response = await routeUpstream(ENV, 'flux', async (base, routing) => {
+    calls.push({ base, routing });
+    if (calls.length === 1) throw failure(503);
+    return new Response('ok');
+  });
+  assert.equal(await response.text(), 'ok');
+  assert.equal(calls.length, 2);
+  assert.notEqual(calls[0].base, calls[1].base);
+  assert.deepEqual(calls[0].routing, {
+    maxAttempts: 2,
+    budgetMs: undefined,
+    circuitScope: calls[0].base,
+  });
+});
+
+test('routeUpstream shares one budget across endpoints', async () => {
+  resetProviderStats();
+  const calls = [];
+  await assert.rejects(
+    routeUpstream(
+      ENV,
+      'flux',
+      async (base, routing) => {
+        calls.push(routing.budgetMs);
+        await new Promise((resolve) => setTimeout(resolve, 60));
+        throw failure(503);
+      },
+      { budgetMs: 100 }
+    ),
+    /HTTP 503/
+  );
+  assert.equal(calls.length, 2);
+  assert.ok(calls[0] > 90);
+  assert.ok(calls[1] <= 45, `second endpoint got ${calls[1]}ms`);
+
+  resetProviderStats();
+  let tries = 0;
+  await assert.rejects(
+    routeUpstream(
+      ENV,
+      'flux',
+      async () => {
+        tries += 1;
+        await new Promise((resolve) => setTimeout(resolve, 30));
+        throw failure(503);
+      },
+      { budgetMs: 20 }
+    ),
+    /HTTP 503/
+  );
+  assert.equal(tries, 1);
+});
+
+test('a failing endpoint opens only its own circuit, not the whole API', async (t) => {
+  resetCircuits();
+  t.mock.method(Math, 'random', () => 0);
+  const env = {
+    ...ENV,
+    UPSTREAM_LIMITER_ENABLED: 'false',
+    ROUTER_ATTEMPTS_PER_ENDPOINT: '1',
+    ROUTER_BREAKER_FAILURES: '100',
+    CIRCUIT_MIN_REQUESTS: '2',
+    CIRCUIT_ERROR_RATE: '0.5',
+  };
+  const send = async (url) =>
+    url.startsWith('https://a.test')
+      ? new Response('down', { status: 503 })
+      : new Response('ok', { status: 200 });
+  for (let i = 0; i < 4; i++) {
+    // 每轮重置路由统计，保证先选中坏端点 a
+    resetProviderStats();
+    const response = await routeUpstream(env, 'flux', (base, routing) =>
+      fetchWithRetry(`${base}/image`, {}, 'Router API', env, { ...routing, send })
+    );
+    assert.equal(await response.text(), 'ok');
+  }
+  const stats = await getCircuitStats(env, ['Router API']);
+  assert.equal(stats['Router API'].state, 'closed');
+  assert.equal(stats['Router API @ https://a.test'].state, 'open');
+  assert.equal(stats['Router API @ https://b.test'].state, 'closed');
+  assert.equal(stats['Router API @ https://b.test'].failures, 0);
+});
+
+test('routeUpstream does not fail over on client errors', async () => {
+  resetProviderStats();
+  let calls = 0;
+  await assert.rejects(
+    routeUpstream(ENV, 'flux', async () => {
+      calls += 1;
+      throw failure(400);
+    }),
+    /HTTP 400/
+  );
+  assert.equal(calls, 1);
+});
+
+test('endpoints open their breaker after repeated failures and are skipped', async () => {
+  resetProviderStats();
+  const onlyA = { ...ENV, POLLINATIONS_PROVIDERS: JSON.stringify({ default: ['https://a.test'] }) };
+  for (let i = 0; i < 2; i++) {
+    await assert.rejects(
+      routeUpstream(onlyA, 'flux', async () => {
+        throw failure(502);
+      })
+    );
+  }
+  const [a] = getProviderStats(onlyA).endpoints;
+  assert.equal(a.base, 'https://a.test');
+  assert.equal(a.state, 'open');
+  for (let i = 0; i < 10; i++) {
+    assert.equal(pickEndpoint(ENV, ['https://a.test', 'https://b.test']), 'https://b.test');
+  }
+});
+
+test('pickEndpoint prefers the endpoint with lower EWMA latency', async () => {
+  resetProviderStats();
+  const delays = { 'https://a.test': 40, 'https://b.test': 1 };
+  for (const [base, ms] of Object.entries(delays)) {
+    const env = { ...ENV, POLLINATIONS_PROVIDERS: JSON.stringify({ default: [base] }) };
+    await routeUpstream(
+      env,
+      'x',
+      () => new Promise((resolve) => setTimeout(() => resolve(new Response('ok')), ms))
+    );
+  }
+  for (let i = 0; i < 10; i++) {
+    assert.equal(pickEndpoint(ENV, ['https://a.test', 'https://b.test']), 'https://b.test');
+  }
+});
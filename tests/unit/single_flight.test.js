@@ -0,0 +1,92 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  getInflightCount,
+  singleFlightBytes,
+  singleFlightResponse,
+} from '../../backend/utils/single_flight.js';
+
+test('singleFlightResponse coalesces concurrent calls into one upstream request', async () => {
+  let calls = 0;
+  const produce = async () => {
+    calls++;
+    await new Promise((resolve) => setTimeout(resolve, 10));
+    return new Response(new Uint8Array([1, 2, 3]), { headers: { 'Content-Type': 'image/png' } });
+  };
+
+  const results = await Promise.all([
+    singleFlightResponse('k1', produce),
+    singleFlightResponse('k1', produce),
+    singleFlightResponse('k1', produce),
+  ]);
+
+  assert.equal(calls, 1);
+  assert.deepEqual(
+    results.map((r) => r.leader),
+    [true, false, false]
+  );
+  for (const { response } of results) {
+    assert.equal(response.headers.get('Content-Type'), 'image/png');
+    assert.deepEqual(new Uint8Array(await response.arrayBuffer()), new Uint8Array([1, 2, 3]));
+  }
+
+  await singleFlightResponse('k1', produce);
+  assert.equal(calls, 2, 'settled flights must not be reused');
+});
+
+test('singleFlightBytes hands followers an independent copy and propagates errors', async () => {
+  const [a, b] = await Promise.all([
+    singleFlightBytes('k2', async () => new Uint8Array([5, 6]).buffer),
+    singleFlightBytes('k2', async () => new Uint8Array([0]).buffer),
+  ]);
+  assert.notEqual(a.bytes, b.bytes);
+  assert.deepEqual(new Uint8Array(b.bytes), new Uint8Array([5, 6]));
+
+  const failing = () =>
+    singleFlightResponse('k3', async () => {
+      throw new Error('upstream down');
+    });
+  await assert.rejects(Promise.all([failing(), failing()]), /upstream down/);
+});
+
+test('singleFlightResponse only aborts upstream once every participant has cancelled', async () => {
+  let upstreamSignal;
+  const produce = ({ signal }) =>
+    new Promise((resolve, reject) => {
+      upstreamSignal = signal;
+      signal.addEventListener('abort', () => reject(signal.reason));
+    });
+  const first = new AbortController();
+  const second = new AbortController();
+  const a = singleFlightResponse('k-abort', produce, { signal: first.signal });
+  const b = singleFlightResponse('k-abort', produce, { signal: second.signal });
+  await new Promise((resolve) => setImmediate(resolve));
+
+  first.abort();
+  await assert.rejects(a);
+  assert.equal(upstreamSignal.aborted, false);
+
+  second.abort();
+  await assert.rejects(b);
+  assert.equal(upstreamSignal.aborted, true);
+});
+
+test('singleFlightResponse passes the upstream body through when nobody joins', async () => {
+  const upstream = new Response(new Uint8Array([4, 5]), {
+    headers: { 'Content-Type': 'audio/mpeg' },
+  });
+  let teed = false;
+  const originalTee = upstream.body.tee;
+  upstream.body.tee = (...args) => {
+    teed = true;
+    return originalTee.apply(upstream.body, args);
+  };
+
+  const { response, leader } = await singleFlightResponse('k-solo', async () => upstream);
+  assert.equal(leader, true);
+  assert.equal(response, upstream);
+  assert.equal(teed, false);
+  assert.equal(getInflightCount(), 0);
+  assert.deepEqual(new Uint8Array(await response.arrayBuffer()), new Uint8Array([4, 5]));
+});
@@ -0,0 +1,152 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  estimateTokens,
+  optimizePromptBatch,
+  packByTokenBudget,
+  translateNegativePromptBatch,
+} from '../../backend/services/translate.js';
+import { registerTranslateRoutes } from '../../backend/routes/translate.js';
+import {
+  resetTranslationMemory,
+  translateNegativePromptsWithMemory,
+} from '../../backend/services/translation_memory.js';
+
+const ENV = {
+  LOG_LEVEL: 'error',
+  DEEPSEEK_API_KEY: 'test-key',
+  UPSTREAM_LIMITER_ENABLED: 'false',
+};
+
+function stubCompletion(t, reply) {
+  const prompts = [];
+  const original = globalThis.fetch;
+  globalThis.fetch = async (_url, init) => {
+    const prompt = JSON.parse(init.body).messages[0].content;
+    prompts.push(prompt);
+    const packed = prompt.match(/\n(\[\{"id".*\])$/);
+    const content = reply(packed ? JSON.parse(packed[1]) : null, prompt);
+    return Response.json({ choices: [{ message: { content } }] });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+  return prompts;
+}
+
+test('packByTokenBudget respects the token budget and item cap', () => {
+  const texts = ['一二三四五六七八九十', 'abcd', '一二三四五六七八九十', 'x'];
+  const outputTokens = () => 10;
+  const costs = texts.map((text) => estimateTokens(text) + 8 + 10);
+  assert.deepEqual(costs, [28, 19, 28, 19]);
+  assert.deepEqual(packByTokenBudget(texts, { budget: 50, maxItems: 10, outputTokens }), [
+    [0, 1],
+    [2, 3],
+  ]);
+  assert.deepEqual(packByTokenBudget(texts, { budget: 1000, maxItems: 3, outputTokens }), [
+    [0, 1, 2],
+    [3],
+  ]);
+  // 单条超出预算时独占一包
+  assert.deepEqual(packByTokenBudget(['a'], { budget: 1, maxItems: 3, outputTokens }), [[0]]);
+});
+
+test('translateNegativePromptBatch packs items into one call and dedupes repeats', async (t) => {
+  const prompts = stubCompletion(t, (items) =>
+    JSON.stringify(items.map(({ id, text }) => ({ id, result: `en:${text}` })))
+  );
+  const { results, stats } = await translateNegativePromptBatch(['模糊', '水印', '模糊'], ENV);
+  assert.equal(prompts.length, 1);
+  assert.deepEqual(
+    results.map((result) => result.translated_text),
+    ['en:模糊', 'en:水印', 'en:模糊']
+  );
+  assert.deepEqual(stats, { packs: 1, llm_calls: 1, fallbacks: 0 });
+});
+
+test('optimizePromptBatch falls back per item when the packed reply is incomplete', async (t) => {
+  const prompts = stubCompletion(t, (items) =>
+    items
+      ? '```json\n' + JSON.stringify([{ id: 1, result: '好的 a dog, masterpiece' }]) + '\n```'
+      : 'a cat, best quality'
+  );
+  const { results, stats } = await optimizePromptBatch(['猫', '狗'], ENV);
+  assert.equal(results[0].optimized_text, 'a cat, best quality');
+  assert.equal(results[1].optimized_text, 'a dog, masterpiece');
+  assert.equal(results[1].original_prompt, '狗');
+  assert.deepEqual(stats, { packs: 1, llm_calls: 2, fallbacks: 1 });
+  assert.equal(prompts.length, 2);
+});
+
+test('batch routes charge quota per packed call and reject before calling upstream', async (t) => {
+  const prompts = stubCompletion(t, (items) =>
+    JSON.stringify(items.map(({ id, text }) => ({ id, result: `en ${text}` })))
+  );
+  const routes = new Map();
+  registerTranslateRoutes((route) => routes.set(route.path, route));
+  const route = routes.get('/api/translate/batch');
+  t.after(resetTranslationMemory);
+
+  const store = new Map();
+  const USERS = {
+    async get(key) {
+      return store.has(key) ? JSON.parse(store.get(key)) : null;
+    },
+    async put(key, value) {
+      store.set(key, value);
+    },
+  };
+  const env = { ...ENV, USERS, LLM_BATCH_MAX_ITEMS: '2' };
+  const call = (texts) =>
+    route.handler({
+      request: new Request('https://worker.example/api/translate/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'CF-Connecting-IP': '203.0.113.7' },
+        body: JSON.stringify({ texts }),
+      }),
+      env,
+      ctx: { waitUntil() {} },
+    });
+
+  // 4 条不同文本、每包最多 2 条：扣 2 次额度，而不是 1 次请求或 4 条文本
+  const ok = await call(['红眼睛', '紫色头发', '红眼睛', '绿色天空', '蓝色皮肤']);
+  assert.equal(ok.status, 200);
+  const usageKey = [...store.keys()].find((key) => key.startsWith('USAGE:anon:'));
+  assert.equal(JSON.parse(store.get(usageKey)).used, 2);
+  assert.equal(prompts.length, 2);
+
+  // 匿名每日 10 次额度，剩余 8 次不够 10 包
+  const texts = Array.from({ length: 20 }, (_, i) => `文本${i}`);
+  const denied = await call(texts);
+  assert.equal(denied.status, 402);
+  assert.equal(prompts.length, 2);
+});
+
+test('batch translation answers from translation memory and remembers new phrases', async (t) => {
+  const prompts = stubCompletion(t, (items) =>
+    JSON.stringify(items.map(({ id, text }) => ({ id, result: `en ${text}` })))
+  );
+  t.after(resetTranslationMemory);
+
+  const first = await translateNegativePromptsWithMemory(
+    ['模糊，红眼睛', '红眼睛、绿色天空', 'bad hands'],
+    ENV,
+    null
+  );
+  // 重复的未知短语只翻译一次，词典短语与英文短语不进入 LLM
+  assert.equal(prompts.length, 1);
+  assert.match(prompts[0], /"红眼睛"/);
+  assert.doesNotMatch(prompts[0], /模糊|bad hands/);
+  assert.deepEqual(
+    first.results.map((result) => result.translated_text),
+    ['blurry, en 红眼睛', 'en 红眼睛, en 绿色天空', 'bad hands']
+  );
+  assert.equal(first.stats.memory_hits, 1);
+  assert.equal(first.stats.llm_phrases, 2);
+
+  const second = await translateNegativePromptsWithMemory(['绿色天空，红眼睛'], ENV, null);
+  assert.equal(prompts.length, 1);
+  assert.equal(second.results[0].translated_text, 'en 绿色天空, en 红眼睛');
+  assert.equal(second.stats.llm_calls, 0);
+});
@@ -0,0 +1,76 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  createEnglishFilter,
+  streamOptimizePromptWithDeepseek,
+} from '../../backend/services/translate.js';
+
+const ENV = {
+  LOG_LEVEL: 'error',
+  DEEPSEEK_API_KEY: 'test-key',
+  UPSTREAM_LIMITER_ENABLED: 'false',
+};
+
+const ENGLISH_PATTERN = /[a-zA-Z0-9\s.,!?'":;()[\]{}<>#@$%^&*+=_\\|/~-]+/g;
+
+function filterAll(text, chunkSize) {
+  const filter = createEnglishFilter();
+  let out = '';
+  for (let i = 0; i < text.length; i += chunkSize) {
+    out += filter.push(text.slice(i, i + chunkSize));
+  }
+  return out;
+}
+
+test('createEnglishFilter matches the batch English extraction for any chunking', () => {
+  const samples = [
+    'a cute cat, best quality',
+    '  好的：a cat （猫） sitting  on 草地 , masterpiece  ',
+    '优化结果：\n\nportrait of a girl, 4k\n说明：以上',
+    '全部是中文',
+  ];
+  for (const sample of samples) {
+    const expected = (sample.match(ENGLISH_PATTERN) || []).join(' ').trim();
+    for (const size of [1, 2, 3, 7, 100]) {
+      assert.equal(filterAll(sample, size), expected, `${JSON.stringify(sample)} / ${size}`);
+    }
+  }
+});
+
+test('streamOptimizePromptWithDeepseek relays filtered deltas as they arrive', async (t) => {
+  const original = globalThis.fetch;
+  let payload;
+  globalThis.fetch = async (_url, init) => {
+    payload = JSON.parse(init.body);
+    const tokens = ['好的：', 'a cute', ' cat', '，', 'best quality'];
+    const lines = tokens
+      .map((content) => `data: ${JSON.stringify({ choices: [{ delta: { content } }] })}\n\n`)
+      .concat('data: [DONE]\n\n');
+    const encoder = new TextEncoder();
+    const body = new ReadableStream({
+      start(controller) {
+        // 故意把 SSE 行切碎，模拟网络分包
+        const raw = lines.join('');
+        for (let i = 0; i < raw.length; i += 5) {
+          controller.enqueue(encoder.encode(raw.slice(i, i + 5)));
+        }
+        controller.close();
+      },
+    });
+    return new Response(body, { headers: { 'Content-Type': 'text/event-stream' } });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+
+  const deltas = [];
+  const result = await streamOptimizePromptWithDeepseek('可爱的猫', ENV, {
+    onDelta: (text) => deltas.push(text),
+  });
+  assert.equal(payload.stream, true);
+  assert.equal(result.optimized_text, 'a cute cat best quality');
+  assert.equal(result.raw_optimized, '好的：a cute cat，best quality');
+  assert.equal(deltas.join(''), result.optimized_text);
+  assert.ok(deltas.length > 1);
+});
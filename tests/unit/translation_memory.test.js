@@ -0,0 +1,72 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  resetTranslationMemory,
+  splitNegativePhrases,
+  translateNegativePromptWithMemory,
+} from '../../backend/services/translation_memory.js';
+
+const ENV = {
+  LOG_LEVEL: 'error',
+  DEEPSEEK_API_KEY: 'test-key',
+  UPSTREAM_LIMITER_ENABLED: 'false',
+};
+
+function stubCompletion(t, reply) {
+  const prompts = [];
+  const original = globalThis.fetch;
+  globalThis.fetch = async (_url, init) => {
+    const prompt = JSON.parse(init.body).messages[0].content;
+    prompts.push(prompt);
+    return Response.json({ choices: [{ message: { content: reply(prompt) } }] });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+    resetTranslationMemory();
+  });
+  return prompts;
+}
+
+test('splitNegativePhrases splits on Chinese and ASCII separators', () => {
+  assert.deepEqual(splitNegativePhrases('模糊，低质量、 水印;\nbad hands,'), [
+    '模糊',
+    '低质量',
+    '水印',
+    'bad hands',
+  ]);
+});
+
+test('known phrases are answered without calling the LLM', async (t) => {
+  const prompts = stubCompletion(t, () => '[]');
+  const result = await translateNegativePromptWithMemory('模糊，低质量, bad hands', ENV, null);
+  assert.equal(prompts.length, 0);
+  assert.equal(result.translated_text, 'blurry, low quality, bad hands');
+  assert.equal(result.memory_hits, 2);
+});
+
+test('unknown phrases go out in one batch and are remembered', async (t) => {
+  const prompts = stubCompletion(t, () => '```json\n["red eyes", "green sky"]\n```');
+  const first = await translateNegativePromptWithMemory('红眼睛，模糊，绿色天空', ENV, null);
+  assert.equal(first.translated_text, 'red eyes, blurry, green sky');
+  assert.equal(first.llm_phrases, 2);
+  assert.equal(prompts.length, 1);
+  assert.match(prompts[0], /"红眼睛","绿色天空"/);
+
+  const second = await translateNegativePromptWithMemory('绿色天空、红眼睛', ENV, null);
+  assert.equal(second.translated_text, 'green sky, red eyes');
+  assert.equal(prompts.length, 1);
+});
+
+test('falls back to whole-text translation when the batch reply does not line up', async (t) => {
+  const prompts = stubCompletion(t, (prompt) =>
+    prompt.includes('JSON') ? '["only one"]' : 'purple hair, blurry, orange nose'
+  );
+  const result = await translateNegativePromptWithMemory('紫色头发，模糊，橙色鼻子', ENV, null);
+  assert.equal(result.translated_text, 'purple hair, blurry, orange nose');
+  assert.equal(prompts.length, 2);
+
+  const again = await translateNegativePromptWithMemory('紫色头发', ENV, null);
+  assert.equal(again.llm_phrases, 1);
+  assert.equal(prompts.length, 3);
+});
@@ -0,0 +1,72 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  createSpeechStream,
+  splitTextForSpeech,
+  stripId3v2,
+} from '../../backend/services/tts_stream.js';
+
+test('splitTextForSpeech splits at sentence boundaries without losing text', () => {
+  const text = 'Pi is 3.14 ok. Next one! 第二句。第三句？最后';
+  const segments = splitTextForSpeech(text, 20);
+  assert.deepEqual(segments, ['Pi is 3.14 ok.', 'Next one! 第二句。第三句？', '最后']);
+  assert.equal(segments.join('').replace(/\s/g, ''), text.replace(/\s/g, ''));
+});
+
+test('splitTextForSpeech breaks long sentences at commas and keeps segments speakable', () => {
+  const segments = splitTextForSpeech('这是一个很长的句子，包含逗号，还有更多内容，继续写下去。', 15);
+  assert.ok(segments.length > 1);
+  assert.ok(segments.every((s) => s.length <= 15));
+  assert.deepEqual(splitTextForSpeech('Three four!', 10), ['Three four!']);
+});
+
+test('stripId3v2 removes a leading ID3v2 tag only', () => {
+  const tagged = new Uint8Array([0x49, 0x44, 0x33, 3, 0, 0, 0, 0, 0, 2, 9, 9, 0xff, 0xfb]);
+  assert.deepEqual([...stripId3v2(tagged)], [0xff, 0xfb]);
+  const plain = new Uint8Array([0xff, 0xfb, 1]);
+  assert.equal(stripId3v2(plain), plain);
+});
+
+test('createSpeechStream serves repeated segments from the generation cache', async (t) => {
+  const original = globalThis.fetch;
+  const inputs = [];
+  globalThis.fetch = async (url, init) => {
+    const { input } = JSON.parse(init.body);
+    inputs.push(input);
+    return new Response(new TextEncoder().encode(`<${input}>`), {
+      headers: { 'Content-Type': 'audio/mpeg' },
+    });
+  };
+  t.after(() => {
+    globalThis.fetch = original;
+  });
+  const env = {
+    LOG_LEVEL: 'error',
+    POLLINATIONS_API_TOKEN: 'token',
+    UPSTREAM_LIMITER_ENABLED: 'false',
+    CIRCUIT_BREAKER_ENABLED: 'false',
+    TTS_SEGMENT_MAX_CHARS: '16',
+  };
+  const pending = [];
+  const ctx = { waitUntil: (promise) => pending.push(promise) };
+
+  const play = async (text) => {
+    const { stream, done } = createSpeechStream(text, env, { ctx });
+    const body = await new Response(stream).text();
+    await done;
+    await Promise.all(pending.splice(0));
+    return body;
+  };
+
+  const text = 'Cache me first. And second.';
+  const audio = '<Cache me first.><And second.>';
+  assert.equal(await play(text), audio);
+  assert.deepEqual(inputs, ['Cache me first.', 'And second.']);
+  // 第二次相同请求（voice.html 的示例句）全部分段命中缓存，不再调用上游
+  assert.equal(await play(text), audio);
+  assert.equal(inputs.length, 2);
+  // 不同文本中重复的句子同样命中
+  assert.equal(await play('And second. Brand new.'), '<And second.><Brand new.>');
+  assert.deepEqual(inputs.slice(2), ['Brand new.']);
+});
@@ -0,0 +1,127 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import { __authTestables, validateUserToken } from '../../backend/auth.js';
+import {
+  getCachedUser,
+  invalidateCachedUser,
+  resetUserCache,
+} from '../../backend/services/user_cache.js';
+
+const { generateJWT, resetJwtCaches } = __authTestables;
+const SECRET = 'user-cache-secret';
+
+function createEnv(users, overrides = {}) {
+  const reads = [];
+  const USERS = {
+    async get(key) {
+      reads.push(key);
+      return users.has(key) ? users.get(key) : null;
+    },
+    async put(key, value) {
+      users.set(key, value);
+    },
+  };
+  return { env: { JWT_SECRET: SECRET, USERS, LOG_LEVEL: 'error', ...overrides }, reads };
+}
+
+function reset(t) {
+  resetUserCache();
+  resetJwtCaches();
+  t.after(() => {
+    resetUserCache();
+    resetJwtCaches();
+  });
+}
+
+test('validateUserToken reads USERS once and serves repeats from the user cache', async (t) => {
+  reset(t);
+  const record = { id: 'a', email: 'a@example.com', isActive: true, salt: 's' };
+  const users = new Map([['user:a', JSON.stringify(record)]]);
+  const { env, reads } = createEnv(users);
+  const token = await generateJWT({ userId: 'a', email: 'a@example.com' }, SECRET, 600);
+
+  for (let i = 0; i < 3; i++) {
+    const result = await validateUserToken(token, env);
+    assert.equal(result.success, true);
+    assert.equal(result.user.id, 'a');
+  }
+  assert.deepEqual(reads, ['user:a']);
+
+  users.set('user:a', JSON.stringify({ id: 'a', email: 'a@example.com', isActive: false }));
+  assert.equal((await validateUserToken(token, env)).success, true);
+  await invalidateCachedUser(env, 'A@example.com');
+  const after = await validateUserToken(token, env);
+  assert.equal(after.cause, 'user_disabled');
+  assert.equal(reads.length, 2);
+});
+
+test('trustClaims skips the user lookup only for fresh tokens carrying isActive', async (t) => {
+  reset(t);
+  const users = new Map([
+    ['user:b', JSON.stringify({ id: 'b', email: 'b@example.com', isActive: true })],
+  ]);
+  const { env, reads } = createEnv(users, { AUTH_CLAIMS_TRUST_SECONDS: '60' });
+  const fresh = await generateJWT({ userId: 'b', email: 'b@example.com', isActive: true }, SECRET);
+  const legacy = await generateJWT({ userId: 'b', email: 'b@example.com' }, SECRET);
+
+  const fast = await validateUserToken(fresh, env, { trustClaims: true });
+  assert.equal(fast.fromClaims, true);
+  assert.deepEqual(fast.user, { id: 'b', email: 'b@example.com' });
+  assert.equal(reads.length, 0);
+
+  const slow = await validateUserToken(legacy, env, { trustClaims: true });
+  assert.equal(slow.fromClaims, undefined);
+  assert.equal(reads.length, 1);
+
+  const realNow = Date.now;
+  const later = realNow() + 120000;
+  Date.now = () => later;
+  t.after(() => {
+    Date.now = realNow;
+  });
+  resetUserCache();
+  const stale = await validateUserToken(fresh, env, { trustClaims: true });
+  assert.equal(stale.fromClaims, undefined);
+  assert.equal(reads.length, 2);
+});
+
+test('getCachedUser keeps only public fields in the edge cache', async (t) => {
+  reset(t);
+  const stored = new Map();
+  const originalCaches = globalThis.caches;
+  globalThis.caches = {
+    default: {
+      async match(request) {
+        return stored.has(request.url) ? new Response(stored.get(request.url)) : undefined;
+      },
+      async put(request, response) {
+        stored.set(request.url, await response.text());
+      },
+      async delete(request) {
+        return stored.delete(request.url);
+      },
+    },
+  };
+  t.after(() => {
+    globalThis.caches = originalCaches;
+  });
+
+  let loads = 0;
+  const loader = async () => {
+    loads += 1;
+    return { id: 'c', email: 'c@example.com', isActive: true, passwordHash: 'h', salt: 's' };
+  };
+  const user = await getCachedUser({}, 'c@example.com', loader);
+  assert.equal(user.passwordHash, undefined);
+  const [cachedBody] = stored.values();
+  assert.ok(!cachedBody.includes('passwordHash'));
+
+  // 模拟另一个 isolate：内存层为空，从边缘缓存命中
+  resetUserCache();
+  assert.equal((await getCachedUser({}, 'c@example.com', loader)).id, 'c');
+  assert.equal(loads, 1);
+
+  await invalidateCachedUser({}, 'c@example.com');
+  assert.equal(stored.size, 0);
+});
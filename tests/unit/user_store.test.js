@@ -0,0 +1,113 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+
+import {
+  getUserByEmail,
+  getUserById,
+  getUsersByIds,
+  migrateLegacyUsers,
+  putUser,
+  resetUserStore,
+} from '../../backend/services/user_store.js';
+
+function createKv(entries = {}, { bulk = false } = {}) {
+  const store = new Map(Object.entries(entries));
+  const reads = [];
+  const kv = {
+    store,
+    reads,
+    async get(key) {
+      if (Array.isArray(key)) {
+        if (!bulk) throw new TypeError('bulk get unsupported');
+        reads.push(key);
+        return new Map(key.map((k) => [k, store.get(k) ?? null]));
+      }
+      reads.push(key);
+      return store.get(key) ?? null;
+    },
+    async put(key, value) {
+      store.set(key, value);
+    },
+    async delete(key) {
+      store.delete(key);
+    },
+    // 与 KV 一样按字节序分页；每页只取两个键以覆盖跨页的情况
+    async list({ cursor }) {
+      const names = [...store.keys()].sort().filter((name) => !cursor || name > cursor);
+      const keys = names.slice(0, 2);
+      return {
+        keys: keys.map((name) => ({ name })),
+        list_complete: names.length <= 2,
+        cursor: keys.at(-1),
+      };
+    },
+  };
+  return kv;
+}
+
+function userRecord(id, email, extra = {}) {
+  return JSON.stringify({ id, email, isActive: true, ...extra });
+}
+
+test('migrateLegacyUsers moves email keys to by-id records once', async (t) => {
+  resetUserStore();
+  t.after(resetUserStore);
+  const USERS = createKv({
+    'a@example.com': userRecord('a', 'a@example.com', { username: 'current' }),
+    'A@Example.com': userRecord('a-old', 'A@Example.com', { username: 'stale' }),
+    'Mixed@Example.com': userRecord('m', 'Mixed@Example.com'),
+    'broken@example.com': '{not json',
+    'RATE_LIMIT:user:a': '{"count":1}',
+  });
+  const env = { USERS, LOG_LEVEL: 'error' };
+
+  const summary = await migrateLegacyUsers(env);
+  assert.deepEqual(summary, { scanned: 3, migrated: 2, duplicates: 1, skipped: 1, failed: 0 });
+  assert.equal((await getUserByEmail(env, 'A@example.com')).username, 'current');
+  assert.equal((await getUserById(env, 'm')).email, 'mixed@example.com');
+  assert.equal(USERS.store.get('email:mixed@example.com'), 'm');
+  for (const key of ['a@example.com', 'A@Example.com', 'Mixed@Example.com']) {
+    assert.equal(USERS.store.has(key), false);
+  }
+  assert.equal(USERS.store.has('broken@example.com'), true);
+  assert.equal(USERS.store.has('RATE_LIMIT:user:a'), true);
+
+  assert.equal((await migrateLegacyUsers(env)).alreadyDone, true);
+
+  // 迁移完成后未知邮箱只读一次索引
+  USERS.reads.length = 0;
+  assert.equal(await getUserByEmail(env, 'nobody@example.com'), null);
+  assert.deepEqual(USERS.reads, ['email:nobody@example.com']);
+});
+
+test('getUserByEmail migrates a legacy record on first lookup', async (t) => {
+  resetUserStore();
+  t.after(resetUserStore);
+  const USERS = createKv({ 'old@example.com': userRecord('o', 'old@example.com') });
+  const env = { USERS };
+
+  const user = await getUserByEmail(env, ' Old@Example.com ');
+  assert.equal(user.id, 'o');
+  assert.equal(USERS.store.has('old@example.com'), false);
+  assert.equal(USERS.store.get('email:old@example.com'), 'o');
+  assert.equal((await getUserById(env, 'o')).email, 'old@example.com');
+});
+
+test('getUsersByIds uses bulk reads when the binding supports them', async () => {
+  const entries = {};
+  const bulkKv = createKv(entries, { bulk: true });
+  const env = { USERS: bulkKv };
+  await putUser(env, { id: 'x', email: 'X@example.com' });
+  await putUser(env, { id: 'y', email: 'y@example.com' });
+
+  bulkKv.reads.length = 0;
+  const users = await getUsersByIds(env, ['x', 'y', 'x', 'missing']);
+  assert.equal(bulkKv.reads.length, 1);
+  assert.equal(users.get('x').email, 'x@example.com');
+  assert.equal(users.get('missing'), null);
+
+  const plainKv = createKv(Object.fromEntries(bulkKv.store));
+  const fallback = await getUsersByIds({ USERS: plainKv }, ['x', 'y']);
+  assert.equal(fallback.get('y').id, 'y');
+  assert.deepEqual(plainKv.reads, ['user:x', 'user:y']);
+});